@@ -1,948 +1,1197 @@
-import mysql.connector
-from mysql.connector import Error
-import re
-import datetime
-import getpass
-import os
-import time
-from tabulate import tabulate
-import colorama
-from colorama import Fore, Style
-
-class HospitalManagementSystem:
-    def __init__(self):
-        colorama.init()
-        self.initialize_connection()
-        
-    def initialize_connection(self):
-        try:
-            self.connection = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='Your Password',
-                database='Your database name'
-            )
-            self.cursor = self.connection.cursor(dictionary=True)
-            self.setup_database()
-        except Error as e:
-            print(f"{Fore.RED}Database connection error: {e}{Style.RESET_ALL}")
-            self.connection = None
-
-    def setup_database(self):
-        tables = [
-            """CREATE TABLE IF NOT EXISTS patients (
-                patient_id INT AUTO_INCREMENT PRIMARY KEY,
-                first_name VARCHAR(50) NOT NULL,
-                last_name VARCHAR(50) NOT NULL,
-                date_of_birth DATE NOT NULL,
-                gender ENUM('Male', 'Female', 'Other') NOT NULL,
-                contact_number VARCHAR(15) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                address TEXT,
-                blood_group VARCHAR(5),
-                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS doctors (
-                doctor_id INT AUTO_INCREMENT PRIMARY KEY,
-                first_name VARCHAR(50) NOT NULL,
-                last_name VARCHAR(50) NOT NULL,
-                specialization VARCHAR(100) NOT NULL,
-                contact_number VARCHAR(15) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                department VARCHAR(100) NOT NULL,
-                joining_date DATE NOT NULL,
-                consultation_fee DECIMAL(10,2) NOT NULL
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS appointments (
-                appointment_id INT AUTO_INCREMENT PRIMARY KEY,
-                patient_id INT NOT NULL,
-                doctor_id INT NOT NULL,
-                appointment_date DATE NOT NULL,
-                appointment_time TIME NOT NULL,
-                status ENUM('Scheduled', 'Completed', 'Cancelled') DEFAULT 'Scheduled',
-                reason VARCHAR(255),
-                FOREIGN KEY (patient_id) REFERENCES patients(patient_id),
-                FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS medical_records (
-                record_id INT AUTO_INCREMENT PRIMARY KEY,
-                patient_id INT NOT NULL,
-                doctor_id INT NOT NULL,
-                diagnosis TEXT,
-                prescription TEXT,
-                treatment_plan TEXT,
-                visit_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patients(patient_id),
-                FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS billing (
-                bill_id INT AUTO_INCREMENT PRIMARY KEY,
-                patient_id INT NOT NULL,
-                total_amount DECIMAL(10,2) NOT NULL,
-                payment_status ENUM('Pending', 'Paid', 'Overdue') DEFAULT 'Pending',
-                bill_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patients(patient_id)
-            )"""
-        ]
-        
-        for table in tables:
-            self.cursor.execute(table)
-        self.connection.commit()
-
-    def validate_email(self, email):
-        email_regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(email_regex, email) is not None
-    
-    def validate_phone(self, phone):
-        phone_regex = r'^\+?1?\d{10,14}$'
-        return re.match(phone_regex, phone) is not None
-
-    def display_loading(self, action):
-        animation = "|/-\\"
-        for i in range(10):
-            time.sleep(0.1)
-            print(f"{Fore.CYAN}\r{action} {animation[i % len(animation)]}", end="")
-        print(f"\r{' ' * 50}", end="")
-        print(f"\r{Fore.GREEN}{action} Complete!{Style.RESET_ALL}")
-
-    def add_patient(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Add New Patient ==={Style.RESET_ALL}")
-            first_name = input(f"{Fore.YELLOW}First Name: {Style.RESET_ALL}")
-            last_name = input(f"{Fore.YELLOW}Last Name: {Style.RESET_ALL}")
-            
-            while True:
-                dob = input(f"{Fore.YELLOW}Date of Birth (YYYY-MM-DD): {Style.RESET_ALL}")
-                try:
-                    datetime.datetime.strptime(dob, '%Y-%m-%d')
-                    break
-                except ValueError:
-                    print(f"{Fore.RED}Invalid date format. Use YYYY-MM-DD{Style.RESET_ALL}")
-            
-            gender = input(f"{Fore.YELLOW}Gender (Male/Female/Other): {Style.RESET_ALL}").capitalize()
-            
-            while True:
-                contact_number = input(f"{Fore.YELLOW}Contact Number: {Style.RESET_ALL}")
-                if self.validate_phone(contact_number):
-                    break
-                print(f"{Fore.RED}Invalid phone number.{Style.RESET_ALL}")
-            
-            while True:
-                email = input(f"{Fore.YELLOW}Email Address: {Style.RESET_ALL}")
-                if self.validate_email(email):
-                    break
-                print(f"{Fore.RED}Invalid email address.{Style.RESET_ALL}")
-            
-            address = input(f"{Fore.YELLOW}Home Address: {Style.RESET_ALL}")
-            blood_group = input(f"{Fore.YELLOW}Blood Group: {Style.RESET_ALL}")
-            
-            query = """
-            INSERT INTO patients 
-            (first_name, last_name, date_of_birth, gender, 
-            contact_number, email, address, blood_group) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            params = (first_name, last_name, dob, gender, 
-                      contact_number, email, address, blood_group)
-            
-            self.display_loading("Registering patient")
-            self.cursor.execute(query, params)
-            self.connection.commit()
-            
-            patient_id = self.cursor.lastrowid
-            print(f"{Fore.GREEN}Patient registration successful! Patient ID: {patient_id}{Style.RESET_ALL}")
-            time.sleep(1)
-        
-        except Error as e:
-            print(f"{Fore.RED}Registration failed: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-
-    def add_doctor(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Add New Doctor ==={Style.RESET_ALL}")
-            first_name = input(f"{Fore.YELLOW}First Name: {Style.RESET_ALL}")
-            last_name = input(f"{Fore.YELLOW}Last Name: {Style.RESET_ALL}")
-            specialization = input(f"{Fore.YELLOW}Medical Specialization: {Style.RESET_ALL}")
-            
-            while True:
-                contact_number = input(f"{Fore.YELLOW}Contact Number: {Style.RESET_ALL}")
-                if self.validate_phone(contact_number):
-                    break
-                print(f"{Fore.RED}Invalid phone number.{Style.RESET_ALL}")
-            
-            while True:
-                email = input(f"{Fore.YELLOW}Email Address: {Style.RESET_ALL}")
-                if self.validate_email(email):
-                    break
-                print(f"{Fore.RED}Invalid email address.{Style.RESET_ALL}")
-            
-            department = input(f"{Fore.YELLOW}Department: {Style.RESET_ALL}")
-            
-            while True:
-                try:
-                    consultation_fee = float(input(f"{Fore.YELLOW}Consultation Fee: {Style.RESET_ALL}"))
-                    break
-                except ValueError:
-                    print(f"{Fore.RED}Invalid fee amount.{Style.RESET_ALL}")
-            
-            while True:
-                joining_date = input(f"{Fore.YELLOW}Joining Date (YYYY-MM-DD): {Style.RESET_ALL}")
-                try:
-                    datetime.datetime.strptime(joining_date, '%Y-%m-%d')
-                    break
-                except ValueError:
-                    print(f"{Fore.RED}Invalid date format.{Style.RESET_ALL}")
-            
-            query = """
-            INSERT INTO doctors 
-            (first_name, last_name, specialization, contact_number, 
-            email, department, joining_date, consultation_fee) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            params = (first_name, last_name, specialization, 
-                      contact_number, email, department, joining_date, consultation_fee)
-            
-            self.display_loading("Registering doctor")
-            self.cursor.execute(query, params)
-            self.connection.commit()
-            
-            doctor_id = self.cursor.lastrowid
-            print(f"{Fore.GREEN}Doctor registration successful! Doctor ID: {doctor_id}{Style.RESET_ALL}")
-            time.sleep(1)
-        
-        except Error as e:
-            print(f"{Fore.RED}Registration failed: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-
-    def book_appointment(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Book Appointment ==={Style.RESET_ALL}")
-            
-            patient_id = input(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
-            self.cursor.execute("SELECT patient_id, first_name, last_name FROM patients WHERE patient_id = %s", (patient_id,))
-            patient_result = self.cursor.fetchone()
-            
-            if not patient_result:
-                print(f"{Fore.RED}Error: Patient ID {patient_id} does not exist. Please register the patient first.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            else:
-                print(f"{Fore.GREEN}Patient: {patient_result['first_name']} {patient_result['last_name']}{Style.RESET_ALL}")
-            
-            doctor_id = input(f"{Fore.YELLOW}Enter Doctor ID: {Style.RESET_ALL}")
-            self.cursor.execute("SELECT doctor_id, first_name, last_name, specialization FROM doctors WHERE doctor_id = %s", (doctor_id,))
-            doctor_result = self.cursor.fetchone()
-            
-            if not doctor_result:
-                print(f"{Fore.RED}Error: Doctor ID {doctor_id} does not exist. Please register the doctor first.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            else:
-                print(f"{Fore.GREEN}Doctor: {doctor_result['first_name']} {doctor_result['last_name']} ({doctor_result['specialization']}){Style.RESET_ALL}")
-            
-            while True:
-                appointment_date = input(f"{Fore.YELLOW}Appointment Date (YYYY-MM-DD): {Style.RESET_ALL}")
-                try:
-                    date_obj = datetime.datetime.strptime(appointment_date, '%Y-%m-%d')
-                    if date_obj.date() < datetime.datetime.now().date():
-                        print(f"{Fore.RED}Appointment date cannot be in the past.{Style.RESET_ALL}")
-                        continue
-                    break
-                except ValueError:
-                    print(f"{Fore.RED}Invalid date format. Use YYYY-MM-DD{Style.RESET_ALL}")
-            
-            while True:
-                appointment_time = input(f"{Fore.YELLOW}Appointment Time (HH:MM): {Style.RESET_ALL}")
-                try:
-                    datetime.datetime.strptime(appointment_time, '%H:%M')
-                    break
-                except ValueError:
-                    print(f"{Fore.RED}Invalid time format. Use HH:MM (24-hour format){Style.RESET_ALL}")
-                    
-            reason = input(f"{Fore.YELLOW}Reason for Visit: {Style.RESET_ALL}")
-            
-            query = """
-            INSERT INTO appointments 
-            (patient_id, doctor_id, appointment_date, appointment_time, reason) 
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            
-            params = (patient_id, doctor_id, appointment_date, appointment_time, reason)
-            
-            self.display_loading("Booking appointment")
-            self.cursor.execute(query, params)
-            self.connection.commit()
-            
-            appointment_id = self.cursor.lastrowid
-            print(f"{Fore.GREEN}Appointment booked successfully! Appointment ID: {appointment_id}{Style.RESET_ALL}")
-            time.sleep(1)
-        
-        except Error as e:
-            print(f"{Fore.RED}Booking failed: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-
-    def add_medical_record(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Add Medical Record ==={Style.RESET_ALL}")
-            
-            patient_id = input(f"{Fore.YELLOW}Patient ID: {Style.RESET_ALL}")
-            self.cursor.execute("SELECT patient_id, first_name, last_name FROM patients WHERE patient_id = %s", (patient_id,))
-            patient_result = self.cursor.fetchone()
-            
-            if not patient_result:
-                print(f"{Fore.RED}Error: Patient ID {patient_id} does not exist.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            else:
-                print(f"{Fore.GREEN}Patient: {patient_result['first_name']} {patient_result['last_name']}{Style.RESET_ALL}")
-            
-            doctor_id = input(f"{Fore.YELLOW}Doctor ID: {Style.RESET_ALL}")
-            self.cursor.execute("SELECT doctor_id, first_name, last_name, specialization FROM doctors WHERE doctor_id = %s", (doctor_id,))
-            doctor_result = self.cursor.fetchone()
-            
-            if not doctor_result:
-                print(f"{Fore.RED}Error: Doctor ID {doctor_id} does not exist.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            else:
-                print(f"{Fore.GREEN}Doctor: {doctor_result['first_name']} {doctor_result['last_name']} ({doctor_result['specialization']}){Style.RESET_ALL}")
-                
-            diagnosis = input(f"{Fore.YELLOW}Diagnosis: {Style.RESET_ALL}")
-            prescription = input(f"{Fore.YELLOW}Prescription: {Style.RESET_ALL}")
-            treatment_plan = input(f"{Fore.YELLOW}Treatment Plan: {Style.RESET_ALL}")
-            
-            query = """
-            INSERT INTO medical_records 
-            (patient_id, doctor_id, diagnosis, prescription, treatment_plan) 
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            
-            params = (patient_id, doctor_id, diagnosis, prescription, treatment_plan)
-            
-            self.display_loading("Adding medical record")
-            self.cursor.execute(query, params)
-            self.connection.commit()
-            
-            record_id = self.cursor.lastrowid
-            print(f"{Fore.GREEN}Medical record added successfully! Record ID: {record_id}{Style.RESET_ALL}")
-            time.sleep(1)
-        
-        except Error as e:
-            print(f"{Fore.RED}Record addition failed: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-
-    def generate_bill(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Generate Patient Bill ==={Style.RESET_ALL}")
-            
-            patient_id = input(f"{Fore.YELLOW}Patient ID: {Style.RESET_ALL}")
-            self.cursor.execute("SELECT patient_id, first_name, last_name FROM patients WHERE patient_id = %s", (patient_id,))
-            patient_result = self.cursor.fetchone()
-            
-            if not patient_result:
-                print(f"{Fore.RED}Error: Patient ID {patient_id} does not exist.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            else:
-                print(f"{Fore.GREEN}Patient: {patient_result['first_name']} {patient_result['last_name']}{Style.RESET_ALL}")
-                
-            while True:
-                try:
-                    total_amount = float(input(f"{Fore.YELLOW}Total Bill Amount: {Style.RESET_ALL}"))
-                    break
-                except ValueError:
-                    print(f"{Fore.RED}Invalid amount.{Style.RESET_ALL}")
-            
-            payment_options = ['Pending', 'Paid', 'Overdue']
-            print(f"{Fore.CYAN}Payment Status Options:{Style.RESET_ALL}")
-            for i, option in enumerate(payment_options, 1):
-                print(f"{i}. {option}")
-            
-            while True:
-                try:
-                    choice = int(input(f"{Fore.YELLOW}Select payment status (1-3): {Style.RESET_ALL}"))
-                    if 1 <= choice <= 3:
-                        payment_status = payment_options[choice-1]
-                        break
-                    else:
-                        print(f"{Fore.RED}Invalid choice. Please select 1-3.{Style.RESET_ALL}")
-                except ValueError:
-                    print(f"{Fore.RED}Invalid input. Please enter a number.{Style.RESET_ALL}")
-            
-            query = """
-            INSERT INTO billing 
-            (patient_id, total_amount, payment_status) 
-            VALUES (%s, %s, %s)
-            """
-            
-            params = (patient_id, total_amount, payment_status)
-            
-            self.display_loading("Generating bill")
-            self.cursor.execute(query, params)
-            self.connection.commit()
-            
-            bill_id = self.cursor.lastrowid
-            print(f"{Fore.GREEN}Bill generated successfully! Bill ID: {bill_id}{Style.RESET_ALL}")
-            time.sleep(1)
-            
-            self.print_bill(bill_id, patient_result, total_amount, payment_status)
-        
-        except Error as e:
-            print(f"{Fore.RED}Bill generation failed: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-    
-    def print_bill(self, bill_id, patient, amount, status):
-        print(f"\n{Fore.CYAN}{'=' * 50}")
-        print(f"{' ' * 15}HOSPITAL BILL RECEIPT")
-        print(f"{'=' * 50}{Style.RESET_ALL}")
-        print(f"Bill ID: {bill_id}")
-        print(f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        print(f"Patient: {patient['first_name']} {patient['last_name']} (ID: {patient['patient_id']})")
-        print(f"{Fore.CYAN}{'-' * 50}{Style.RESET_ALL}")
-        print(f"Amount Due: ${amount:.2f}")
-        print(f"Payment Status: {status}")
-        print(f"{Fore.CYAN}{'-' * 50}")
-        print(f"{'=' * 50}{Style.RESET_ALL}")
-        
-        input(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
-
-    def view_patients(self):
-        try:
-            self.clear_screen()
-            self.cursor.execute("SELECT * FROM patients")
-            patients = self.cursor.fetchall()
-            
-            if not patients:
-                print(f"{Fore.YELLOW}No patients found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}=== Patient List ==={Style.RESET_ALL}")
-            
-            headers = ["ID", "Name", "Date of Birth", "Gender", "Contact", "Email", "Blood Group"]
-            table_data = []
-            
-            for patient in patients:
-                table_data.append([
-                    patient['patient_id'],
-                    f"{patient['first_name']} {patient['last_name']}",
-                    patient['date_of_birth'],
-                    patient['gender'],
-                    patient['contact_number'],
-                    patient['email'],
-                    patient['blood_group'] or "N/A"
-                ])
-            
-            print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
-            input(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
-        
-        except Error as e:
-            print(f"{Fore.RED}Error retrieving patients: {e}{Style.RESET_ALL}")
-            time.sleep(2)
-    
-    def view_doctors(self):
-        try:
-            self.clear_screen()
-            self.cursor.execute("SELECT * FROM doctors")
-            doctors = self.cursor.fetchall()
-            
-            if not doctors:
-                print(f"{Fore.YELLOW}No doctors found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}=== Doctor List ==={Style.RESET_ALL}")
-            
-            headers = ["ID", "Name", "Specialization", "Department", "Contact", "Email", "Fee ($)"]
-            table_data = []
-            
-            for doctor in doctors:
-                table_data.append([
-                    doctor['doctor_id'],
-                    f"{doctor['first_name']} {doctor['last_name']}",
-                    doctor['specialization'],
-                    doctor['department'],
-                    doctor['contact_number'],
-                    doctor['email'],
-                    f"{doctor['consultation_fee']:.2f}"
-                ])
-            
-            print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
-            input(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
-        
-        except Error as e:
-            print(f"{Fore.RED}Error retrieving doctors: {e}{Style.RESET_ALL}")
-            time.sleep(2)
-    
-    def view_appointments(self):
-        try:
-            self.clear_screen()
-            query = """
-            SELECT a.appointment_id, a.appointment_date, a.appointment_time, a.status, a.reason,
-                   p.patient_id, CONCAT(p.first_name, ' ', p.last_name) as patient_name,
-                   d.doctor_id, CONCAT(d.first_name, ' ', d.last_name) as doctor_name,
-                   d.specialization
-            FROM appointments a
-            JOIN patients p ON a.patient_id = p.patient_id
-            JOIN doctors d ON a.doctor_id = d.doctor_id
-            ORDER BY a.appointment_date, a.appointment_time
-            """
-            
-            self.cursor.execute(query)
-            appointments = self.cursor.fetchall()
-            
-            if not appointments:
-                print(f"{Fore.YELLOW}No appointments found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}=== Appointment List ==={Style.RESET_ALL}")
-            
-            headers = ["ID", "Date", "Time", "Patient", "Doctor", "Status", "Reason"]
-            table_data = []
-            
-            for appt in appointments:
-                status_color = Fore.GREEN if appt['status'] == 'Completed' else (Fore.YELLOW if appt['status'] == 'Scheduled' else Fore.RED)
-                table_data.append([
-                    appt['appointment_id'],
-                    appt['appointment_date'],
-                    appt['appointment_time'],
-                    f"{appt['patient_name']} (ID: {appt['patient_id']})",
-                    f"{appt['doctor_name']} ({appt['specialization']})",
-                    f"{status_color}{appt['status']}{Style.RESET_ALL}",
-                    appt['reason']
-                ])
-            
-            print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
-            input(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
-        
-        except Error as e:
-            print(f"{Fore.RED}Error retrieving appointments: {e}{Style.RESET_ALL}")
-            time.sleep(2)
-    
-    def manage_appointments(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Manage Appointments ==={Style.RESET_ALL}")
-            
-            appointment_id = input(f"{Fore.YELLOW}Enter Appointment ID: {Style.RESET_ALL}")
-            
-            self.cursor.execute("""
-                SELECT a.*, 
-                       CONCAT(p.first_name, ' ', p.last_name) as patient_name,
-                       CONCAT(d.first_name, ' ', d.last_name) as doctor_name
-                FROM appointments a
-                JOIN patients p ON a.patient_id = p.patient_id
-                JOIN doctors d ON a.doctor_id = d.doctor_id
-                WHERE a.appointment_id = %s
-            """, (appointment_id,))
-            
-            appointment = self.cursor.fetchone()
-            
-            if not appointment:
-                print(f"{Fore.RED}Appointment not found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}Appointment Details:{Style.RESET_ALL}")
-            print(f"ID: {appointment['appointment_id']}")
-            print(f"Date: {appointment['appointment_date']}")
-            print(f"Time: {appointment['appointment_time']}")
-            print(f"Patient: {appointment['patient_name']}")
-            print(f"Doctor: {appointment['doctor_name']}")
-            print(f"Status: {appointment['status']}")
-            print(f"Reason: {appointment['reason']}")
-            
-            print(f"\n{Fore.CYAN}Update Options:{Style.RESET_ALL}")
-            print("1. Update Status")
-            print("2. Reschedule Appointment")
-            print("3. Cancel Appointment")
-            print("4. Back to Main Menu")
-            
-            choice = input(f"\n{Fore.YELLOW}Select an option (1-4): {Style.RESET_ALL}")
-            
-            if choice == '1':
-                print(f"\n{Fore.CYAN}Status Options:{Style.RESET_ALL}")
-                print("1. Scheduled")
-                print("2. Completed")
-                print("3. Cancelled")
-                
-                status_choice = input(f"{Fore.YELLOW}Select new status (1-3): {Style.RESET_ALL}")
-                status_options = ['Scheduled', 'Completed', 'Cancelled']
-                
-                if status_choice in ['1', '2', '3']:
-                    new_status = status_options[int(status_choice) - 1]
-                    
-                    self.cursor.execute(
-                        "UPDATE appointments SET status = %s WHERE appointment_id = %s",
-                        (new_status, appointment_id)
-                    )
-                    self.connection.commit()
-                    print(f"{Fore.GREEN}Appointment status updated to {new_status}.{Style.RESET_ALL}")
-                    time.sleep(1)
-                else:
-                    print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
-            
-            elif choice == '2':
-                new_date = input(f"{Fore.YELLOW}New Date (YYYY-MM-DD): {Style.RESET_ALL}")
-                new_time = input(f"{Fore.YELLOW}New Time (HH:MM): {Style.RESET_ALL}")
-                
-                try:
-                    datetime.datetime.strptime(new_date, '%Y-%m-%d')
-                    datetime.datetime.strptime(new_time, '%H:%M')
-                    
-                    self.cursor.execute(
-                        "UPDATE appointments SET appointment_date = %s, appointment_time = %s WHERE appointment_id = %s",
-                        (new_date, new_time, appointment_id)
-                    )
-                    self.connection.commit()
-                    print(f"{Fore.GREEN}Appointment rescheduled to {new_date} at {new_time}.{Style.RESET_ALL}")
-                    time.sleep(1)
-                except ValueError:
-                    print(f"{Fore.RED}Invalid date or time format.{Style.RESET_ALL}")
-            
-            elif choice == '3':
-                confirm = input(f"{Fore.RED}Are you sure you want to cancel this appointment? (y/n): {Style.RESET_ALL}")
-                if confirm.lower() == 'y':
-                    self.cursor.execute(
-                        "UPDATE appointments SET status = 'Cancelled' WHERE appointment_id = %s",
-                        (appointment_id,)
-                    )
-                    self.connection.commit()
-                    print(f"{Fore.GREEN}Appointment cancelled.{Style.RESET_ALL}")
-                    time.sleep(1)
-        
-        except Error as e:
-            print(f"{Fore.RED}Error managing appointment: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-            time.sleep(2)
-    
-    def view_medical_records(self):
-        try:
-            self.clear_screen()
-            patient_id = input(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
-            
-            self.cursor.execute("SELECT patient_id, first_name, last_name FROM patients WHERE patient_id = %s", (patient_id,))
-            patient = self.cursor.fetchone()
-            
-            if not patient:
-                print(f"{Fore.RED}Patient not found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            query = """
-            SELECT mr.*, CONCAT(d.first_name, ' ', d.last_name) as doctor_name
-            FROM medical_records mr
-            JOIN doctors d ON mr.doctor_id = d.doctor_id
-            WHERE mr.patient_id = %s
-            ORDER BY mr.visit_date DESC
-            """
-            
-            self.cursor.execute(query, (patient_id,))
-            records = self.cursor.fetchall()
-            
-            if not records:
-                print(f"{Fore.YELLOW}No medical records found for this patient.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}=== Medical Records for {patient['first_name']} {patient['last_name']} ==={Style.RESET_ALL}")
-            
-            for i, record in enumerate(records, 1):
-                print(f"\n{Fore.CYAN}Record #{i} - {record['visit_date']}{Style.RESET_ALL}")
-                print(f"Doctor: {record['doctor_name']}")
-                print(f"Diagnosis: {record['diagnosis']}")
-                print(f"Prescription: {record['prescription']}")
-                print(f"Treatment Plan: {record['treatment_plan']}")
-                print(f"{Fore.CYAN}{'-' * 50}{Style.RESET_ALL}")
-            
-            input(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
-        
-        except Error as e:
-            print(f"{Fore.RED}Error retrieving medical records: {e}{Style.RESET_ALL}")
-            time.sleep(2)
-    
-    def view_billing_history(self):
-        try:
-            self.clear_screen()
-            patient_id = input(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
-            
-            self.cursor.execute("SELECT patient_id, first_name, last_name FROM patients WHERE patient_id = %s", (patient_id,))
-            patient = self.cursor.fetchone()
-            
-            if not patient:
-                print(f"{Fore.RED}Patient not found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            query = """
-            SELECT * FROM billing
-            WHERE patient_id = %s
-            ORDER BY bill_date DESC
-            """
-            
-            self.cursor.execute(query, (patient_id,))
-            bills = self.cursor.fetchall()
-            
-            if not bills:
-                print(f"{Fore.YELLOW}No billing records found for this patient.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}=== Billing History for {patient['first_name']} {patient['last_name']} ==={Style.RESET_ALL}")
-            
-            headers = ["Bill ID", "Date", "Amount ($)", "Status"]
-            table_data = []
-            
-            for bill in bills:
-                status_color = Fore.GREEN if bill['payment_status'] == 'Paid' else (Fore.YELLOW if bill['payment_status'] == 'Pending' else Fore.RED)
-                table_data.append([
-                    bill['bill_id'],
-                    bill['bill_date'],
-                    f"{bill['total_amount']:.2f}",
-                    f"{status_color}{bill['payment_status']}{Style.RESET_ALL}"
-                ])
-            
-            print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
-            input(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
-        
-        except Error as e:
-            print(f"{Fore.RED}Error retrieving billing records: {e}{Style.RESET_ALL}")
-            time.sleep(2)
-    
-    def update_patient(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Update Patient Information ==={Style.RESET_ALL}")
-            
-            patient_id = input(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
-            
-            self.cursor.execute("SELECT * FROM patients WHERE patient_id = %s", (patient_id,))
-            patient = self.cursor.fetchone()
-            
-            if not patient:
-                print(f"{Fore.RED}Patient not found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}Current Patient Information:{Style.RESET_ALL}")
-            print(f"ID: {patient['patient_id']}")
-            print(f"Name: {patient['first_name']} {patient['last_name']}")
-            print(f"Date of Birth: {patient['date_of_birth']}")
-            print(f"Gender: {patient['gender']}")
-            print(f"Contact: {patient['contact_number']}")
-            print(f"Email: {patient['email']}")
-            print(f"Address: {patient['address']}")
-            print(f"Blood Group: {patient['blood_group'] or 'N/A'}")
-            
-            print(f"\n{Fore.CYAN}Update Options:{Style.RESET_ALL}")
-            print("1. Contact Number")
-            print("2. Email Address")
-            print("3. Home Address")
-            print("4. Blood Group")
-            print("5. Back to Main Menu")
-            
-            choice = input(f"\n{Fore.YELLOW}Select an option (1-5): {Style.RESET_ALL}")
-            
-            if choice == '1':
-                while True:
-                    new_contact = input(f"{Fore.YELLOW}New Contact Number: {Style.RESET_ALL}")
-                    if self.validate_phone(new_contact):
-                        break
-                    print(f"{Fore.RED}Invalid phone number.{Style.RESET_ALL}")
-                
-                self.cursor.execute(
-                    "UPDATE patients SET contact_number = %s WHERE patient_id = %s",
-                    (new_contact, patient_id)
-                )
-                self.connection.commit()
-                print(f"{Fore.GREEN}Contact number updated successfully.{Style.RESET_ALL}")
-            
-            elif choice == '2':
-                while True:
-                    new_email = input(f"{Fore.YELLOW}New Email Address: {Style.RESET_ALL}")
-                    if self.validate_email(new_email):
-                        break
-                    print(f"{Fore.RED}Invalid email address.{Style.RESET_ALL}")
-                
-                self.cursor.execute(
-                    "UPDATE patients SET email = %s WHERE patient_id = %s",
-                    (new_email, patient_id)
-                )
-                self.connection.commit()
-                print(f"{Fore.GREEN}Email address updated successfully.{Style.RESET_ALL}")
-            
-            elif choice == '3':
-                new_address = input(f"{Fore.YELLOW}New Home Address: {Style.RESET_ALL}")
-                
-                self.cursor.execute(
-                    "UPDATE patients SET address = %s WHERE patient_id = %s",
-                    (new_address, patient_id)
-                )
-                self.connection.commit()
-                print(f"{Fore.GREEN}Home address updated successfully.{Style.RESET_ALL}")
-            
-            elif choice == '4':
-                new_blood_group = input(f"{Fore.YELLOW}New Blood Group: {Style.RESET_ALL}")
-                
-                self.cursor.execute(
-                    "UPDATE patients SET blood_group = %s WHERE patient_id = %s",
-                    (new_blood_group, patient_id)
-                )
-                self.connection.commit()
-                print(f"{Fore.GREEN}Blood group updated successfully.{Style.RESET_ALL}")
-            
-            time.sleep(1)
-        
-        except Error as e:
-            print(f"{Fore.RED}Error updating patient information: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-            time.sleep(2)
-
-    def update_bill_status(self):
-        try:
-            self.clear_screen()
-            print(f"\n{Fore.CYAN}=== Update Bill Payment Status ==={Style.RESET_ALL}")
-            
-            bill_id = input(f"{Fore.YELLOW}Enter Bill ID: {Style.RESET_ALL}")
-            
-            self.cursor.execute("""
-                SELECT b.*, CONCAT(p.first_name, ' ', p.last_name) as patient_name
-                FROM billing b
-                JOIN patients p ON b.patient_id = p.patient_id
-                WHERE b.bill_id = %s
-            """, (bill_id,))
-            
-            bill = self.cursor.fetchone()
-            
-            if not bill:
-                print(f"{Fore.RED}Bill not found.{Style.RESET_ALL}")
-                time.sleep(2)
-                return
-            
-            print(f"\n{Fore.CYAN}Current Bill Information:{Style.RESET_ALL}")
-            print(f"Bill ID: {bill['bill_id']}")
-            print(f"Patient: {bill['patient_name']} (ID: {bill['patient_id']})")
-            print(f"Amount: ${bill['total_amount']:.2f}")
-            print(f"Date: {bill['bill_date']}")
-            print(f"Current Status: {bill['payment_status']}")
-            
-            print(f"\n{Fore.CYAN}New Payment Status Options:{Style.RESET_ALL}")
-            print("1. Pending")
-            print("2. Paid")
-            print("3. Overdue")
-            
-            choice = input(f"\n{Fore.YELLOW}Select new status (1-3): {Style.RESET_ALL}")
-            status_options = ['Pending', 'Paid', 'Overdue']
-            
-            if choice in ['1', '2', '3']:
-                new_status = status_options[int(choice) - 1]
-                
-                self.cursor.execute(
-                    "UPDATE billing SET payment_status = %s WHERE bill_id = %s",
-                    (new_status, bill_id)
-                )
-                self.connection.commit()
-                print(f"{Fore.GREEN}Payment status updated to {new_status}.{Style.RESET_ALL}")
-                time.sleep(1)
-            else:
-                print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
-        
-        except Error as e:
-            print(f"{Fore.RED}Error updating bill status: {e}{Style.RESET_ALL}")
-            self.connection.rollback()
-            time.sleep(2)
-    
-    def clear_screen(self):
-        os.system('cls' if os.name == 'nt' else 'clear')
-    
-    def display_menu(self):
-        self.clear_screen()
-        print(f"\n{Fore.CYAN}{'=' * 50}")
-        print(f"{' ' * 10}HOSPITAL MANAGEMENT SYSTEM")
-        print(f"{'=' * 50}{Style.RESET_ALL}\n")
-        
-        print(f"{Fore.YELLOW}1. {Fore.WHITE}Patient Management{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}a. {Fore.WHITE}Register New Patient{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}b. {Fore.WHITE}View All Patients{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}c. {Fore.WHITE}Update Patient Information{Style.RESET_ALL}")
-        
-        print(f"\n{Fore.YELLOW}2. {Fore.WHITE}Doctor Management{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}a. {Fore.WHITE}Register New Doctor{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}b. {Fore.WHITE}View All Doctors{Style.RESET_ALL}")
-        
-        print(f"\n{Fore.YELLOW}3. {Fore.WHITE}Appointment Management{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}a. {Fore.WHITE}Book New Appointment{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}b. {Fore.WHITE}View All Appointments{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}c. {Fore.WHITE}Manage Appointment Status{Style.RESET_ALL}")
-        
-        print(f"\n{Fore.YELLOW}4. {Fore.WHITE}Medical Records{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}a. {Fore.WHITE}Add New Medical Record{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}b. {Fore.WHITE}View Patient Medical History{Style.RESET_ALL}")
-        
-        print(f"\n{Fore.YELLOW}5. {Fore.WHITE}Billing{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}a. {Fore.WHITE}Generate New Bill{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}b. {Fore.WHITE}View Billing History{Style.RESET_ALL}")
-        print(f"   {Fore.CYAN}c. {Fore.WHITE}Update Payment Status{Style.RESET_ALL}")
-        
-        print(f"\n{Fore.YELLOW}6. {Fore.RED}Exit System{Style.RESET_ALL}")
-    
-    def run(self):
-        if not self.connection:
-            print(f"{Fore.RED}Cannot start system without database connection.{Style.RESET_ALL}")
-            return
-        
-        while True:
-            self.display_menu()
-            choice = input(f"\n{Fore.YELLOW}Enter your choice: {Style.RESET_ALL}")
-            
-            if choice == '1a':
-                self.add_patient()
-            elif choice == '1b':
-                self.view_patients()
-            elif choice == '1c':
-                self.update_patient()
-            elif choice == '2a':
-                self.add_doctor()
-            elif choice == '2b':
-                self.view_doctors()
-            elif choice == '3a':
-                self.book_appointment()
-            elif choice == '3b':
-                self.view_appointments()
-            elif choice == '3c':
-                self.manage_appointments()
-            elif choice == '4a':
-                self.add_medical_record()
-            elif choice == '4b':
-                self.view_medical_records()
-            elif choice == '5a':
-                self.generate_bill()
-            elif choice == '5b':
-                self.view_billing_history()
-            elif choice == '5c':
-                self.update_bill_status()
-            elif choice == '6':
-                self.clear_screen()
-                print(f"\n{Fore.CYAN}Thank you for using the Hospital Management System. Goodbye!{Style.RESET_ALL}")
-                if self.connection:
-                    self.connection.close()
-                break
-            else:
-                print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
-                time.sleep(1)
-
-if __name__ == "__main__":
-    system = HospitalManagementSystem()
-    system.run()
\ No newline at end of file
+import datetime
+import getpass
+import itertools
+import os
+import shutil
+import time
+import uuid
+# Start of the HMS_STARTUP_TIMING breakdown.
+STARTED = time.perf_counter()
+import colorama
+from colorama import Fore, Style
+from validation import is_valid_email, is_valid_phone
+from render import StreamingTable
+from startup import Startup, report_from_env
+import metrics
+
+# Rows read before the first one is printed, to size the table's columns.
+TABLE_SAMPLE = 50
+
+# Bound by load_services(). Importing services brings in storage and the MySQL
+# driver, most of the time it takes to start, so the menu does it on a
+# background thread while it is drawn.
+ConflictError = Error = HospitalService = ValidationError = SlotConflict = None
+APPOINTMENT_STATUSES = PAYMENT_STATUSES = ()
+engine_from_env = replicas_from_env = None
+
+
+def load_services():
+    global ConflictError, Error, HospitalService, ValidationError, SlotConflict
+    global APPOINTMENT_STATUSES, PAYMENT_STATUSES, engine_from_env, replicas_from_env
+    from storage import engine_from_env, replicas_from_env
+    from services import ConflictError, Error, HospitalService, ValidationError, APPOINTMENT_STATUSES, PAYMENT_STATUSES
+    from scheduling import SlotConflict
+
+
+class HospitalManagementSystem:
+    MENU_ACTIONS = {
+        '1a': 'add_patient',
+        '1b': 'view_patients',
+        '1c': 'update_patient',
+        '1d': 'find_patient',
+        '2a': 'add_doctor',
+        '2b': 'view_doctors',
+        '3a': 'book_appointment',
+        '3b': 'view_appointments',
+        '3c': 'manage_appointments',
+        '3d': 'find_free_slots',
+        '3e': 'close_past_appointments',
+        '3f': 'doctor_availability',
+        '4a': 'add_medical_record',
+        '4b': 'view_medical_records',
+        '4c': 'search_medical_records',
+        '5a': 'generate_bill',
+        '5b': 'view_billing_history',
+        '5c': 'update_bill_status',
+        '5d': 'mark_overdue_bills',
+        '5e': 'view_revenue_reports'
+    }
+
+    def __init__(self, engine=None, pool_size=5, page_size=20, service=None, replicas=(), background=False):
+        colorama.init()
+        self.page_size = page_size
+        # Seconds spent waiting on the user during the current action.
+        self.idle = 0.0
+        # This terminal's session for reading its own writes back from replicas.
+        self.session_token = uuid.uuid4().hex
+        self.startup = Startup(STARTED)
+        self._service = None
+        if background:
+            # The menu is drawn at once; the engine and replicas are read from the
+            # environment on the start-up thread, and self.service waits for it.
+            self.startup.start(lambda: self.start_service(pool_size))
+        else:
+            with self.startup.phase('imports'):
+                load_services()
+            self.service = service or HospitalService(engine, pool_size, replicas=replicas)
+            self.initialize_connection()
+
+    @property
+    def service(self):
+        if self.startup.pending:
+            error = self.startup.wait()
+            if error is not None:
+                self._service = None
+                if Error is None or not isinstance(error, Error):
+                    raise error
+                print(f"{Fore.RED}Database connection error: {error}{Style.RESET_ALL}")
+        return self._service
+
+    @service.setter
+    def service(self, service):
+        self._service = service
+
+    def start_service(self, pool_size):
+        with self.startup.phase('imports'):
+            load_services()
+        self._service = HospitalService(engine_from_env(), pool_size, replicas=replicas_from_env())
+        self.connect()
+
+    def connect(self):
+        with self.startup.phase('connect'):
+            with self._service.pool.connection():
+                pass
+        with self.startup.phase('schema'):
+            # One schema_version lookup when the database is already current.
+            self._service.setup_database()
+
+    def initialize_connection(self):
+        try:
+            self.connect()
+        except Error as e:
+            print(f"{Fore.RED}Database connection error: {e}{Style.RESET_ALL}")
+            self.service = None
+
+    def validate_email(self, email):
+        return is_valid_email(email)
+    
+    def validate_phone(self, phone):
+        return is_valid_phone(phone)
+
+    def prompt(self, text):
+        started = time.perf_counter()
+        try:
+            return input(text)
+        finally:
+            self.idle += time.perf_counter() - started
+
+    def pause(self, seconds):
+        time.sleep(seconds)
+        self.idle += seconds
+
+    def perform_action(self, action):
+        # Timed without the time spent at prompts and pauses, so the latency
+        # is the system's rather than the user's.
+        self.idle = 0.0
+        started = time.perf_counter()
+        error = False
+        try:
+            with self.service.session(self.session_token):
+                getattr(self, action)()
+        except BaseException:
+            error = True
+            raise
+        finally:
+            metrics.REGISTRY.observe('action', action, max(time.perf_counter() - started - self.idle, 0.0),
+                                     error=error)
+
+    def screen_rows(self):
+        # Table rows that fit on one screen; each row takes two lines with its rule.
+        return max((shutil.get_terminal_size().lines - 6) // 2, 5)
+
+    def display_loading(self, action):
+        animation = "|/-\\"
+        for i in range(10):
+            self.pause(0.1)
+            print(f"{Fore.CYAN}\r{action} {animation[i % len(animation)]}", end="")
+        print(f"\r{' ' * 50}", end="")
+        print(f"\r{Fore.GREEN}{action} Complete!{Style.RESET_ALL}")
+
+    def add_patient(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Add New Patient ==={Style.RESET_ALL}")
+            first_name = self.prompt(f"{Fore.YELLOW}First Name: {Style.RESET_ALL}")
+            last_name = self.prompt(f"{Fore.YELLOW}Last Name: {Style.RESET_ALL}")
+            
+            while True:
+                dob = self.prompt(f"{Fore.YELLOW}Date of Birth (YYYY-MM-DD): {Style.RESET_ALL}")
+                try:
+                    datetime.datetime.strptime(dob, '%Y-%m-%d')
+                    break
+                except ValueError:
+                    print(f"{Fore.RED}Invalid date format. Use YYYY-MM-DD{Style.RESET_ALL}")
+            
+            gender = self.prompt(f"{Fore.YELLOW}Gender (Male/Female/Other): {Style.RESET_ALL}").capitalize()
+            
+            while True:
+                contact_number = self.prompt(f"{Fore.YELLOW}Contact Number: {Style.RESET_ALL}")
+                if self.validate_phone(contact_number):
+                    break
+                print(f"{Fore.RED}Invalid phone number.{Style.RESET_ALL}")
+            
+            while True:
+                email = self.prompt(f"{Fore.YELLOW}Email Address: {Style.RESET_ALL}")
+                if self.validate_email(email):
+                    break
+                print(f"{Fore.RED}Invalid email address.{Style.RESET_ALL}")
+            
+            address = self.prompt(f"{Fore.YELLOW}Home Address: {Style.RESET_ALL}")
+            blood_group = self.prompt(f"{Fore.YELLOW}Blood Group: {Style.RESET_ALL}")
+            
+            self.display_loading("Registering patient")
+            patient_id = self.service.register_patient(
+                first_name, last_name, dob, gender,
+                contact_number, email, address, blood_group
+            )
+            print(f"{Fore.GREEN}Patient registration successful! Patient ID: {patient_id}{Style.RESET_ALL}")
+            self.pause(1)
+        
+        except Error as e:
+            print(f"{Fore.RED}Registration failed: {e}{Style.RESET_ALL}")
+
+    def add_doctor(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Add New Doctor ==={Style.RESET_ALL}")
+            first_name = self.prompt(f"{Fore.YELLOW}First Name: {Style.RESET_ALL}")
+            last_name = self.prompt(f"{Fore.YELLOW}Last Name: {Style.RESET_ALL}")
+            specialization = self.prompt(f"{Fore.YELLOW}Medical Specialization: {Style.RESET_ALL}")
+            
+            while True:
+                contact_number = self.prompt(f"{Fore.YELLOW}Contact Number: {Style.RESET_ALL}")
+                if self.validate_phone(contact_number):
+                    break
+                print(f"{Fore.RED}Invalid phone number.{Style.RESET_ALL}")
+            
+            while True:
+                email = self.prompt(f"{Fore.YELLOW}Email Address: {Style.RESET_ALL}")
+                if self.validate_email(email):
+                    break
+                print(f"{Fore.RED}Invalid email address.{Style.RESET_ALL}")
+            
+            department = self.prompt(f"{Fore.YELLOW}Department: {Style.RESET_ALL}")
+            
+            while True:
+                try:
+                    consultation_fee = float(self.prompt(f"{Fore.YELLOW}Consultation Fee: {Style.RESET_ALL}"))
+                    break
+                except ValueError:
+                    print(f"{Fore.RED}Invalid fee amount.{Style.RESET_ALL}")
+            
+            while True:
+                joining_date = self.prompt(f"{Fore.YELLOW}Joining Date (YYYY-MM-DD): {Style.RESET_ALL}")
+                try:
+                    datetime.datetime.strptime(joining_date, '%Y-%m-%d')
+                    break
+                except ValueError:
+                    print(f"{Fore.RED}Invalid date format.{Style.RESET_ALL}")
+            
+            self.display_loading("Registering doctor")
+            doctor_id = self.service.register_doctor(
+                first_name, last_name, specialization,
+                contact_number, email, department, joining_date, consultation_fee
+            )
+            print(f"{Fore.GREEN}Doctor registration successful! Doctor ID: {doctor_id}{Style.RESET_ALL}")
+            self.pause(1)
+        
+        except Error as e:
+            print(f"{Fore.RED}Registration failed: {e}{Style.RESET_ALL}")
+
+    def book_appointment(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Book Appointment ==={Style.RESET_ALL}")
+            
+            patient_id = self.prompt_patient_id(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
+            patient_result = self.service.get_patient(patient_id)
+            
+            if not patient_result:
+                print(f"{Fore.RED}Error: Patient ID {patient_id} does not exist. Please register the patient first.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            else:
+                print(f"{Fore.GREEN}Patient: {patient_result['first_name']} {patient_result['last_name']}{Style.RESET_ALL}")
+            
+            doctor_id = self.prompt(f"{Fore.YELLOW}Enter Doctor ID: {Style.RESET_ALL}")
+            doctor_result = self.service.get_doctor(doctor_id)
+            
+            if not doctor_result:
+                print(f"{Fore.RED}Error: Doctor ID {doctor_id} does not exist. Please register the doctor first.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            else:
+                print(f"{Fore.GREEN}Doctor: {doctor_result['first_name']} {doctor_result['last_name']} ({doctor_result['specialization']}){Style.RESET_ALL}")
+            
+            while True:
+                appointment_date = self.prompt(f"{Fore.YELLOW}Appointment Date (YYYY-MM-DD): {Style.RESET_ALL}")
+                try:
+                    date_obj = datetime.datetime.strptime(appointment_date, '%Y-%m-%d')
+                    if date_obj.date() < datetime.datetime.now().date():
+                        print(f"{Fore.RED}Appointment date cannot be in the past.{Style.RESET_ALL}")
+                        continue
+                    break
+                except ValueError:
+                    print(f"{Fore.RED}Invalid date format. Use YYYY-MM-DD{Style.RESET_ALL}")
+            
+            while True:
+                appointment_time = self.prompt(f"{Fore.YELLOW}Appointment Time (HH:MM): {Style.RESET_ALL}")
+                try:
+                    datetime.datetime.strptime(appointment_time, '%H:%M')
+                except ValueError:
+                    print(f"{Fore.RED}Invalid time format. Use HH:MM (24-hour format){Style.RESET_ALL}")
+                    continue
+                
+                taken = self.service.slot_conflict(doctor_id, appointment_date, appointment_time)
+                if not taken:
+                    break
+                
+                print(f"{Fore.RED}Doctor already has an appointment at {taken} on {appointment_date}.{Style.RESET_ALL}")
+                after = datetime.datetime.strptime(f"{appointment_date} {appointment_time}", '%Y-%m-%d %H:%M')
+                suggestions = self.service.free_slots(doctor_id, after)
+                self.print_free_slots(suggestions)
+                pick = self.prompt(f"{Fore.YELLOW}Pick a slot number, or press Enter to type another time: {Style.RESET_ALL}").strip()
+                if pick.isdigit() and 1 <= int(pick) <= len(suggestions):
+                    slot_date, appointment_time = suggestions[int(pick) - 1]
+                    appointment_date = slot_date.isoformat()
+                    break
+                    
+            reason = self.prompt(f"{Fore.YELLOW}Reason for Visit: {Style.RESET_ALL}")
+            
+            self.display_loading("Booking appointment")
+            appointment_id = self.service.book_appointment(
+                patient_id, doctor_id, appointment_date, appointment_time, reason
+            )
+            print(f"{Fore.GREEN}Appointment booked successfully! Appointment ID: {appointment_id}{Style.RESET_ALL}")
+            self.pause(1)
+        
+        except Error as e:
+            print(f"{Fore.RED}Booking failed: {e}{Style.RESET_ALL}")
+
+    def print_free_slots(self, slots):
+        if not slots:
+            print(f"{Fore.YELLOW}No free slots found.{Style.RESET_ALL}")
+            return
+        print(f"{Fore.CYAN}Next free slots:{Style.RESET_ALL}")
+        for i, slot in enumerate(slots, 1):
+            day, slot_time = slot[0], slot[1]
+            doctor = f" - Dr. {slot[2]['first_name']} {slot[2]['last_name']} (ID: {slot[2]['doctor_id']})" if len(slot) > 2 else ""
+            print(f"{i}. {day} {slot_time}{doctor}")
+
+    def find_free_slots(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Find Free Slots ==={Style.RESET_ALL}")
+            
+            target = self.prompt(f"{Fore.YELLOW}Doctor ID, Specialization or Department: {Style.RESET_ALL}").strip()
+            from_date = self.prompt_optional_date("From date")
+            after = datetime.datetime.strptime(from_date, '%Y-%m-%d') if from_date else datetime.datetime.now()
+            if after < datetime.datetime.now():
+                after = datetime.datetime.now()
+            
+            if target.isdigit():
+                self.print_free_slots(self.service.free_slots(target, after))
+            else:
+                self.print_free_slots(self.service.free_slots_for_specialization(target, after)
+                                      or self.service.free_slots_for_department(target, after))
+            
+            self.prompt(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error finding free slots: {e}{Style.RESET_ALL}")
+            self.pause(2)
+
+    def doctor_availability(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Doctor Availability ==={Style.RESET_ALL}")
+
+            target = self.prompt(f"{Fore.YELLOW}Specialization or Department: {Style.RESET_ALL}").strip()
+            tomorrow = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+            day = self.prompt(f"{Fore.YELLOW}Date (YYYY-MM-DD, blank for {tomorrow}): {Style.RESET_ALL}").strip() or tomorrow
+            start = self.prompt(f"{Fore.YELLOW}From time (HH:MM, blank for opening): {Style.RESET_ALL}").strip() or None
+            end = self.prompt(f"{Fore.YELLOW}To time (HH:MM, blank for closing): {Style.RESET_ALL}").strip() or None
+
+            slots = (self.service.availability(day, specialization=target, start=start, end=end)
+                     or self.service.availability(day, department=target, start=start, end=end))
+            if not slots:
+                print(f"{Fore.YELLOW}No doctor in {target} has a free slot then.{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.CYAN}Free slots on {day}:{Style.RESET_ALL}")
+                for slot_time, doctors in slots:
+                    names = ", ".join(f"Dr. {doctor['first_name']} {doctor['last_name']} (ID: {doctor['doctor_id']})"
+                                      for doctor in doctors)
+                    print(f"{slot_time}  {names}")
+
+            self.prompt(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
+
+        except Error as e:
+            print(f"{Fore.RED}Error checking availability: {e}{Style.RESET_ALL}")
+            self.pause(2)
+
+    def add_medical_record(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Add Medical Record ==={Style.RESET_ALL}")
+            
+            patient_id = self.prompt_patient_id(f"{Fore.YELLOW}Patient ID: {Style.RESET_ALL}")
+            patient_result = self.service.get_patient(patient_id)
+            
+            if not patient_result:
+                print(f"{Fore.RED}Error: Patient ID {patient_id} does not exist.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            else:
+                print(f"{Fore.GREEN}Patient: {patient_result['first_name']} {patient_result['last_name']}{Style.RESET_ALL}")
+            
+            doctor_id = self.prompt(f"{Fore.YELLOW}Doctor ID: {Style.RESET_ALL}")
+            doctor_result = self.service.get_doctor(doctor_id)
+            
+            if not doctor_result:
+                print(f"{Fore.RED}Error: Doctor ID {doctor_id} does not exist.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            else:
+                print(f"{Fore.GREEN}Doctor: {doctor_result['first_name']} {doctor_result['last_name']} ({doctor_result['specialization']}){Style.RESET_ALL}")
+                
+            diagnosis = self.prompt(f"{Fore.YELLOW}Diagnosis: {Style.RESET_ALL}")
+            prescription = self.prompt(f"{Fore.YELLOW}Prescription: {Style.RESET_ALL}")
+            treatment_plan = self.prompt(f"{Fore.YELLOW}Treatment Plan: {Style.RESET_ALL}")
+            
+            self.display_loading("Adding medical record")
+            record_id = self.service.add_medical_record(
+                patient_id, doctor_id, diagnosis, prescription, treatment_plan
+            )
+            print(f"{Fore.GREEN}Medical record added successfully! Record ID: {record_id}{Style.RESET_ALL}")
+            self.pause(1)
+        
+        except Error as e:
+            print(f"{Fore.RED}Record addition failed: {e}{Style.RESET_ALL}")
+
+    def generate_bill(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Generate Patient Bill ==={Style.RESET_ALL}")
+            
+            patient_id = self.prompt_patient_id(f"{Fore.YELLOW}Patient ID: {Style.RESET_ALL}")
+            patient_result = self.service.get_patient(patient_id)
+            
+            if not patient_result:
+                print(f"{Fore.RED}Error: Patient ID {patient_id} does not exist.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            else:
+                print(f"{Fore.GREEN}Patient: {patient_result['first_name']} {patient_result['last_name']}{Style.RESET_ALL}")
+                
+            while True:
+                try:
+                    total_amount = float(self.prompt(f"{Fore.YELLOW}Total Bill Amount: {Style.RESET_ALL}"))
+                    break
+                except ValueError:
+                    print(f"{Fore.RED}Invalid amount.{Style.RESET_ALL}")
+            
+            payment_options = list(PAYMENT_STATUSES)
+            print(f"{Fore.CYAN}Payment Status Options:{Style.RESET_ALL}")
+            for i, option in enumerate(payment_options, 1):
+                print(f"{i}. {option}")
+            
+            while True:
+                try:
+                    choice = int(self.prompt(f"{Fore.YELLOW}Select payment status (1-3): {Style.RESET_ALL}"))
+                    if 1 <= choice <= 3:
+                        payment_status = payment_options[choice-1]
+                        break
+                    else:
+                        print(f"{Fore.RED}Invalid choice. Please select 1-3.{Style.RESET_ALL}")
+                except ValueError:
+                    print(f"{Fore.RED}Invalid input. Please enter a number.{Style.RESET_ALL}")
+            
+            while True:
+                doctor_id = self.prompt_optional_id("Attending Doctor ID", blank="none")
+                if doctor_id is None or self.service.get_doctor(doctor_id):
+                    break
+                print(f"{Fore.RED}Error: Doctor ID {doctor_id} does not exist.{Style.RESET_ALL}")
+            
+            self.display_loading("Generating bill")
+            bill_id = self.service.generate_bill(patient_id, total_amount, payment_status, doctor_id)
+            print(f"{Fore.GREEN}Bill generated successfully! Bill ID: {bill_id}{Style.RESET_ALL}")
+            self.pause(1)
+            
+            self.print_bill(bill_id, patient_result, total_amount, payment_status)
+        
+        except Error as e:
+            print(f"{Fore.RED}Bill generation failed: {e}{Style.RESET_ALL}")
+    
+    def print_bill(self, bill_id, patient, amount, status):
+        print(f"\n{Fore.CYAN}{'=' * 50}")
+        print(f"{' ' * 15}HOSPITAL BILL RECEIPT")
+        print(f"{'=' * 50}{Style.RESET_ALL}")
+        print(f"Bill ID: {bill_id}")
+        print(f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        print(f"Patient: {patient['first_name']} {patient['last_name']} (ID: {patient['patient_id']})")
+        print(f"{Fore.CYAN}{'-' * 50}{Style.RESET_ALL}")
+        print(f"Amount Due: ${amount:.2f}")
+        print(f"Payment Status: {status}")
+        print(f"{Fore.CYAN}{'-' * 50}")
+        print(f"{'=' * 50}{Style.RESET_ALL}")
+        
+        self.prompt(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
+
+    def prompt_optional_date(self, label):
+        while True:
+            value = self.prompt(f"{Fore.YELLOW}{label} (YYYY-MM-DD, blank for any): {Style.RESET_ALL}").strip()
+            if not value:
+                return None
+            try:
+                datetime.datetime.strptime(value, '%Y-%m-%d')
+                return value
+            except ValueError:
+                print(f"{Fore.RED}Invalid date format. Use YYYY-MM-DD{Style.RESET_ALL}")
+
+    def print_rows(self, table, rows):
+        # Rows are printed as they are produced; like less, output stops after
+        # every screenful until the user asks for more.
+        screen = self.screen_rows()
+        print(table.header())
+        rows = iter(rows)
+        row = next(rows, None)
+        printed = 0
+        while row is not None:
+            print(table.row(row))
+            printed += 1
+            row = next(rows, None)
+            if row is not None and screen and printed % screen == 0:
+                print(table.footer())
+                answer = self.prompt(f"{Fore.YELLOW}-- More -- (Enter to continue, q to stop): {Style.RESET_ALL}")
+                if answer.strip().lower() == 'q':
+                    return
+                print(table.header())
+        print(table.footer())
+
+    def show_table(self, headers, rows):
+        rows = iter(rows)
+        sample = list(itertools.islice(rows, TABLE_SAMPLE))
+        self.print_rows(StreamingTable(headers, sample), itertools.chain(sample, rows))
+
+    def browse_pages(self, pager, title, headers, format_row, empty_message, print_page=None):
+        rows = pager.first()
+        if not rows:
+            print(f"{Fore.YELLOW}{empty_message}{Style.RESET_ALL}")
+            self.pause(2)
+            return
+        
+        if print_page is None:
+            # Sized from the first page and kept, so columns do not shift between pages.
+            table = StreamingTable(headers, [format_row(row) for row in rows])
+
+            def print_page(rows):
+                self.print_rows(table, (format_row(row) for row in rows))
+        while True:
+            self.clear_screen()
+            # History pagers page by period and name it instead of a number.
+            label = getattr(pager, 'label', None) or f"Page {pager.page_number}"
+            print(f"\n{Fore.CYAN}=== {title} ({label}) ==={Style.RESET_ALL}")
+            print_page(pager.rows)
+            
+            options = []
+            if pager.has_previous:
+                options.append("[p]revious")
+            if pager.has_next:
+                options.append("[n]ext")
+            options.append("[q]uit")
+            choice = self.prompt(f"\n{Fore.YELLOW}{', '.join(options)}: {Style.RESET_ALL}").strip().lower()
+            
+            if choice == 'n' and pager.has_next:
+                pager.next()
+            elif choice == 'p' and pager.has_previous:
+                pager.previous()
+            elif choice in ('q', ''):
+                return
+
+    def view_patients(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Patient List ==={Style.RESET_ALL}")
+            
+            name_prefix = self.prompt(f"{Fore.YELLOW}Name starts with (blank for all): {Style.RESET_ALL}").strip()
+            registered_from = self.prompt_optional_date("Registered on or after")
+            pager = self.service.patient_pager(name_prefix, registered_from, self.page_size)
+            
+            headers = ["ID", "Name", "Date of Birth", "Gender", "Contact", "Email", "Blood Group"]
+            
+            def format_row(patient):
+                return [
+                    patient['patient_id'],
+                    f"{patient['first_name']} {patient['last_name']}",
+                    patient['date_of_birth'],
+                    patient['gender'],
+                    patient['contact_number'],
+                    patient['email'],
+                    patient['blood_group'] or "N/A"
+                ]
+            
+            self.browse_pages(pager, "Patient List", headers, format_row, "No patients found.")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error retrieving patients: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def view_doctors(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Doctor List ==={Style.RESET_ALL}")
+            
+            name_prefix = self.prompt(f"{Fore.YELLOW}Name starts with (blank for all): {Style.RESET_ALL}").strip()
+            joined_from = self.prompt_optional_date("Joined on or after")
+            pager = self.service.doctor_pager(name_prefix, joined_from, self.page_size)
+            
+            headers = ["ID", "Name", "Specialization", "Department", "Contact", "Email", "Fee ($)"]
+            
+            def format_row(doctor):
+                return [
+                    doctor['doctor_id'],
+                    f"{doctor['first_name']} {doctor['last_name']}",
+                    doctor['specialization'],
+                    doctor['department'],
+                    doctor['contact_number'],
+                    doctor['email'],
+                    f"{doctor['consultation_fee']:.2f}"
+                ]
+            
+            self.browse_pages(pager, "Doctor List", headers, format_row, "No doctors found.")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error retrieving doctors: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def print_patient_matches(self, matches):
+        self.show_table(
+            ["ID", "Name", "Date of Birth", "Contact", "Email"],
+            ([m['patient_id'], f"{m['first_name']} {m['last_name']}", m['date_of_birth'],
+              m['contact_number'], m['email']] for m in matches)
+        )
+
+    def prompt_patient_id(self, text):
+        # Anything other than a number is looked up by name, phone, email or
+        # date of birth, so the clerk does not need to know the ID beforehand.
+        while True:
+            value = self.prompt(text).strip()
+            if not value or value.isdigit():
+                return value
+            matches = self.service.find_patients(value, self.page_size)
+            if len(matches) == 1:
+                return str(matches[0]['patient_id'])
+            if not matches:
+                print(f"{Fore.YELLOW}No patients match '{value}'.{Style.RESET_ALL}")
+            else:
+                self.print_patient_matches(matches)
+
+    def find_patient(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Find Patient ==={Style.RESET_ALL}")
+            
+            query = self.prompt(f"{Fore.YELLOW}Name, phone, email or date of birth: {Style.RESET_ALL}").strip()
+            matches = self.service.find_patients(query, self.page_size)
+            
+            if not matches:
+                print(f"{Fore.YELLOW}No patients match '{query}'.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            
+            self.print_patient_matches(matches)
+            self.prompt(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error finding patients: {e}{Style.RESET_ALL}")
+            self.pause(2)
+
+    def prompt_optional_id(self, label, blank="any"):
+        while True:
+            value = self.prompt(f"{Fore.YELLOW}{label} (blank for {blank}): {Style.RESET_ALL}").strip()
+            if not value or value.isdigit():
+                return int(value) if value else None
+            print(f"{Fore.RED}Please enter a numeric ID.{Style.RESET_ALL}")
+
+    def appointment_filters(self):
+        print(f"\n{Fore.CYAN}Filter Options:{Style.RESET_ALL}")
+        print("1. Today")
+        print("2. Date Range")
+        print("3. By Doctor")
+        print("4. By Patient")
+        print("5. By Status")
+        print("6. All Appointments")
+        
+        choice = self.prompt(f"\n{Fore.YELLOW}Select a filter (1-6): {Style.RESET_ALL}").strip()
+        filters = {}
+        
+        if choice == '1':
+            today = datetime.date.today().isoformat()
+            return "Today's Appointments", {'date_from': today, 'date_to': today}
+        
+        if choice == '3':
+            filters['doctor_id'] = self.prompt_optional_id("Doctor ID")
+        elif choice == '4':
+            filters['patient_id'] = self.prompt_optional_id("Patient ID")
+        elif choice == '5':
+            status_options = list(APPOINTMENT_STATUSES)
+            for i, option in enumerate(status_options, 1):
+                print(f"{i}. {option}")
+            status_choice = self.prompt(f"{Fore.YELLOW}Select status (1-3): {Style.RESET_ALL}").strip()
+            if status_choice in ['1', '2', '3']:
+                filters['status'] = status_options[int(status_choice) - 1]
+        elif choice == '6':
+            return "Appointment List", filters
+        
+        filters['date_from'] = self.prompt_optional_date("From date")
+        filters['date_to'] = self.prompt_optional_date("To date")
+        return "Appointment List", filters
+
+    def view_appointments(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Appointment List ==={Style.RESET_ALL}")
+            title, filters = self.appointment_filters()
+            pager = self.service.appointment_pager(page_size=self.page_size, **filters)
+            
+            headers = ["ID", "Date", "Time", "Patient", "Doctor", "Status", "Reason"]
+            
+            def format_row(appt):
+                status_color = Fore.GREEN if appt['status'] == 'Completed' else (Fore.YELLOW if appt['status'] == 'Scheduled' else Fore.RED)
+                return [
+                    appt['appointment_id'],
+                    appt['appointment_date'],
+                    appt['appointment_time'],
+                    f"{appt['patient_name']} (ID: {appt['patient_id']})",
+                    f"{appt['doctor_name']} ({appt['specialization']})",
+                    f"{status_color}{appt['status']}{Style.RESET_ALL}",
+                    appt['reason']
+                ]
+            
+            self.browse_pages(pager, title, headers, format_row, "No appointments found.")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error retrieving appointments: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def print_appointment_details(self, appointment):
+        print(f"\n{Fore.CYAN}Appointment Details:{Style.RESET_ALL}")
+        print(f"ID: {appointment['appointment_id']}")
+        print(f"Date: {appointment['appointment_date']}")
+        print(f"Time: {appointment['appointment_time']}")
+        print(f"Patient: {appointment['patient_name']}")
+        print(f"Doctor: {appointment['doctor_name']}")
+        print(f"Status: {appointment['status']}")
+        print(f"Reason: {appointment['reason']}")
+
+    def manage_appointments(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Manage Appointments ==={Style.RESET_ALL}")
+            
+            appointment_id = self.prompt(f"{Fore.YELLOW}Enter Appointment ID: {Style.RESET_ALL}")
+            
+            appointment = self.service.get_appointment(appointment_id)
+            
+            if not appointment:
+                print(f"{Fore.RED}Appointment not found.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            
+            self.print_appointment_details(appointment)
+            
+            print(f"\n{Fore.CYAN}Update Options:{Style.RESET_ALL}")
+            print("1. Update Status")
+            print("2. Reschedule Appointment")
+            print("3. Cancel Appointment")
+            print("4. Back to Main Menu")
+            
+            choice = self.prompt(f"\n{Fore.YELLOW}Select an option (1-4): {Style.RESET_ALL}")
+            
+            if choice == '1':
+                print(f"\n{Fore.CYAN}Status Options:{Style.RESET_ALL}")
+                print("1. Scheduled")
+                print("2. Completed")
+                print("3. Cancelled")
+                
+                status_choice = self.prompt(f"{Fore.YELLOW}Select new status (1-3): {Style.RESET_ALL}")
+                status_options = list(APPOINTMENT_STATUSES)
+                
+                if status_choice in ['1', '2', '3']:
+                    new_status = status_options[int(status_choice) - 1]
+                    
+                    if self.apply_edit(lambda version: self.service.set_appointment_status(appointment_id, new_status, version),
+                                       appointment['version'], self.print_appointment_details):
+                        print(f"{Fore.GREEN}Appointment status updated to {new_status}.{Style.RESET_ALL}")
+                    self.pause(1)
+                else:
+                    print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
+            
+            elif choice == '2':
+                new_date = self.prompt(f"{Fore.YELLOW}New Date (YYYY-MM-DD): {Style.RESET_ALL}")
+                new_time = self.prompt(f"{Fore.YELLOW}New Time (HH:MM): {Style.RESET_ALL}")
+                
+                try:
+                    if self.apply_edit(lambda version: self.service.reschedule_appointment(appointment_id, new_date, new_time, version),
+                                       appointment['version'], self.print_appointment_details):
+                        print(f"{Fore.GREEN}Appointment rescheduled to {new_date} at {new_time}.{Style.RESET_ALL}")
+                    self.pause(1)
+                except ValidationError:
+                    print(f"{Fore.RED}Invalid date or time format.{Style.RESET_ALL}")
+                except SlotConflict as e:
+                    print(f"{Fore.RED}{e}.{Style.RESET_ALL}")
+                    after = datetime.datetime.strptime(f"{new_date} {new_time}", '%Y-%m-%d %H:%M')
+                    self.print_free_slots(self.service.free_slots(appointment['doctor_id'], after))
+                    self.prompt(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
+            
+            elif choice == '3':
+                confirm = self.prompt(f"{Fore.RED}Are you sure you want to cancel this appointment? (y/n): {Style.RESET_ALL}")
+                if confirm.lower() == 'y':
+                    if self.apply_edit(lambda version: self.service.cancel_appointment(appointment_id, version),
+                                       appointment['version'], self.print_appointment_details):
+                        print(f"{Fore.GREEN}Appointment cancelled.{Style.RESET_ALL}")
+                    self.pause(1)
+        
+        except Error as e:
+            print(f"{Fore.RED}Error managing appointment: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def view_medical_records(self):
+        try:
+            self.clear_screen()
+            patient_id = self.prompt_patient_id(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
+            
+            patient = self.service.get_patient(patient_id)
+            
+            if not patient:
+                print(f"{Fore.RED}Patient not found.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            
+            pager = self.service.medical_record_pager(patient_id)
+            
+            def print_page(records):
+                for i, record in enumerate(records, 1):
+                    print(f"\n{Fore.CYAN}Record #{i} - {record['visit_date']}{Style.RESET_ALL}")
+                    print(f"Doctor: {record['doctor_name']}")
+                    print(f"Diagnosis: {record['diagnosis']}")
+                    print(f"Prescription: {record['prescription']}")
+                    print(f"Treatment Plan: {record['treatment_plan']}")
+                    print(f"{Fore.CYAN}{'-' * 50}{Style.RESET_ALL}")
+            
+            self.browse_pages(pager, f"Medical Records for {patient['first_name']} {patient['last_name']}",
+                              None, None, "No medical records found for this patient.", print_page)
+        
+        except Error as e:
+            print(f"{Fore.RED}Error retrieving medical records: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def search_medical_records(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Search Medical Records ==={Style.RESET_ALL}")
+            
+            query = self.prompt(f"{Fore.YELLOW}Search diagnosis, prescription or treatment: {Style.RESET_ALL}").strip()
+            since = self.prompt_optional_date("Visits on or after")
+            pager = self.service.search_records(query, since, page_size=self.page_size)
+            
+            headers = ["Record", "Visit Date", "Patient", "Doctor", "Diagnosis", "Prescription", "Treatment Plan"]
+            
+            def shorten(text, width=30):
+                text = text or ""
+                return text if len(text) <= width else text[:width - 3] + "..."
+            
+            def format_row(record):
+                return [
+                    record['record_id'],
+                    record['visit_date'],
+                    f"{record['patient_name']} (ID: {record['patient_id']})",
+                    record['doctor_name'],
+                    shorten(record['diagnosis']),
+                    shorten(record['prescription']),
+                    shorten(record['treatment_plan'])
+                ]
+            
+            self.browse_pages(pager, f"Results for '{query}'", headers, format_row, "No matching records found.")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error searching medical records: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def view_billing_history(self):
+        try:
+            self.clear_screen()
+            patient_id = self.prompt_patient_id(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
+            
+            patient = self.service.get_patient(patient_id)
+            
+            if not patient:
+                print(f"{Fore.RED}Patient not found.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            
+            pager = self.service.billing_pager(patient_id)
+            
+            headers = ["Bill ID", "Date", "Amount ($)", "Status"]
+            
+            def format_row(bill):
+                status_color = Fore.GREEN if bill['payment_status'] == 'Paid' else (Fore.YELLOW if bill['payment_status'] == 'Pending' else Fore.RED)
+                return [
+                    bill['bill_id'],
+                    bill['bill_date'],
+                    f"{bill['total_amount']:.2f}",
+                    f"{status_color}{bill['payment_status']}{Style.RESET_ALL}"
+                ]
+            
+            self.browse_pages(pager, f"Billing History for {patient['first_name']} {patient['last_name']}",
+                              headers, format_row, "No billing records found for this patient.")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error retrieving billing records: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def apply_edit(self, update, version, show):
+        # Edits are saved against the version that was shown. If someone else
+        # saved first, show what they saved and ask before applying this edit
+        # on top of it; no row stays locked while the clerk decides.
+        while True:
+            try:
+                update(version)
+                return True
+            except ConflictError as e:
+                print(f"{Fore.RED}{e}{Style.RESET_ALL}")
+                show(e.current)
+                answer = self.prompt(f"{Fore.YELLOW}Apply your change to this version? (y/n): {Style.RESET_ALL}")
+                if answer.strip().lower() != 'y':
+                    print(f"{Fore.YELLOW}Your change was not saved.{Style.RESET_ALL}")
+                    return False
+                version = e.current['version']
+
+    def print_patient_details(self, patient):
+        print(f"\n{Fore.CYAN}Current Patient Information:{Style.RESET_ALL}")
+        print(f"ID: {patient['patient_id']}")
+        print(f"Name: {patient['first_name']} {patient['last_name']}")
+        print(f"Date of Birth: {patient['date_of_birth']}")
+        print(f"Gender: {patient['gender']}")
+        print(f"Contact: {patient['contact_number']}")
+        print(f"Email: {patient['email']}")
+        print(f"Address: {patient['address']}")
+        print(f"Blood Group: {patient['blood_group'] or 'N/A'}")
+
+    def update_patient(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Update Patient Information ==={Style.RESET_ALL}")
+            
+            patient_id = self.prompt_patient_id(f"{Fore.YELLOW}Enter Patient ID: {Style.RESET_ALL}")
+            
+            patient = self.service.get_patient_details(patient_id)
+            
+            if not patient:
+                print(f"{Fore.RED}Patient not found.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            
+            self.print_patient_details(patient)
+            
+            print(f"\n{Fore.CYAN}Update Options:{Style.RESET_ALL}")
+            print("1. Contact Number")
+            print("2. Email Address")
+            print("3. Home Address")
+            print("4. Blood Group")
+            print("5. Back to Main Menu")
+            
+            choice = self.prompt(f"\n{Fore.YELLOW}Select an option (1-5): {Style.RESET_ALL}")
+            
+            if choice == '1':
+                while True:
+                    new_contact = self.prompt(f"{Fore.YELLOW}New Contact Number: {Style.RESET_ALL}")
+                    if self.validate_phone(new_contact):
+                        break
+                    print(f"{Fore.RED}Invalid phone number.{Style.RESET_ALL}")
+                
+                if self.apply_edit(lambda version: self.service.update_patient(patient_id, version, contact_number=new_contact),
+                                   patient['version'], self.print_patient_details):
+                    print(f"{Fore.GREEN}Contact number updated successfully.{Style.RESET_ALL}")
+            
+            elif choice == '2':
+                while True:
+                    new_email = self.prompt(f"{Fore.YELLOW}New Email Address: {Style.RESET_ALL}")
+                    if self.validate_email(new_email):
+                        break
+                    print(f"{Fore.RED}Invalid email address.{Style.RESET_ALL}")
+                
+                if self.apply_edit(lambda version: self.service.update_patient(patient_id, version, email=new_email),
+                                   patient['version'], self.print_patient_details):
+                    print(f"{Fore.GREEN}Email address updated successfully.{Style.RESET_ALL}")
+            
+            elif choice == '3':
+                new_address = self.prompt(f"{Fore.YELLOW}New Home Address: {Style.RESET_ALL}")
+                
+                if self.apply_edit(lambda version: self.service.update_patient(patient_id, version, address=new_address),
+                                   patient['version'], self.print_patient_details):
+                    print(f"{Fore.GREEN}Home address updated successfully.{Style.RESET_ALL}")
+            
+            elif choice == '4':
+                new_blood_group = self.prompt(f"{Fore.YELLOW}New Blood Group: {Style.RESET_ALL}")
+                
+                if self.apply_edit(lambda version: self.service.update_patient(patient_id, version, blood_group=new_blood_group),
+                                   patient['version'], self.print_patient_details):
+                    print(f"{Fore.GREEN}Blood group updated successfully.{Style.RESET_ALL}")
+            
+            self.pause(1)
+        
+        except Error as e:
+            print(f"{Fore.RED}Error updating patient information: {e}{Style.RESET_ALL}")
+            self.pause(2)
+
+    def print_bill_details(self, bill):
+        print(f"\n{Fore.CYAN}Current Bill Information:{Style.RESET_ALL}")
+        print(f"Bill ID: {bill['bill_id']}")
+        print(f"Patient: {bill['patient_name']} (ID: {bill['patient_id']})")
+        print(f"Amount: ${bill['total_amount']:.2f}")
+        print(f"Date: {bill['bill_date']}")
+        print(f"Current Status: {bill['payment_status']}")
+
+    def update_bill_status(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Update Bill Payment Status ==={Style.RESET_ALL}")
+            
+            bill_id = self.prompt(f"{Fore.YELLOW}Enter Bill ID: {Style.RESET_ALL}")
+            
+            bill = self.service.get_bill(bill_id)
+            
+            if not bill:
+                print(f"{Fore.RED}Bill not found.{Style.RESET_ALL}")
+                self.pause(2)
+                return
+            
+            self.print_bill_details(bill)
+            
+            print(f"\n{Fore.CYAN}New Payment Status Options:{Style.RESET_ALL}")
+            print("1. Pending")
+            print("2. Paid")
+            print("3. Overdue")
+            
+            choice = self.prompt(f"\n{Fore.YELLOW}Select new status (1-3): {Style.RESET_ALL}")
+            status_options = list(PAYMENT_STATUSES)
+            
+            if choice in ['1', '2', '3']:
+                new_status = status_options[int(choice) - 1]
+                
+                if self.apply_edit(lambda version: self.service.update_bill_status(bill_id, new_status, version),
+                                   bill['version'], self.print_bill_details):
+                    print(f"{Fore.GREEN}Payment status updated to {new_status}.{Style.RESET_ALL}")
+                self.pause(1)
+            else:
+                print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error updating bill status: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def run_transition(self, name, title):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== {title} ==={Style.RESET_ALL}")
+            
+            before = self.prompt(f"{Fore.YELLOW}Apply to rows dated before (YYYY-MM-DD, blank for default): {Style.RESET_ALL}").strip()
+            preview = self.service.bulk_transition(name, before or None, dry_run=True)
+            print(f"\n{preview['matched']} rows are '{preview['from']}' and dated before {preview['cutoff']}.")
+            
+            if not preview['matched']:
+                self.prompt(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
+                return
+            
+            confirm = self.prompt(f"{Fore.YELLOW}Mark them as '{preview['to']}'? (y/n): {Style.RESET_ALL}")
+            if confirm.lower() != 'y':
+                return
+            
+            def progress(report):
+                print(f"{Fore.CYAN}\r{report['updated']} of {preview['matched']} updated{Style.RESET_ALL}", end="")
+            
+            report = self.service.bulk_transition(name, preview['cutoff'], progress=progress)
+            print(f"\n{Fore.GREEN}{report['updated']} rows marked as '{report['to']}' "
+                  f"in {report['seconds']:.2f}s.{Style.RESET_ALL}")
+            self.pause(2)
+        
+        except Error as e:
+            print(f"{Fore.RED}Error updating statuses: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def close_past_appointments(self):
+        print(f"\n{Fore.CYAN}1. Mark as Completed")
+        print(f"2. Mark as No-Show (Cancelled){Style.RESET_ALL}")
+        choice = self.prompt(f"\n{Fore.YELLOW}Select (1-2): {Style.RESET_ALL}")
+        if choice == '1':
+            self.run_transition('complete-appointments', "Complete Past Appointments")
+        elif choice == '2':
+            self.run_transition('no-show-appointments', "Mark Past Appointments as No-Show")
+        else:
+            print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
+            self.pause(1)
+    
+    def mark_overdue_bills(self):
+        self.run_transition('overdue-bills', "Mark Overdue Bills")
+    
+    def view_revenue_reports(self):
+        try:
+            self.clear_screen()
+            print(f"\n{Fore.CYAN}=== Revenue Reports ==={Style.RESET_ALL}")
+            print("1. By Month")
+            print("2. By Department")
+            print("3. By Doctor")
+            
+            choice = self.prompt(f"\n{Fore.YELLOW}Select report (1-3): {Style.RESET_ALL}").strip()
+            reports = {'1': ('month', "Month"), '2': ('department', "Department"), '3': ('doctor', "Doctor")}
+            if choice not in reports:
+                print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
+                self.pause(1)
+                return
+            by, heading = reports[choice]
+            
+            rows = self.service.revenue_report(by)
+            print(f"\n{Fore.CYAN}=== Revenue by {heading} ==={Style.RESET_ALL}")
+            if rows:
+                self.show_table(
+                    [heading, "Bills", "Billed", "Paid", "Pending", "Overdue"],
+                    ([row['label'], row['bills'], f"${row['billed']:.2f}", f"${row['paid']:.2f}",
+                      f"${row['pending']:.2f}", f"${row['overdue']:.2f}"] for row in rows)
+                )
+            else:
+                print(f"{Fore.YELLOW}No bills found.{Style.RESET_ALL}")
+            
+            totals = self.service.outstanding_totals()
+            print(f"\n{Fore.CYAN}Outstanding Receivables:{Style.RESET_ALL}")
+            for status, total in totals.items():
+                print(f"{status}: {total['bills']} bills, ${total['amount']:.2f}")
+            
+            self.prompt(f"\n{Fore.YELLOW}Press Enter to continue...{Style.RESET_ALL}")
+        
+        except Error as e:
+            print(f"{Fore.RED}Error loading revenue reports: {e}{Style.RESET_ALL}")
+            self.pause(2)
+    
+    def clear_screen(self):
+        os.system('cls' if os.name == 'nt' else 'clear')
+    
+    def display_menu(self):
+        self.clear_screen()
+        print(f"\n{Fore.CYAN}{'=' * 50}")
+        print(f"{' ' * 10}HOSPITAL MANAGEMENT SYSTEM")
+        print(f"{'=' * 50}{Style.RESET_ALL}\n")
+        
+        print(f"{Fore.YELLOW}1. {Fore.WHITE}Patient Management{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}a. {Fore.WHITE}Register New Patient{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}b. {Fore.WHITE}View All Patients{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}c. {Fore.WHITE}Update Patient Information{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}d. {Fore.WHITE}Find Patient{Style.RESET_ALL}")
+        
+        print(f"\n{Fore.YELLOW}2. {Fore.WHITE}Doctor Management{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}a. {Fore.WHITE}Register New Doctor{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}b. {Fore.WHITE}View All Doctors{Style.RESET_ALL}")
+        
+        print(f"\n{Fore.YELLOW}3. {Fore.WHITE}Appointment Management{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}a. {Fore.WHITE}Book New Appointment{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}b. {Fore.WHITE}View All Appointments{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}c. {Fore.WHITE}Manage Appointment Status{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}d. {Fore.WHITE}Find Free Slots{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}e. {Fore.WHITE}Close Past Appointments{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}f. {Fore.WHITE}Doctor Availability{Style.RESET_ALL}")
+        
+        print(f"\n{Fore.YELLOW}4. {Fore.WHITE}Medical Records{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}a. {Fore.WHITE}Add New Medical Record{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}b. {Fore.WHITE}View Patient Medical History{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}c. {Fore.WHITE}Search Medical Records{Style.RESET_ALL}")
+        
+        print(f"\n{Fore.YELLOW}5. {Fore.WHITE}Billing{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}a. {Fore.WHITE}Generate New Bill{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}b. {Fore.WHITE}View Billing History{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}c. {Fore.WHITE}Update Payment Status{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}d. {Fore.WHITE}Mark Overdue Bills{Style.RESET_ALL}")
+        print(f"   {Fore.CYAN}e. {Fore.WHITE}Revenue Reports{Style.RESET_ALL}")
+        
+        print(f"\n{Fore.YELLOW}6. {Fore.RED}Exit System{Style.RESET_ALL}")
+    
+    def run(self):
+        if not self.startup.pending and not self.service:
+            print(f"{Fore.RED}Cannot start system without database connection.{Style.RESET_ALL}")
+            return
+        
+        while True:
+            self.display_menu()
+            self.startup.mark('menu')
+            choice = self.prompt(f"\n{Fore.YELLOW}Enter your choice: {Style.RESET_ALL}")
+            # Waits here for a start-up still running in the background.
+            if not self.service:
+                print(f"{Fore.RED}Cannot start system without database connection.{Style.RESET_ALL}")
+                return
+            
+            if choice == '6':
+                self.clear_screen()
+                print(f"\n{Fore.CYAN}Thank you for using the Hospital Management System. Goodbye!{Style.RESET_ALL}")
+                if self.service:
+                    self.service.close()
+                break
+            elif choice in self.MENU_ACTIONS:
+                self.perform_action(self.MENU_ACTIONS[choice])
+            else:
+                print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+                self.pause(1)
+
+if __name__ == "__main__":
+    metrics.configure_from_env()
+    system = HospitalManagementSystem(background=True)
+    system.run()
+    report_from_env(system.startup)
\ No newline at end of file
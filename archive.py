@@ -0,0 +1,307 @@
+import argparse
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+
+from storage import engine_from_env
+from export import BILL_COLUMNS, KINDS, RECORD_COLUMNS
+from history import HISTORY, HOT_YEARS, ArchiveFile, ArchiveError, catalog, hot_start, year_bounds, year_table
+import revenue
+from search import INDEXED_TABLES, log_changes
+
+COLUMN_KINDS = dict(RECORD_COLUMNS + BILL_COLUMNS)
+KEEP_YEARS = 5
+# Rows per gzip member; a patient lookup decompresses only the members
+# whose patient range covers them.
+BLOCK_ROWS = 1000
+CHUNK_SIZE = 5000
+
+
+def _has_rows(service, table, column, year):
+    start, end = year_bounds(year)
+    return service.fetch_one(
+        f"SELECT 1 AS found FROM {table} WHERE {column} >= %s AND {column} < %s LIMIT 1", (start, end)
+    ) is not None
+
+
+def _resident_years(service, table, column, last_year):
+    oldest = service.fetch_one(f"SELECT MIN({column}) AS oldest FROM {table}")['oldest']
+    if not oldest:
+        return []
+    return [year for year in range(int(str(oldest)[:4]), last_year + 1) if _has_rows(service, table, column, year)]
+
+
+def _closed(service, table, year):
+    # A billing year is closed once none of its bills is still outstanding.
+    if not table.startswith('billing'):
+        return True
+    start, end = year_bounds(year)
+    return service.fetch_one(
+        f"""SELECT 1 AS found FROM {table}
+            WHERE payment_status IN ({', '.join(['%s'] * len(revenue.OUTSTANDING))})
+              AND bill_date >= %s AND bill_date < %s LIMIT 1""",
+        revenue.OUTSTANDING + (start, end)
+    ) is None
+
+
+def _record(cursor, table, year, location, row_count, path=None, sha256=None):
+    cursor.execute("SELECT 1 FROM history_partitions WHERE table_name = %s AND year = %s", (table, year))
+    if cursor.fetchone():
+        cursor.execute(
+            """UPDATE history_partitions SET location = %s, path = %s, sha256 = %s,
+                      row_count = CASE WHEN %s = location THEN row_count + %s ELSE %s END
+               WHERE table_name = %s AND year = %s""",
+            (location, path, sha256, location, row_count, row_count, table, year)
+        )
+    else:
+        cursor.execute(
+            """INSERT INTO history_partitions (table_name, year, location, path, row_count, sha256)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            (table, year, location, path, row_count, sha256)
+        )
+
+
+def partition(service, today=None):
+    # Moves closed years before the hot window out of the main tables: into
+    # per-year tables on SQLite, while MySQL only needs partitions made ready
+    # for the coming year.
+    today = today or datetime.date.today()
+    engine = service.engine
+    if engine.name == 'mysql':
+        with service.unit_of_work() as (connection, cursor):
+            engine.add_year_partitions(cursor, 'billing', today.year + 1)
+        return []
+
+    moved = []
+    for table, key, column, _ in HISTORY.values():
+        for year in _resident_years(service, table, column, hot_start(today) - 1):
+            if not _closed(service, table, year):
+                continue
+            start, end = year_bounds(year)
+            where = f"{column} >= %s AND {column} < %s"
+            target = year_table(table, year)
+            with service.unit_of_work() as (connection, cursor):
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {target} AS SELECT * FROM {table} WHERE 0")
+                engine.create_index(cursor, f"idx_{target}_patient", target, ("patient_id", column))
+                if table == 'billing':
+                    revenue.archive_bills(engine, cursor, f"b.{where}", (start, end))
+                cursor.execute(f"INSERT INTO {target} SELECT * FROM {table} WHERE {where}", (start, end))
+                count = cursor.rowcount
+                # Not logged to index_changes: search reads the year tables too.
+                cursor.execute(f"DELETE FROM {table} WHERE {where}", (start, end))
+                _record(cursor, table, year, 'table', count)
+                connection.commit()
+            moved.append({'table': table, 'year': year, 'moved': count})
+    return moved
+
+
+def partition_billing(service, today=None):
+    # MySQL only. Range-partitions billing by year so archive.py can drop a
+    # year with TRUNCATE PARTITION. InnoDB allows no foreign keys on a
+    # partitioned table, so billing's are dropped and the service checks the
+    # patient instead; and the ALTERs copy the table, blocking writes to it
+    # until they finish.
+    if service.engine.name != 'mysql':
+        return False
+    this_year = (today or datetime.date.today()).year
+    with service.unit_of_work() as (connection, cursor):
+        cursor.execute("SELECT MIN(bill_date) AS first FROM billing")
+        first = cursor.fetchone()['first']
+        return service.engine.partition_by_year(cursor, "billing", "bill_id", "bill_date",
+                                                first.year if first else this_year, this_year + 1)
+
+
+def _block(rows, converters):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        row = list(row)
+        for index, convert in converters:
+            if row[index] is not None:
+                row[index] = convert(row[index])
+        writer.writerow(row)
+    return gzip.compress(buffer.getvalue().encode('utf-8'), mtime=0)
+
+
+def write_archive(service, table, key, column, year, path, block_rows=BLOCK_ROWS):
+    start, end = year_bounds(year)
+    temporary = f"{path}.tmp"
+    digest = hashlib.sha256()
+    blocks, count, offset = [], 0, 0
+    with service.pool.connection() as connection, open(temporary, 'wb') as f:
+        cursor = service.engine.stream_cursor(connection)
+        try:
+            cursor.execute(
+                f"""SELECT * FROM {table} WHERE {column} >= %s AND {column} < %s
+                    ORDER BY patient_id, {column} DESC, {key} DESC""",
+                (start, end)
+            )
+            names = [description[0] for description in cursor.description]
+            columns = [(name, COLUMN_KINDS.get(name, 'text')) for name in names]
+            converters = [(index, KINDS[kind][0]) for index, (_, kind) in enumerate(columns) if KINDS[kind][0]]
+            patient = names.index('patient_id')
+
+            def write(data):
+                nonlocal offset
+                f.write(data)
+                digest.update(data)
+                offset += len(data)
+
+            # The header is a member of its own, so the whole file still reads
+            # as one CSV with zcat.
+            write(_block([names], []))
+            while True:
+                rows = cursor.fetchmany(block_rows)
+                if not rows:
+                    break
+                data = _block(rows, converters)
+                blocks.append([rows[0][patient], rows[-1][patient], offset, len(data)])
+                write(data)
+                count += len(rows)
+        finally:
+            cursor.close()
+        f.flush()
+        os.fsync(f.fileno())
+
+    manifest = {'table': table, 'year': year, 'rows': count, 'sha256': digest.hexdigest(),
+                'columns': columns, 'blocks': blocks}
+    with open(f"{path}.json.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+    os.replace(temporary, path)
+    return count, manifest['sha256']
+
+
+def _purge(service, table, key, column, year, chunk_size=CHUNK_SIZE):
+    start, end = year_bounds(year)
+    where = f"{column} >= %s AND {column} < %s"
+    if service.engine.name == 'mysql' and table == 'billing':
+        with service.unit_of_work() as (connection, cursor):
+            cursor.execute(f"SELECT COUNT(*) AS count FROM {table} WHERE {where}", (start, end))
+            count = cursor.fetchone()['count']
+            if not count or service.engine.truncate_year(cursor, table, year):
+                return count
+    purged = 0
+    while True:
+        with service.unit_of_work() as (connection, cursor):
+            cursor.execute(f"SELECT {key} FROM {table} WHERE {where} ORDER BY {key} LIMIT {chunk_size}", (start, end))
+            keys = [row[key] for row in cursor.fetchall()]
+            if not keys:
+                return purged
+            matching = f"{key} IN ({', '.join(['%s'] * len(keys))})"
+            if table in INDEXED_TABLES:
+                log_changes(cursor, table, key, matching, keys)
+            cursor.execute(f"DELETE FROM {table} WHERE {matching}", keys)
+            connection.commit()
+            purged += len(keys)
+
+
+def archive_year(service, kind, year, directory):
+    table, key, column, _ = HISTORY[kind]
+    entry = catalog(service, table).get(year)
+    report = {'table': table, 'year': year, 'archived': 0}
+    # Safe to re-run: a year already in the catalog as archived only has any
+    # rows left behind by an interrupted purge removed.
+    if not entry or entry['location'] != 'archive':
+        source = year_table(table, year) if entry and entry['location'] == 'table' else table
+        path = os.path.abspath(os.path.join(directory, f"{table}-{year}.csv.gz"))
+        count, sha256 = write_archive(service, source, key, column, year, path)
+        with service.unit_of_work() as (connection, cursor):
+            if source == 'billing':
+                start, end = year_bounds(year)
+                revenue.archive_bills(service.engine, cursor, "b.bill_date >= %s AND b.bill_date < %s", (start, end))
+            _record(cursor, table, year, 'archive', count, path, sha256)
+            if source != table:
+                if table in INDEXED_TABLES:
+                    log_changes(cursor, table, key, "1 = 1", source=source)
+                cursor.execute(f"DROP TABLE {source}")
+            connection.commit()
+        report.update(archived=count, path=path)
+    report['purged'] = _purge(service, table, key, column, year)
+    return report
+
+
+def run(service, keep_years=KEEP_YEARS, directory='archive', today=None):
+    today = today or datetime.date.today()
+    last_year = today.year - keep_years
+    os.makedirs(directory, exist_ok=True)
+    reports = []
+    for kind, (table, _, column, _) in HISTORY.items():
+        locations = catalog(service, table)
+        years = {year for year, entry in locations.items() if entry['location'] == 'table' and year <= last_year}
+        years.update(_resident_years(service, table, column, last_year))
+        for year in sorted(years):
+            source = year_table(table, year) if locations.get(year, {}).get('location') == 'table' else table
+            if not _closed(service, source, year):
+                reports.append({'table': table, 'year': year, 'skipped': 'outstanding bills'})
+                continue
+            reports.append(archive_year(service, kind, year, directory))
+    return reports
+
+
+def verify(service):
+    results = []
+    for table, _, _, _ in HISTORY.values():
+        for year, entry in sorted(catalog(service, table).items()):
+            if entry['location'] != 'archive':
+                continue
+            try:
+                ArchiveFile(entry['path'], entry['sha256']).verify()
+                results.append({'table': table, 'year': year, 'ok': True})
+            except (ArchiveError, OSError) as e:
+                results.append({'table': table, 'year': year, 'ok': False, 'error': str(e)})
+    return results
+
+
+def main(argv=None):
+    from services import HospitalService
+
+    parser = argparse.ArgumentParser(description="Year partitions and cold archive for medical records and billing.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('partition', help="move closed years out of the hot tables (MySQL: add next year's partition)")
+    archive = commands.add_parser('run', help="move closed years older than --keep-years into archive files")
+    archive.add_argument('--keep-years', type=int, default=KEEP_YEARS, help="years kept in the database")
+    archive.add_argument('--dir', default='archive', help="where archive files are written")
+    billing = commands.add_parser(
+        'partition-billing',
+        help="MySQL only: range-partition billing by year; drops its foreign keys and locks it while rebuilt"
+    )
+    billing.add_argument('--yes', action='store_true', help="confirm; run in a maintenance window")
+    commands.add_parser('list', help="print where every moved year lives")
+    commands.add_parser('verify', help="check every archive file against its recorded checksum")
+    args = parser.parse_args(argv)
+    if args.command == 'run' and args.keep_years < HOT_YEARS:
+        parser.error(f"--keep-years must be at least {HOT_YEARS}")
+    if args.command == 'partition-billing' and not args.yes:
+        parser.error("partition-billing drops billing's foreign keys and blocks writes to billing while the "
+                     "table is rebuilt; pass --yes to go ahead")
+
+    service = HospitalService(engine_from_env(), pool_size=1)
+    try:
+        service.setup_database()
+        if args.command == 'partition':
+            print(json.dumps(partition(service)))
+        elif args.command == 'partition-billing':
+            print(json.dumps({'partitioned': partition_billing(service)}))
+        elif args.command == 'run':
+            for report in run(service, args.keep_years, args.dir):
+                print(json.dumps(report))
+        elif args.command == 'list':
+            print(json.dumps(service.fetch_all(
+                "SELECT * FROM history_partitions ORDER BY table_name, year"), default=str))
+        else:
+            results = verify(service)
+            print(json.dumps(results))
+            if not all(result['ok'] for result in results):
+                sys.exit(1)
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
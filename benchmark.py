@@ -0,0 +1,241 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from storage import SQLiteEngine, engine_from_env
+from services import HospitalService
+from datagen import generate, parse_scale, plan
+from render import StreamingTable
+from search import INDEXED_TABLES, log_changes
+import revenue
+
+DEFAULT_SCALES = '10k,100k'
+BOOKING_ATTEMPTS = 5
+# kind -> (table, key column) of the rows write operations insert, in the
+# order restore() removes them again.
+CREATED = {
+    'bill': ('billing', 'bill_id'),
+    'record': ('medical_records', 'record_id'),
+    'appointment': ('appointments', 'appointment_id'),
+    'patient': ('patients', 'patient_id')
+}
+
+
+class Benchmark:
+    def __init__(self, service, scale, seed=7, repeat=50):
+        self.service = service
+        self.counts = plan(scale)
+        self.rng = random.Random(seed)
+        self.repeat = repeat
+        self.serial = 0
+        self.today = datetime.date.today()
+        # Highest ID of each table before the run, and the rows the run added.
+        self.last = {}
+        self.created = {kind: [] for kind in CREATED}
+
+    def _max_id(self, table, column):
+        return self.service.fetch_one(f"SELECT MAX({column}) AS last FROM {table}")['last'] or 0
+
+    def operations(self):
+        # Reads pick from the rows that were there before the run. Updates only
+        # touch rows the run inserted itself, so restore() can undo every
+        # write and the next run measures the same dataset.
+        rng = self.rng
+        last = self.last
+        last.update((kind, self._max_id(table, key)) for kind, (table, key) in CREATED.items())
+        last['doctor'] = self._max_id('doctors', 'doctor_id')
+        created = self.created
+
+        def pick(kind):
+            return rng.randint(1, max(last[kind], 1))
+
+        def add(kind, row_id):
+            created[kind].append(row_id)
+
+        def add_patient():
+            self.serial += 1
+            add('patient', self.service.register_patient(
+                'Bench', 'Patient', '1980-01-01', 'Other', '5550000000',
+                f"bench.{os.getpid()}.{time.time_ns()}.{self.serial}@example.com"))
+
+        def book_appointment():
+            # At large scales a doctor can be booked up for the whole month
+            # searched, so another doctor and date are tried; if they are all
+            # full the sample only times the search.
+            for _ in range(BOOKING_ATTEMPTS):
+                doctor_id = pick('doctor')
+                after = datetime.datetime.combine(self.today + datetime.timedelta(days=rng.randint(1, 60)),
+                                                  datetime.time(9))
+                slots = self.service.free_slots(doctor_id, after, 1)
+                if slots:
+                    day, slot = slots[0]
+                    add('appointment', self.service.book_appointment(pick('patient'), doctor_id, day, slot, 'Benchmark'))
+                    return
+
+        def manage_appointment():
+            # Only when some booking above found a free slot.
+            if created['appointment']:
+                self.service.cancel_appointment(rng.choice(created['appointment']))
+
+        def day_range():
+            day = (self.today - datetime.timedelta(days=rng.randint(0, 365))).isoformat()
+            return day, day
+
+        return [
+            ('add_patient', add_patient),
+            ('view_patients', lambda: self.service.patient_pager().first()),
+            ('view_patients (name prefix)', lambda: self.service.patient_pager(name_prefix=rng.choice('ABCJMS')).first()),
+            ('update_patient', lambda: self.service.update_patient(rng.choice(created['patient']),
+                                                                   address='1 Benchmark Way')),
+            ('view_doctors', lambda: self.service.doctor_pager().first()),
+            ('find_free_slots', lambda: self.service.free_slots(pick('doctor'))),
+            ('book_appointment', book_appointment),
+            ('view_appointments (day)', lambda: self.service.appointment_pager(*day_range()).first()),
+            ('view_appointments (doctor)', lambda: self.service.appointment_pager(doctor_id=pick('doctor')).first()),
+            ('view_appointments (patient)', lambda: self.service.appointment_pager(patient_id=pick('patient')).first()),
+            ('view_appointments (status)', lambda: self.service.appointment_pager(status='Scheduled').first()),
+            ('manage_appointments', manage_appointment),
+            ('add_medical_record', lambda: add('record', self.service.add_medical_record(
+                pick('patient'), pick('doctor'), 'Benchmark', 'None', 'None'))),
+            ('view_medical_records', lambda: self.service.medical_record_pager(pick('patient')).first()),
+            ('generate_bill', lambda: add('bill', self.service.generate_bill(pick('patient'), 100))),
+            ('view_billing_history', lambda: self.service.billing_pager(pick('patient')).first()),
+            ('update_bill_status', lambda: self.service.update_bill_status(rng.choice(created['bill']), 'Paid')),
+            ('overdue_bills (dry run)', lambda: self.service.bulk_transition('overdue-bills', dry_run=True))
+        ]
+
+    def measure(self, operation):
+        operation()
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            operation()
+            timings.append((time.perf_counter() - started) * 1000)
+        # Peak memory is taken from a separate call, because tracing slows
+        # allocation-heavy operations down too much to time them at the same time.
+        tracemalloc.start()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings.sort()
+        return {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0], 3),
+            'max_ms': round(timings[-1], 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'peak_kb': round(peak / 1024, 1)
+        }
+
+    def run(self, progress=None):
+        results = {}
+        try:
+            for name, operation in self.operations():
+                results[name] = self.measure(operation)
+                if progress:
+                    progress(name, results[name])
+        finally:
+            self.restore()
+        return results
+
+    def restore(self):
+        # Deletes every row inserted since operations() was called, taking the
+        # bills back out of the revenue summaries and the records and patients
+        # out of the search indexes.
+        if not self.last:
+            return
+        engine = self.service.engine
+        with self.service.unit_of_work() as (connection, cursor):
+            cursor.execute(engine.begin_write)
+            facts = revenue.bill_facts(engine, cursor, "b.bill_id > %s", (self.last['bill'],))
+            revenue.apply(engine, cursor, facts, -1)
+            for kind, (table, key) in CREATED.items():
+                where, params = f"{key} > %s", (self.last[kind],)
+                if table in INDEXED_TABLES:
+                    log_changes(cursor, table, key, where, params)
+                cursor.execute(f"DELETE FROM {table} WHERE {where}", params)
+            connection.commit()
+        self.service.schedule.invalidate()
+        self.service.patients.invalidate()
+        self.created = {kind: [] for kind in CREATED}
+
+
+def dataset(scale, seed, workdir):
+    engine = engine_from_env()
+    if engine.name == 'sqlite':
+        engine = SQLiteEngine(os.path.join(workdir, f"hms-bench-{scale}-{seed}.db"))
+    service = HospitalService(engine, pool_size=2)
+    service.setup_database()
+    if service.fetch_one("SELECT COUNT(*) AS rows FROM patients")['rows']:
+        return service, None
+    return service, generate(engine, scale, seed)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale, {}).get('operations', {})
+        for name, stats in current['operations'].items():
+            if name in previous and stats['p50_ms'] > previous[name]['p50_ms'] * tolerance:
+                regressions.append((scale, name, previous[name]['p50_ms'], stats['p50_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every operation against seeded datasets of growing size.")
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help="comma separated, e.g. 10k,100k,1m,10m")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--workdir', default='.', help="where SQLite datasets are created and reused")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="fail when a median latency grows by more than this factor")
+    args = parser.parse_args(argv)
+
+    scales = [parse_scale(scale) for scale in args.scales.split(',')]
+    if engine_from_env().name != 'sqlite' and len(scales) > 1:
+        parser.error("a MySQL database holds one dataset; run one scale per database")
+
+    results = {'started': datetime.datetime.now().isoformat(timespec='seconds'), 'seed': args.seed,
+               'repeat': args.repeat, 'scales': {}}
+    for scale in scales:
+        print(f"Preparing dataset for scale {scale}...", file=sys.stderr)
+        service, load = dataset(scale, args.seed, args.workdir)
+        try:
+            benchmark = Benchmark(service, scale, args.seed, args.repeat)
+            operations = benchmark.run(lambda name, stats: print(
+                f"  {name}: {stats['p50_ms']:.2f} ms median", file=sys.stderr))
+        finally:
+            service.close()
+        results['scales'][str(scale)] = {'load': load, 'operations': operations}
+
+        print(f"\nScale {scale}" + (f" (loaded {load['rows']} rows in {load['seconds']:.1f}s)" if load else ""))
+        rows = [[name] + [stats[key] for key in ('p50_ms', 'p95_ms', 'max_ms', 'peak_kb')]
+                for name, stats in operations.items()]
+        table = StreamingTable(['Operation', 'p50 ms', 'p95 ms', 'max ms', 'peak KB'], rows)
+        print(table.header())
+        for row in rows:
+            print(table.row(row))
+        print(table.footer())
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for scale, name, before, after in regressions:
+            print(f"REGRESSION at scale {scale}: {name} median {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SummaryCache:
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.metrics['expired'] += 1
+                entry = None
+            if entry is None:
+                self.metrics['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            return dict(entry[1])
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+
+    def get_or_load(self, key, load):
+        value = self.get(key)
+        if value is None:
+            # Misses are not cached, so a row created later is found on the next lookup.
+            value = load()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.metrics['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            lookups = stats['hits'] + stats['misses']
+            stats.update(size=len(self._entries), max_entries=self.max_entries,
+                         hit_rate=round(stats['hits'] / lookups, 3) if lookups else 0.0)
+            return stats
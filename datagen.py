@@ -0,0 +1,258 @@
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+
+from storage import engine_from_env
+from migrations import migrate
+import revenue
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+    'Aarav', 'Priya', 'Wei', 'Mei', 'Mohammed', 'Fatima', 'Carlos', 'Sofia', 'Kenji', 'Yuki',
+    'Olga', 'Ivan', 'Amara', 'Kwame', 'Noah', 'Emma', 'Liam', 'Olivia', 'Lucas', 'Mia'
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Sharma', 'Patel', 'Chen', 'Wang', 'Khan', 'Ali', 'Silva', 'Santos', 'Tanaka', 'Sato',
+    'Ivanov', 'Petrova', 'Okafor', 'Mensah', 'Nguyen', 'Kim', 'Lee', 'Park', 'Cohen', 'Muller'
+]
+STREETS = ['Main St', 'Oak Ave', 'Maple Dr', 'Cedar Ln', 'Park Rd', 'Lake View', 'Hill St', 'River Rd']
+CITIES = ['Springfield', 'Riverside', 'Fairview', 'Georgetown', 'Franklin', 'Clinton', 'Madison', 'Salem']
+BLOOD_GROUPS = ['O+', 'O+', 'O+', 'A+', 'A+', 'B+', 'AB+', 'O-', 'A-', 'B-', 'AB-']
+SPECIALIZATIONS = [
+    ('Cardiology', 'Cardiology'), ('Neurology', 'Neurology'), ('Orthopedics', 'Surgery'),
+    ('General Surgery', 'Surgery'), ('Pediatrics', 'Pediatrics'), ('Dermatology', 'Outpatient'),
+    ('General Medicine', 'Outpatient'), ('Oncology', 'Oncology'), ('Radiology', 'Diagnostics'),
+    ('Psychiatry', 'Mental Health'), ('Gynecology', 'Women\'s Health'), ('ENT', 'Outpatient')
+]
+VISITS = [
+    ('Hypertension', 'Amlodipine 5mg daily', 'Low-sodium diet, review in 3 months'),
+    ('Type 2 diabetes', 'Metformin 500mg twice daily', 'Monitor HbA1c, dietary counselling'),
+    ('Upper respiratory infection', 'Rest and fluids', 'Return if fever persists beyond 5 days'),
+    ('Migraine', 'Sumatriptan 50mg as needed', 'Headache diary, avoid triggers'),
+    ('Lower back pain', 'Ibuprofen 400mg as needed', 'Physiotherapy twice weekly'),
+    ('Eczema', 'Hydrocortisone cream 1%', 'Moisturise daily, avoid irritants'),
+    ('Anxiety disorder', 'Sertraline 50mg daily', 'Cognitive behavioural therapy'),
+    ('Fractured wrist', 'Paracetamol 1g as needed', 'Cast for 6 weeks, follow-up X-ray'),
+    ('Asthma', 'Salbutamol inhaler as needed', 'Peak flow monitoring'),
+    ('Routine check-up', 'None', 'Annual review')
+]
+REASONS = ['Check-up', 'Follow-up', 'Consultation', 'Test results', 'Prescription renewal', 'New symptoms']
+SLOT_TIMES = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(9 * 60, 17 * 60, 30)]
+
+INSERTS = {
+    'patients': """INSERT INTO patients
+        (patient_id, first_name, last_name, date_of_birth, gender, contact_number,
+        email, address, blood_group, registration_date)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+    'doctors': """INSERT INTO doctors
+        (doctor_id, first_name, last_name, specialization, contact_number,
+        email, department, joining_date, consultation_fee)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+    'appointments': """INSERT INTO appointments
+        (patient_id, doctor_id, appointment_date, appointment_time, status, reason)
+        VALUES (%s, %s, %s, %s, %s, %s)""",
+    'medical_records': """INSERT INTO medical_records
+        (patient_id, doctor_id, diagnosis, prescription, treatment_plan, visit_date)
+        VALUES (%s, %s, %s, %s, %s, %s)""",
+    'billing': """INSERT INTO billing
+        (patient_id, doctor_id, total_amount, payment_status, bill_date)
+        VALUES (%s, %s, %s, %s, %s)"""
+}
+TABLES = list(INSERTS)
+
+
+def parse_scale(value):
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def plan(scale):
+    # Rough shape of a mid-sized hospital: most rows are appointments, and
+    # roughly every other completed visit produces a record and a bill.
+    return {
+        'patients': max(scale // 5, 10),
+        'doctors': max(scale // 1000, 5),
+        'appointments': max(scale * 2 // 5, 10)
+    }
+
+
+class DataGenerator:
+    def __init__(self, scale, seed=42, start=datetime.date(2018, 1, 1), as_of=None, first_ids=(1, 1)):
+        self.counts = plan(scale)
+        self.seed = seed
+        self.start = start
+        self.as_of = as_of or datetime.date.today()
+        self.first_patient, self.first_doctor = first_ids
+
+    def fee(self, offset):
+        return 50 + 25 * (offset % 11)
+
+    def _person(self, rng, identifier, domain):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        email = f"{first_name}.{last_name}.{identifier}@{domain}".lower()
+        phone = f"{rng.randint(200, 999)}{rng.randint(0, 9999999):07d}"
+        return first_name, last_name, phone, email
+
+    def _day(self, rng, first, last):
+        return first + datetime.timedelta(days=rng.randint(0, (last - first).days))
+
+    def patients(self):
+        rng = random.Random(f"{self.seed}:patients")
+        for offset in range(self.counts['patients']):
+            patient_id = self.first_patient + offset
+            first_name, last_name, phone, email = self._person(rng, patient_id, 'example.com')
+            birth = self._day(rng, datetime.date(1930, 1, 1), datetime.date(2020, 12, 31))
+            registered = self._day(rng, self.start, self.as_of)
+            yield (patient_id, first_name, last_name, birth.isoformat(),
+                   rng.choice(('Male', 'Female', 'Female', 'Male', 'Other')), phone, email,
+                   f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+                   rng.choice(BLOOD_GROUPS), f"{registered.isoformat()} 08:00:00")
+
+    def doctors(self):
+        rng = random.Random(f"{self.seed}:doctors")
+        for offset in range(self.counts['doctors']):
+            doctor_id = self.first_doctor + offset
+            first_name, last_name, phone, email = self._person(rng, doctor_id, 'hospital.example.org')
+            specialization, department = SPECIALIZATIONS[offset % len(SPECIALIZATIONS)]
+            joined = self._day(rng, datetime.date(2000, 1, 1), self.start)
+            yield (doctor_id, first_name, last_name, specialization, phone, email, department,
+                   joined.isoformat(), float(self.fee(offset)))
+
+    def visits(self):
+        # Appointments, plus the records and bills of completed visits, as (table, row).
+        rng = random.Random(f"{self.seed}:appointments")
+        last_day = self.as_of + datetime.timedelta(days=60)
+        days = (last_day - self.start).days + 1
+        total_slots = days * len(SLOT_TIMES)
+        doctors, remaining = self.counts['doctors'], self.counts['appointments']
+        patients = self.counts['patients']
+
+        for offset in range(doctors):
+            doctor_id = self.first_doctor + offset
+            fee = self.fee(offset)
+            share = min(remaining // (doctors - offset), total_slots)
+            remaining -= share
+            # Distinct slot numbers per doctor, so the data never double-books.
+            for slot in sorted(rng.sample(range(total_slots), share)):
+                day = self.start + datetime.timedelta(days=slot // len(SLOT_TIMES))
+                patient_id = self.first_patient + rng.randrange(patients)
+                if day < self.as_of:
+                    status = rng.choices(('Completed', 'Cancelled', 'Scheduled'), (85, 10, 5))[0]
+                else:
+                    status = rng.choices(('Scheduled', 'Cancelled'), (95, 5))[0]
+                yield 'appointments', (patient_id, doctor_id, day.isoformat(),
+                                       SLOT_TIMES[slot % len(SLOT_TIMES)], status, rng.choice(REASONS))
+                if status != 'Completed':
+                    continue
+                visited = f"{day.isoformat()} {SLOT_TIMES[slot % len(SLOT_TIMES)]}:00"
+                if rng.random() < 0.5:
+                    yield 'medical_records', (patient_id, doctor_id) + rng.choice(VISITS) + (visited,)
+                if rng.random() < 0.5:
+                    age = (self.as_of - day).days
+                    payment = 'Paid' if age > 90 or rng.random() < 0.6 else ('Overdue' if age > 30 else 'Pending')
+                    yield 'billing', (patient_id, doctor_id, round(fee + rng.choice((0, 0, 20, 45.5, 120)), 2),
+                                      payment, visited)
+
+
+class DataLoader:
+    def __init__(self, engine, batch_size=5000, progress=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.progress = progress
+        self.loaded = dict.fromkeys(TABLES, 0)
+        self.started = None
+
+    def flush(self, connection, cursor, table, batch):
+        if batch:
+            cursor.executemany(INSERTS[table], batch)
+            connection.commit()
+            self.loaded[table] += len(batch)
+            batch.clear()
+            if self.progress:
+                self.progress(self.report())
+
+    def load(self, table_rows, connection, cursor):
+        batches = {table: [] for table in TABLES}
+        for table, row in table_rows:
+            batch = batches[table]
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.flush(connection, cursor, table, batch)
+        for table in TABLES:
+            self.flush(connection, cursor, table, batches[table])
+
+    def run(self, generator):
+        self.started = time.perf_counter()
+        connection = self.engine.connect()
+        cursor = self.engine.cursor(connection)
+        try:
+            migrate(self.engine, connection, cursor)
+            if self.engine.name == 'mysql':
+                # Generated rows are consistent by construction, so skip the
+                # per-row checks for the duration of the load.
+                cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+            self.load((('patients', row) for row in generator.patients()), connection, cursor)
+            self.load((('doctors', row) for row in generator.doctors()), connection, cursor)
+            self.load(generator.visits(), connection, cursor)
+            # Bulk loading bypasses the incremental upkeep, so refresh the summaries once.
+            revenue.rebuild(self.engine, cursor)
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+        return self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        rows = sum(self.loaded.values())
+        return dict(self.loaded, rows=rows, seconds=round(elapsed, 3),
+                    rows_per_second=round(rows / elapsed, 1) if elapsed else 0.0)
+
+
+def next_ids(engine):
+    connection = engine.connect()
+    cursor = engine.cursor(connection)
+    try:
+        migrate(engine, connection, cursor)
+        cursor.execute("SELECT MAX(patient_id) AS last FROM patients")
+        last_patient = cursor.fetchone()['last'] or 0
+        cursor.execute("SELECT MAX(doctor_id) AS last FROM doctors")
+        last_doctor = cursor.fetchone()['last'] or 0
+    finally:
+        cursor.close()
+        connection.close()
+    return last_patient + 1, last_doctor + 1
+
+
+def generate(engine, scale, seed=42, as_of=None, batch_size=5000, progress=None):
+    generator = DataGenerator(scale, seed, as_of=as_of, first_ids=next_ids(engine))
+    return DataLoader(engine, batch_size, progress).run(generator)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a seeded synthetic hospital dataset.")
+    parser.add_argument('scale', type=parse_scale, help="approximate total rows, e.g. 10k, 100k, 1m, 10m")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--as-of', type=datetime.date.fromisoformat,
+                        help="day that separates past from upcoming appointments (default today)")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    def progress(report):
+        print(f"\r{report['rows']} rows loaded, {report['rows_per_second']:.0f} rows/s", end="", file=sys.stderr)
+
+    report = generate(engine_from_env(), args.scale, args.seed, args.as_of, args.batch_size, progress)
+    print(file=sys.stderr)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import argparse
+import csv
+import datetime
+import decimal
+import gzip
+import json
+import os
+import sys
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from storage import StorageError, engine_from_env
+from migrations import current_version, latest_version
+from services import APPOINTMENT_DETAILS
+from history import HISTORY, with_year_tables
+
+PATIENT_COLUMNS = [('patient_id', 'int'), ('first_name', 'text'), ('last_name', 'text'),
+                   ('date_of_birth', 'date'), ('gender', 'text'), ('contact_number', 'text'),
+                   ('email', 'text'), ('address', 'text'), ('blood_group', 'text'),
+                   ('registration_date', 'timestamp')]
+DOCTOR_COLUMNS = [('doctor_id', 'int'), ('first_name', 'text'), ('last_name', 'text'),
+                  ('specialization', 'text'), ('contact_number', 'text'), ('email', 'text'),
+                  ('department', 'text'), ('joining_date', 'date'), ('consultation_fee', 'money')]
+APPOINTMENT_COLUMNS = [('appointment_id', 'int'), ('patient_id', 'int'), ('doctor_id', 'int'),
+                       ('appointment_date', 'date'), ('appointment_time', 'time'), ('status', 'text'),
+                       ('reason', 'text')]
+RECORD_COLUMNS = [('record_id', 'int'), ('patient_id', 'int'), ('doctor_id', 'int'), ('diagnosis', 'text'),
+                  ('prescription', 'text'), ('treatment_plan', 'text'), ('visit_date', 'timestamp')]
+BILL_COLUMNS = [('bill_id', 'int'), ('patient_id', 'int'), ('doctor_id', 'int'), ('total_amount', 'money'),
+                ('payment_status', 'text'), ('bill_date', 'timestamp')]
+APPOINTMENT_DETAIL_COLUMNS = [('appointment_id', 'int'), ('appointment_date', 'date'),
+                              ('appointment_time', 'time'), ('status', 'text'), ('reason', 'text'),
+                              ('patient_id', 'int'), ('patient_name', 'text'), ('doctor_id', 'int'),
+                              ('doctor_name', 'text'), ('specialization', 'text')]
+
+
+def _select(table, columns):
+    return f"SELECT {', '.join(column for column, _ in columns)} FROM {table}"
+
+
+# name -> (query, key column, watermark column or None, [(column, kind)])
+EXPORTS = {
+    'patients': (_select('patients', PATIENT_COLUMNS), 'patient_id', 'registration_date', PATIENT_COLUMNS),
+    'doctors': (_select('doctors', DOCTOR_COLUMNS), 'doctor_id', None, DOCTOR_COLUMNS),
+    'appointments': (_select('appointments', APPOINTMENT_COLUMNS), 'appointment_id', None, APPOINTMENT_COLUMNS),
+    'medical_records': (_select('medical_records', RECORD_COLUMNS), 'record_id', 'visit_date', RECORD_COLUMNS),
+    'billing': (_select('billing', BILL_COLUMNS), 'bill_id', 'bill_date', BILL_COLUMNS),
+    # The listing behind view_appointments, with patient and doctor names joined in.
+    'appointment_details': (APPOINTMENT_DETAILS, 'a.appointment_id', None, APPOINTMENT_DETAIL_COLUMNS)
+}
+FORMATS = {'csv': '.csv.gz', 'parquet': '.parquet'}
+CENT = decimal.Decimal('0.01')
+
+
+def _time(value):
+    # MySQL returns TIME columns as timedelta, SQLite as the stored 'HH:MM'.
+    if isinstance(value, datetime.timedelta):
+        minutes = int(value.total_seconds()) // 60
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return str(value)[:5]
+
+
+def _money(value):
+    return decimal.Decimal(str(value)).quantize(CENT)
+
+
+def _date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value)[:10])
+
+
+def _timestamp(value):
+    return value if isinstance(value, datetime.datetime) else datetime.datetime.fromisoformat(str(value))
+
+
+# kind -> (CSV conversion or None, Parquet conversion or None, Parquet type)
+KINDS = {
+    'int': (None, None, lambda: pyarrow.int64()),
+    'text': (None, None, lambda: pyarrow.string()),
+    'time': (_time, _time, lambda: pyarrow.string()),
+    'money': (_money, _money, lambda: pyarrow.decimal128(12, 2)),
+    'date': (None, _date, lambda: pyarrow.date32()),
+    'timestamp': (None, _timestamp, lambda: pyarrow.timestamp('s'))
+}
+
+
+def _converters(columns, position):
+    return [(index, KINDS[kind][position]) for index, (_, kind) in enumerate(columns) if KINDS[kind][position]]
+
+
+def _convert(rows, converters):
+    if not converters:
+        return rows
+    converted = []
+    for row in rows:
+        row = list(row)
+        for index, convert in converters:
+            if row[index] is not None:
+                row[index] = convert(row[index])
+        converted.append(row)
+    return converted
+
+
+class CSVWriter:
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column for column, _ in columns])
+        self.converters = _converters(columns, 0)
+
+    def write(self, rows):
+        self.writer.writerows(_convert(rows, self.converters))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, columns):
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for Parquet exports")
+        self.schema = pyarrow.schema([(column, KINDS[kind][2]()) for column, kind in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+        self.converters = _converters(columns, 1)
+
+    def write(self, rows):
+        # Each chunk becomes one row group, so only one chunk is ever held in memory.
+        rows = _convert(rows, self.converters)
+        arrays = [pyarrow.array([row[index] for row in rows], type=field.type)
+                  for index, field in enumerate(self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'csv': CSVWriter, 'parquet': ParquetWriter}
+
+
+def check_schema(engine, connection):
+    # Exports only read; migrating is left to the application or migrations.py.
+    cursor = engine.cursor(connection)
+    try:
+        version = current_version(cursor)
+    finally:
+        cursor.close()
+    if version is None or version < latest_version():
+        raise StorageError(f"The database schema is at version {version or 0} but export needs version "
+                           f"{latest_version()}. Run 'python migrations.py' first.")
+
+
+class TableExport:
+    def __init__(self, engine, name, fmt='csv', chunk_size=5000, progress=None):
+        self.query, self.key, self.watermark_column, self.columns = EXPORTS[name]
+        self.engine = engine
+        self.name = name
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.exported = 0
+        self.watermark = None
+        self.started = None
+
+    def statement(self, since=None):
+        if since is None:
+            return f"{self.query} ORDER BY {self.key}", []
+        if not self.watermark_column:
+            raise ValueError(f"{self.name} has no watermark column; export it in full")
+        # The key breaks ties between rows written in the same second, so an
+        # interrupted or repeated run never skips or duplicates a row.
+        value, key = since
+        return (f"""{self.query}
+                    WHERE {self.watermark_column} > %s OR ({self.watermark_column} = %s AND {self.key} > %s)
+                    ORDER BY {self.watermark_column}, {self.key}""",
+                [value, value, key])
+
+    def run(self, path, since=None, connection=None):
+        self.started = time.perf_counter()
+        watermark = None
+        if self.watermark_column:
+            watermark_index = [column for column, _ in self.columns].index(self.watermark_column)
+            key_index = [column for column, _ in self.columns].index(self.key.split('.')[-1])
+
+        owns_connection = connection is None
+        if owns_connection:
+            connection = self.engine.connect()
+        temporary = f"{path}.tmp"
+        writer = WRITERS[self.fmt](temporary, self.columns)
+        try:
+            if owns_connection:
+                check_schema(self.engine, connection)
+            if self.name in HISTORY:
+                self.query = _select(with_year_tables(self.name, self.moved_years(connection),
+                                                      ', '.join(column for column, _ in self.columns)), self.columns)
+            query, params = self.statement(since)
+            cursor = self.engine.stream_cursor(connection)
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        break
+                    writer.write(rows)
+                    self.exported += len(rows)
+                    if self.watermark_column:
+                        latest = max((str(row[watermark_index]), row[key_index]) for row in rows)
+                        watermark = max(watermark, latest) if watermark else latest
+                    if self.progress:
+                        self.progress(self.report())
+            finally:
+                cursor.close()
+        except BaseException:
+            writer.close()
+            os.remove(temporary)
+            raise
+        finally:
+            if owns_connection:
+                connection.close()
+        writer.close()
+        os.replace(temporary, path)
+        self.watermark = watermark or since
+        return self.report()
+
+    def moved_years(self, connection):
+        # Years moved to year tables (SQLite) are exported with the rest;
+        # years moved to archive files are not.
+        cursor = self.engine.cursor(connection)
+        try:
+            cursor.execute("SELECT year FROM history_partitions WHERE table_name = %s AND location = 'table'",
+                           (self.name,))
+            return sorted(row['year'] for row in cursor.fetchall())
+        finally:
+            cursor.close()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'export': self.name,
+            'format': self.fmt,
+            'exported': self.exported,
+            'watermark': list(self.watermark) if self.watermark else None,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.exported / elapsed, 1) if elapsed else 0.0
+        }
+
+
+def load_state(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return {name: tuple(watermark) for name, watermark in json.load(f).items()}
+
+
+def save_state(path, state):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump({name: list(watermark) for name, watermark in state.items()}, f, indent=2)
+    os.replace(temporary, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream tables to compressed CSV or Parquet files.")
+    parser.add_argument('exports', nargs='+', choices=sorted(EXPORTS) + ['all'])
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--dir', default='.', help="where export files are written")
+    parser.add_argument('--since', help="only rows with a later registration, visit or bill date")
+    parser.add_argument('--state', help="JSON file of watermarks; each run exports only rows added since the last")
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    names = sorted(EXPORTS) if 'all' in args.exports else list(dict.fromkeys(args.exports))
+    state = load_state(args.state)
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    engine = engine_from_env()
+    os.makedirs(args.dir, exist_ok=True)
+
+    def progress(report):
+        print(f"\r{report['export']}: {report['exported']} rows, "
+              f"{report['rows_per_second']:.0f} rows/s", end="", file=sys.stderr)
+
+    for name in names:
+        watermark_column = EXPORTS[name][2]
+        since = state.get(name) if watermark_column else None
+        if args.since and watermark_column:
+            since = (args.since, 0)
+        # Incremental files are stamped so earlier batches are never overwritten.
+        path = os.path.join(args.dir, f"{name}-{stamp}{FORMATS[args.format]}" if since
+                            else f"{name}{FORMATS[args.format]}")
+        try:
+            report = TableExport(engine, name, args.format, args.chunk_size, progress).run(path, since)
+        except StorageError as e:
+            parser.exit(1, f"export: {e}\n")
+        print(file=sys.stderr)
+        print(json.dumps(dict(report, path=path)))
+        if args.state and report['watermark']:
+            state[name] = tuple(report['watermark'])
+            save_state(args.state, state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import argparse
+import bisect
+import functools
+import heapq
+import itertools
+import json
+import re
+import sys
+import threading
+
+from storage import engine_from_env
+from search import last_change, load_snapshot, read_changes, save_snapshot
+from validation import DATE_PATTERN
+
+NAME_PATTERN = re.compile(r'[a-z]+')
+PHONE_QUERY_PATTERN = re.compile(r'^[+()\d-]*\d[+()\d-]*$')
+MIN_PHONE_DIGITS = 4
+PREFIX_SCORE = 0.9
+# Misspellings are found among the vocabulary tokens sharing the most
+# trigrams with the query, then confirmed by edit distance.
+FUZZY_CANDIDATES = 50
+FUZZY_THRESHOLD = 0.7
+# One typo is always allowed, or no misspelled short name (ane for ann,
+# 0.67) would ever reach the threshold.
+FUZZY_EDITS = 1
+PATIENT_COLUMNS = "patient_id, first_name, last_name, date_of_birth, contact_number, email"
+
+
+@functools.lru_cache(maxsize=65536)
+def name_tokens(name):
+    tokens = tuple(NAME_PATTERN.findall((name or '').lower()))
+    # "O'Brien" and "Mary-Ann" are also typed as one word.
+    return tokens + (''.join(tokens),) if len(tokens) > 1 else tokens
+
+
+def _trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _digits(phone):
+    return ''.join(character for character in phone or '' if character.isdigit())
+
+
+def _distance(a, b):
+    # Optimal string alignment: edits plus swaps of adjacent letters, the
+    # most common typing mistake in a name.
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def parse_query(query):
+    criteria = {'names': [], 'phones': [], 'emails': [], 'births': []}
+    for word in re.split(r'[\s,;]+', (query or '').strip()):
+        if not word:
+            continue
+        if '@' in word:
+            criteria['emails'].append(word.lower())
+        elif DATE_PATTERN.match(word):
+            criteria['births'].append(word)
+        elif PHONE_QUERY_PATTERN.match(word):
+            criteria['phones'].append(_digits(word))
+        else:
+            criteria['names'].extend(token for token in name_tokens(word) if len(token) > 1)
+    return criteria
+
+
+def _values(rows):
+    columns = PATIENT_COLUMNS.split(', ')
+    return [tuple(row[column] for column in columns) for row in rows]
+
+
+class PatientIndex:
+    def __init__(self):
+        # patient_id -> (first_name, last_name, date_of_birth, contact_number, email)
+        self.people = {}
+        self.tokens = {}
+        self.vocabulary = []
+        self.trigrams = {}
+        # Sorted (reversed phone digits, patient_id), so a phone suffix is a prefix range.
+        self.phones = []
+        self.emails = []
+        self.births = {}
+        self.watermark = 0
+        # Last index_changes entry applied.
+        self.changes = 0
+
+    def add(self, patient_id, first_name, last_name, date_of_birth, contact_number, email):
+        self.add_all([(patient_id, first_name, last_name, date_of_birth, contact_number, email)])
+
+    def add_all(self, rows):
+        # New entries are appended and the sorted lists re-sorted once, which
+        # keeps building the index from a large table linear rather than quadratic.
+        phones, emails, words = [], [], []
+        for row in rows:
+            self._add(*row, phones, emails, words)
+        for entries, added in ((self.phones, phones), (self.emails, emails), (self.vocabulary, words)):
+            if len(added) == 1:
+                bisect.insort(entries, added[0])
+            elif added:
+                entries.extend(added)
+                entries.sort()
+
+    def _add(self, patient_id, first_name, last_name, date_of_birth, contact_number, email, phones, emails, words):
+        self.remove(patient_id)
+        date_of_birth = sys.intern(str(date_of_birth)[:10])
+        person = (sys.intern(first_name), sys.intern(last_name), date_of_birth, contact_number, email)
+        self.people[patient_id] = person
+        for token in set(name_tokens(first_name) + name_tokens(last_name)):
+            owners = self.tokens.get(token)
+            if owners is None:
+                owners = self.tokens[token] = set()
+                words.append(token)
+                for trigram in _trigrams(token):
+                    self.trigrams.setdefault(trigram, set()).add(token)
+            owners.add(patient_id)
+        phones.append((_digits(contact_number)[::-1], patient_id))
+        emails.append(((email or '').lower(), patient_id))
+        self.births.setdefault(date_of_birth, set()).add(patient_id)
+        self.watermark = max(self.watermark, patient_id)
+
+    def remove(self, patient_id):
+        person = self.people.pop(patient_id, None)
+        if person is None:
+            return
+        first_name, last_name, date_of_birth, contact_number, email = person
+        for token in set(name_tokens(first_name) + name_tokens(last_name)):
+            self.tokens[token].discard(patient_id)
+        for entries, key in ((self.phones, _digits(contact_number)[::-1]), (self.emails, (email or '').lower())):
+            position = bisect.bisect_left(entries, (key, patient_id))
+            if position < len(entries) and entries[position] == (key, patient_id):
+                del entries[position]
+        self.births[date_of_birth].discard(patient_id)
+
+    def snapshot(self):
+        return {'watermark': self.watermark, 'changes': self.changes,
+                'people': [[patient_id, *person] for patient_id, person in self.people.items()]}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        index = cls()
+        index.add_all(tuple(person) for person in data['people'])
+        index.watermark, index.changes = data['watermark'], data['changes']
+        return index
+
+    def similar(self, token):
+        matches = {}
+        position = bisect.bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+            candidate = self.vocabulary[position]
+            matches[candidate] = 1.0 if candidate == token else PREFIX_SCORE
+            position += 1
+        if len(token) >= 3:
+            shared = {}
+            for trigram in _trigrams(token):
+                for candidate in self.trigrams.get(trigram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            # Short tokens share a trigram with many names; those closest in
+            # length go first.
+            candidates = [candidate for candidate in shared
+                          if candidate not in matches and abs(len(candidate) - len(token)) <= 2]
+            for candidate in heapq.nlargest(FUZZY_CANDIDATES, candidates, key=lambda candidate: (
+                    shared[candidate], -abs(len(candidate) - len(token)))):
+                distance = _distance(token, candidate)
+                score = 1 - distance / max(len(token), len(candidate))
+                if score >= FUZZY_THRESHOLD or distance <= FUZZY_EDITS:
+                    matches[candidate] = round(score, 2)
+        return {candidate: score for candidate, score in matches.items() if self.tokens[candidate]}
+
+    def levels(self, token):
+        # (score, patients) from best to worst; a patient is listed under the
+        # best score any of their name tokens reaches.
+        grouped = {}
+        for candidate, score in self.similar(token).items():
+            grouped.setdefault(score, []).append(self.tokens[candidate])
+        levels, seen = [], set()
+        for score in sorted(grouped, reverse=True):
+            owners = set().union(*grouped[score]) - seen
+            seen |= owners
+            levels.append((score, owners))
+        return levels
+
+    def _range(self, entries, key):
+        low = bisect.bisect_left(entries, (key,))
+        return {patient_id for _, patient_id in entries[low:bisect.bisect_left(entries, (key + '\x7f',), low)]}
+
+    def _filtered(self, criteria):
+        # Phone, email and birth date are exact filters: start from the smallest
+        # and check the rest against each remaining patient.
+        sources = [self._range(self.phones, digits[::-1]) for digits in criteria['phones']]
+        sources += [self._range(self.emails, prefix) for prefix in criteria['emails']]
+        sources += [self.births.get(birth, set()) for birth in criteria['births']]
+        if not sources:
+            return None
+        matched = set()
+        for patient_id in min(sources, key=len):
+            _, _, date_of_birth, contact_number, email = self.people[patient_id]
+            digits, lowered = _digits(contact_number), (email or '').lower()
+            if (all(birth == date_of_birth for birth in criteria['births'])
+                    and all(digits.endswith(phone) for phone in criteria['phones'])
+                    and all(lowered.startswith(prefix) for prefix in criteria['emails'])):
+                matched.add(patient_id)
+        return matched
+
+    def find(self, criteria, limit=20):
+        names = [self.levels(token) for token in criteria['names']]
+        if not all(names):
+            return []
+        matched = self._filtered(criteria)
+        if matched is not None and not matched:
+            return []
+        exact = float(sum(len(criteria[kind]) for kind in ('phones', 'emails', 'births')))
+        if not names:
+            return [(exact, patient_id) for patient_id in heapq.nsmallest(limit, matched)]
+
+        # Walk the combinations of name score levels from the best total down,
+        # intersecting whole sets rather than scoring patients one at a time.
+        combinations = sorted(itertools.product(*names), key=lambda combination: -sum(
+            score for score, _ in combination))
+        hits, seen = [], set()
+        for combination in combinations:
+            groups = sorted((owners for _, owners in combination), key=len)
+            if matched is not None:
+                groups.insert(0, matched)
+            found = set.intersection(*groups) - seen
+            if not found:
+                continue
+            seen |= found
+            score = exact + sum(score for score, _ in combination)
+            hits.extend((score, patient_id) for patient_id in heapq.nsmallest(limit - len(hits), found))
+            if len(hits) >= limit:
+                break
+        return hits
+
+
+class PatientFinder:
+    def __init__(self, system, path=None, save_every=5000):
+        self.system = system
+        self.path = path
+        self.save_every = save_every
+        self.index = None
+        self.unsaved = 0
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.index is None:
+            self.index = load_snapshot(self.path, PatientIndex)
+        return self.index
+
+    def _reload(self, index, patient_ids):
+        rows = self.system.fetch_all(
+            f"SELECT {PATIENT_COLUMNS} FROM patients WHERE patient_id IN ({', '.join(['%s'] * len(patient_ids))})",
+            list(patient_ids)
+        )
+        for patient_id in set(patient_ids) - {row['patient_id'] for row in rows}:
+            index.remove(patient_id)
+        index.add_all(_values(rows))
+        self.unsaved += len(rows)
+
+    def refresh(self):
+        # New patients past the watermark, then every patient updated since the
+        # last change applied, by this process or any other.
+        with self.lock:
+            index = self._load()
+            if not index.people and not index.changes:
+                index.changes = last_change(self.system)
+            added, last = [], index.watermark
+            while True:
+                rows = self.system.fetch_all(
+                    f"""SELECT {PATIENT_COLUMNS} FROM patients
+                        WHERE patient_id > %s ORDER BY patient_id LIMIT 5000""",
+                    (last,)
+                )
+                added.extend(_values(rows))
+                if len(rows) < 5000:
+                    break
+                last = rows[-1]['patient_id']
+            index.add_all(added)
+            self.unsaved += len(added)
+            more = True
+            while more:
+                index.changes, changed, more = read_changes(self.system, 'patients', index.changes)
+                changed = sorted(patient_id for patient_id in changed if patient_id <= index.watermark)
+                for i in range(0, len(changed), 500):
+                    self._reload(index, changed[i:i + 500])
+            if self.unsaved >= self.save_every:
+                self._save()
+
+    def patient_added(self):
+        if self.index is not None:
+            self.refresh()
+
+    def patient_updated(self):
+        if self.index is not None:
+            self.refresh()
+
+    def rebuild(self):
+        with self.lock:
+            self.index = PatientIndex()
+        self.refresh()
+        self.save()
+
+    def _save(self):
+        if self.path and self.index is not None and self.unsaved:
+            save_snapshot(self.path, self.index)
+            self.unsaved = 0
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def find(self, criteria, limit=20):
+        self.refresh()
+        with self.lock:
+            hits = self.index.find(criteria, limit)
+            results = []
+            for score, patient_id in hits:
+                first_name, last_name, date_of_birth, contact_number, email = self.index.people[patient_id]
+                results.append({'patient_id': patient_id, 'first_name': first_name, 'last_name': last_name,
+                                'date_of_birth': date_of_birth, 'contact_number': contact_number,
+                                'email': email, 'score': round(score, 3)})
+        return results
+
+
+def main(argv=None):
+    from services import HospitalService
+
+    parser = argparse.ArgumentParser(description="Patient finder index over names, phones, emails and birth dates.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help="rebuild the index from the patients table")
+    lookup = commands.add_parser('find', help="print matching patients as JSON")
+    lookup.add_argument('query')
+    lookup.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    service = HospitalService(engine_from_env(), pool_size=1)
+    try:
+        service.setup_database()
+        if args.command == 'rebuild':
+            service.finder.rebuild()
+            print(json.dumps({'patients': len(service.finder.index.people)}))
+        else:
+            print(json.dumps(service.find_patients(args.query, args.limit), default=str))
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
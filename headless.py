@@ -0,0 +1,160 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import re
+import sys
+import time
+
+from colorama import Fore
+
+from storage import engine_from_env, replicas_from_env
+from Hospital_Management import HospitalManagementSystem
+import metrics
+
+ANSI_PATTERN = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+EXIT_CHOICE = '6'
+# Missing trailing fields answer like a bare Enter; an action that keeps asking
+# after this many blank answers is stuck in a prompt loop.
+MAX_BLANK_READS = 50
+
+
+class ScriptError(Exception):
+    pass
+
+
+def _plain(text):
+    return ANSI_PATTERN.sub('', text).strip()
+
+
+def _lines(text, color):
+    return [_plain(line) for line in re.split(r'[\r\n]', text) if color in line and _plain(line)]
+
+
+def read_script(stream):
+    for line_number, line in enumerate(stream, 1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        if stripped.startswith('{'):
+            step = json.loads(stripped)
+            yield line_number, str(step['choice']), [str(value) for value in step.get('inputs', [])]
+        else:
+            fields = next(csv.reader([stripped], skipinitialspace=True))
+            yield line_number, fields[0], fields[1:]
+
+
+class HeadlessSystem(HospitalManagementSystem):
+    def __init__(self, *args, **kwargs):
+        self.inputs = []
+        self.output = io.StringIO()
+        self.prompted_at = 0
+        self.last_prompt = None
+        self.blank_reads = 0
+        super().__init__(*args, **kwargs)
+
+    def prompt(self, text):
+        rejected = _lines(self.output.getvalue()[self.prompted_at:], Fore.RED)
+        if rejected and text == self.last_prompt:
+            # The form is asking again after a validation error; retrying with the
+            # next scripted value would misalign every field after it.
+            raise ScriptError(rejected[-1])
+        self.output.write(text + "\n")
+        self.prompted_at = self.output.tell()
+        self.last_prompt = text
+        if self.inputs:
+            return self.inputs.pop(0)
+        self.blank_reads += 1
+        if self.blank_reads > MAX_BLANK_READS:
+            raise ScriptError(f"Ran out of input at prompt {_plain(text)!r}")
+        return ''
+
+    def pause(self, seconds):
+        pass
+
+    def screen_rows(self):
+        # No terminal to fill: print tables whole instead of asking for more.
+        return None
+
+    def display_loading(self, action):
+        pass
+
+    def clear_screen(self):
+        pass
+
+    def perform(self, choice, inputs):
+        self.inputs = list(inputs)
+        self.output = io.StringIO()
+        self.prompted_at = 0
+        self.last_prompt = None
+        self.blank_reads = 0
+        result = {'choice': choice, 'action': self.MENU_ACTIONS.get(choice)}
+
+        started = time.perf_counter()
+        error = None
+        with contextlib.redirect_stdout(self.output):
+            try:
+                if result['action'] is None:
+                    raise ScriptError(f"Unknown menu choice {choice!r}")
+                self.perform_action(result['action'])
+            except ScriptError as e:
+                error = str(e)
+        output = self.output.getvalue()
+
+        errors = _lines(output, Fore.RED)
+        if error and error not in errors:
+            errors.append(error)
+        result.update(
+            ok=not errors,
+            messages=_lines(output, Fore.GREEN),
+            errors=errors,
+            unused_inputs=len(self.inputs),
+            ms=round((time.perf_counter() - started) * 1000, 3)
+        )
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a scripted menu session without a terminal.")
+    parser.add_argument('script', help="script file, or - for stdin")
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--stop-on-error', action='store_true')
+    parser.add_argument('--metrics', help="write query and action latencies here at the end (.prom for Prometheus text)")
+    args = parser.parse_args(argv)
+    metrics.configure_from_env()
+
+    stream = sys.stdin if args.script == '-' else open(args.script, newline='', encoding='utf-8')
+    system = HeadlessSystem(engine_from_env(), page_size=args.page_size, replicas=replicas_from_env())
+    if not system.service:
+        sys.exit(1)
+
+    summary = {'actions': 0, 'ok': 0, 'failed': 0}
+    started = time.perf_counter()
+    try:
+        for line_number, choice, inputs in read_script(stream):
+            if choice == EXIT_CHOICE:
+                break
+            result = system.perform(choice, inputs)
+            result['line'] = line_number
+            print(json.dumps(result))
+            summary['actions'] += 1
+            summary['ok' if result['ok'] else 'failed'] += 1
+            if args.stop_on_error and not result['ok']:
+                break
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        system.service.close()
+        if args.metrics:
+            metrics.REGISTRY.dump(args.metrics)
+
+    elapsed = time.perf_counter() - started
+    summary.update(seconds=round(elapsed, 3),
+                   actions_per_second=round(summary['actions'] / elapsed, 1) if elapsed else 0.0)
+    print(json.dumps({'summary': summary}))
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import bisect
+import csv
+import datetime
+import decimal
+import gzip
+import hashlib
+import io
+import json
+import os
+
+from storage import StorageError
+
+# Years kept in the hot tables (MySQL: hot partitions) counting the current one.
+HOT_YEARS = 2
+# kind -> (table, key column, date column, select over alias h from {table})
+HISTORY = {
+    'medical_records': ('medical_records', 'record_id', 'visit_date',
+                        """SELECT h.*, CONCAT(d.first_name, ' ', d.last_name) AS doctor_name
+                           FROM {table} h JOIN doctors d ON h.doctor_id = d.doctor_id"""),
+    'billing': ('billing', 'bill_id', 'bill_date', "SELECT h.* FROM {table} h")
+}
+# Archive cells are text; these columns are turned back into numbers on load.
+PARSERS = {'int': int, 'money': decimal.Decimal}
+_verified = set()
+
+
+class ArchiveError(StorageError):
+    pass
+
+
+def create_catalog(engine, cursor):
+    # location is 'table' for a year moved to its own table (SQLite only) and
+    # 'archive' for a year moved out of the database into an archive file.
+    cursor.execute("""CREATE TABLE IF NOT EXISTS history_partitions (
+        table_name VARCHAR(64) NOT NULL,
+        year INT NOT NULL,
+        location VARCHAR(10) NOT NULL,
+        path VARCHAR(255),
+        row_count INT NOT NULL DEFAULT 0,
+        sha256 CHAR(64),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (table_name, year)
+    )""")
+
+
+def year_table(table, year):
+    return f"{table}_{year}"
+
+
+def year_bounds(year):
+    return f"{year}-01-01", f"{year + 1}-01-01"
+
+
+def hot_start(today=None):
+    return (today or datetime.date.today()).year - HOT_YEARS + 1
+
+
+def catalog(system, table):
+    rows = system.fetch_all(
+        "SELECT year, location, path, sha256 FROM history_partitions WHERE table_name = %s", (table,)
+    )
+    return {row['year']: row for row in rows}
+
+
+def moved_years(system, table):
+    # Years moved to tables of their own (SQLite only); still in the database.
+    return sorted(year for year, entry in catalog(system, table).items() if entry['location'] == 'table')
+
+
+def with_year_tables(table, years, columns):
+    # The table and its year tables as one source to select columns from.
+    if not years:
+        return table
+    tables = [table] + [year_table(table, year) for year in years]
+    return f"({' UNION ALL '.join(f'SELECT {columns} FROM {name}' for name in tables)})"
+
+
+class ArchiveFile:
+    # Rows sorted by patient, written as one gzip member per block so a
+    # patient's rows are found by decompressing only their own blocks. The
+    # block index and column types live in a JSON manifest next to the file.
+    def __init__(self, path, sha256):
+        self.path = path
+        self.sha256 = sha256
+        self.manifest = None
+
+    def verify(self):
+        stat = os.stat(self.path)
+        signature = (self.path, stat.st_size, stat.st_mtime_ns)
+        if signature in _verified:
+            return
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        if digest.hexdigest() != self.sha256:
+            raise ArchiveError(f"Archive {self.path} is damaged (checksum mismatch)")
+        _verified.add(signature)
+
+    def _load_manifest(self):
+        if self.manifest is None:
+            if not os.path.exists(self.path):
+                raise ArchiveError(f"Archive {self.path} is missing")
+            self.verify()
+            with open(f"{self.path}.json", encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        return self.manifest
+
+    def _blocks(self, patient_id):
+        blocks = self._load_manifest()['blocks']
+        position = bisect.bisect_left([last for _, last, _, _ in blocks], patient_id)
+        while position < len(blocks) and blocks[position][0] <= patient_id:
+            yield blocks[position]
+            position += 1
+
+    def may_contain(self, patient_id):
+        return next(self._blocks(patient_id), None) is not None
+
+    def rows(self, patient_id):
+        columns = self._load_manifest()['columns']
+        names = [name for name, _ in columns]
+        parsers = [(i, PARSERS[kind]) for i, (_, kind) in enumerate(columns) if kind in PARSERS]
+        patient_index = names.index('patient_id')
+        rows = []
+        with open(self.path, 'rb') as f:
+            for _, _, offset, length in self._blocks(patient_id):
+                f.seek(offset)
+                text = gzip.decompress(f.read(length)).decode('utf-8')
+                for values in csv.reader(io.StringIO(text)):
+                    if int(values[patient_index]) != patient_id:
+                        continue
+                    values = [value if value != '' else None for value in values]
+                    for i, parse in parsers:
+                        if values[i] is not None:
+                            values[i] = parse(values[i])
+                    rows.append(dict(zip(names, values)))
+        return rows
+
+
+class HistoryPager:
+    # A patient's history one period at a time, newest first: the hot years,
+    # then each older year from its partition, year table or archive file,
+    # touched only when the user pages back that far.
+    def __init__(self, system, kind, patient_id, today=None):
+        self.table, self.key, self.column, self.select = HISTORY[kind]
+        self.system = system
+        self.patient_id = patient_id
+        self.hot_start = hot_start(today)
+        self.locations = catalog(system, self.table)
+        oldest = system.fetch_one(
+            f"SELECT MIN({self.column}) AS oldest FROM {self.table} WHERE patient_id = %s", (patient_id,)
+        )['oldest']
+        years = list(self.locations) + ([int(str(oldest)[:4])] if oldest else [])
+        self.oldest = min(years, default=self.hot_start)
+        self.pages = []
+        self.next_year = self.hot_start
+        self.page_number = 0
+        self.rows = []
+        self.label = None
+        self.has_next = False
+        self.has_previous = False
+
+    def _query(self, table, bounds=()):
+        conditions = ["h.patient_id = %s"] + [f"h.{self.column} {op} %s" for op, _ in bounds]
+        return self.system.fetch_all(
+            f"""{self.select.format(table=table)} WHERE {' AND '.join(conditions)}
+                ORDER BY h.{self.column} DESC, h.{self.key} DESC""",
+            [self.patient_id] + [value for _, value in bounds]
+        )
+
+    def _archive(self, year):
+        entry = self.locations[year]
+        return ArchiveFile(entry['path'], entry['sha256'])
+
+    def _probe(self, year):
+        location = self.locations.get(year, {}).get('location')
+        if location == 'archive':
+            return self._archive(year).may_contain(self.patient_id)
+        table = year_table(self.table, year) if location == 'table' else self.table
+        start, end = year_bounds(year)
+        return self.system.fetch_one(
+            f"""SELECT 1 AS found FROM {table}
+                WHERE patient_id = %s AND {self.column} >= %s AND {self.column} < %s LIMIT 1""",
+            (self.patient_id, start, end)
+        ) is not None
+
+    def _fetch(self, year):
+        location = self.locations.get(year, {}).get('location')
+        if location == 'archive':
+            rows = self._archive(year).rows(self.patient_id)
+            if 'doctor_name' in self.select:
+                for row in rows:
+                    doctor = self.system.get_doctor(row['doctor_id'])
+                    row['doctor_name'] = f"{doctor['first_name']} {doctor['last_name']}" if doctor else None
+            return rows, f"{year} (archived)"
+        start, end = year_bounds(year)
+        table = year_table(self.table, year) if location == 'table' else self.table
+        return self._query(table, [('>=', start), ('<', end)]), str(year)
+
+    def _load_next(self):
+        # Loads the next non-empty period; returns False when none is left.
+        if self.next_year == self.hot_start:
+            self.next_year -= 1
+            rows = self._query(self.table, [('>=', year_bounds(self.hot_start)[0])])
+            if rows:
+                self.pages.append((rows, f"{self.hot_start} onwards"))
+                return True
+        while self.next_year >= self.oldest:
+            year = self.next_year
+            self.next_year -= 1
+            rows, label = self._fetch(year)
+            if rows:
+                self.pages.append((rows, label))
+                return True
+        return False
+
+    def _more(self):
+        # Cheap look-ahead for the prompt: index probes and archive block
+        # ranges only, never an archive read.
+        if self.page_number < len(self.pages):
+            return True
+        if self.next_year == self.hot_start:
+            return self._probe_hot() or any(self._probe(year) for year in range(self.hot_start - 1, self.oldest - 1, -1))
+        return any(self._probe(year) for year in range(self.next_year, self.oldest - 1, -1))
+
+    def _probe_hot(self):
+        return self.system.fetch_one(
+            f"SELECT 1 AS found FROM {self.table} WHERE patient_id = %s AND {self.column} >= %s LIMIT 1",
+            (self.patient_id, year_bounds(self.hot_start)[0])
+        ) is not None
+
+    def _show(self, page_number):
+        self.page_number = page_number
+        self.rows, self.label = self.pages[page_number - 1]
+        self.has_previous = page_number > 1
+        self.has_next = self._more()
+        return self.rows
+
+    def start_at(self, year):
+        # For stateless callers (the HTTP API): the period holding year, or the
+        # next older one with rows, as if paged back to it.
+        self.pages, self.page_number = [], 0
+        self.next_year = min(year, self.hot_start)
+        return self.first()
+
+    def first(self):
+        if not self.pages and not self._load_next():
+            self.rows, self.label, self.has_next, self.has_previous = [], None, False, False
+            return self.rows
+        return self._show(1)
+
+    def next(self):
+        if self.page_number < len(self.pages) or self._load_next():
+            return self._show(self.page_number + 1)
+        self.has_next = False
+        return self.rows
+
+    def previous(self):
+        return self._show(self.page_number - 1) if self.has_previous else self.rows
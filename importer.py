@@ -0,0 +1,497 @@
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from storage import Error, engine_from_env
+from migrations import migrate
+from validation import GENDERS, is_valid_email, is_valid_phone, parse_date, parse_time
+
+APPOINTMENT_STATUSES = ('Scheduled', 'Completed', 'Cancelled')
+# Kinds whose rows may carry a legacy_id, and the table recording its new ID.
+ID_MAPS = {'patients': 'patient_id_map', 'doctors': 'doctor_id_map'}
+# Kinds whose first parameters are legacy IDs to swap for new ones.
+REFERENCES = {
+    'medical_records': (('patient_id_map', 'patient'), ('doctor_id_map', 'doctor')),
+    'appointments': (('patient_id_map', 'patient'), ('doctor_id_map', 'doctor'))
+}
+RESOLVED_CACHE = 100000
+SHARDS_PER_WORKER = 4
+# Parallel SQLite writers take turns on the database lock.
+SQLITE_LOCK_TIMEOUT = 60.0
+
+
+def _text(row, field):
+    # NDJSON values may be numbers as well as strings.
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def _required(row, field):
+    value = _text(row, field)
+    if not value:
+        raise ValueError(f"{field} is required")
+    return value
+
+
+def _contact(row):
+    contact_number = _required(row, 'contact_number')
+    if not is_valid_phone(contact_number):
+        raise ValueError(f"Invalid phone number {contact_number!r}")
+    email = _required(row, 'email')
+    if not is_valid_email(email):
+        raise ValueError(f"Invalid email address {email!r}")
+    return contact_number, email
+
+
+def shape_patient(row):
+    first_name = _required(row, 'first_name')
+    last_name = _required(row, 'last_name')
+    date_of_birth = parse_date(_required(row, 'date_of_birth'))
+    gender = _required(row, 'gender').capitalize()
+    if gender not in GENDERS:
+        raise ValueError(f"Invalid gender {gender!r}")
+    contact_number, email = _contact(row)
+    return (first_name, last_name, date_of_birth.isoformat(), gender, contact_number, email,
+            _text(row, 'address'), _text(row, 'blood_group') or None)
+
+
+def shape_doctor(row):
+    first_name = _required(row, 'first_name')
+    last_name = _required(row, 'last_name')
+    specialization = _required(row, 'specialization')
+    contact_number, email = _contact(row)
+    department = _required(row, 'department')
+    joining_date = parse_date(_required(row, 'joining_date'))
+    try:
+        consultation_fee = float(_required(row, 'consultation_fee'))
+    except ValueError:
+        raise ValueError(f"Invalid fee amount {row.get('consultation_fee')!r}")
+    return (first_name, last_name, specialization, contact_number, email, department,
+            joining_date.isoformat(), consultation_fee)
+
+
+def _legacy_id(row, field):
+    # Numbers are fine too: NDJSON exports often carry numeric IDs.
+    value = _required(row, field)
+    if len(value) > 64:
+        raise ValueError(f"{field} is longer than 64 characters")
+    return value
+
+
+def _timestamp(value, field):
+    try:
+        if len(value) == 10:
+            return parse_date(value).isoformat()
+        return datetime.datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ValueError(f"Invalid {field} {value!r}, expected YYYY-MM-DD[ HH:MM:SS]")
+
+
+def shape_medical_record(row):
+    visit_date = _text(row, 'visit_date')
+    return (_legacy_id(row, 'legacy_patient_id'), _legacy_id(row, 'legacy_doctor_id'),
+            _text(row, 'diagnosis'), _text(row, 'prescription'),
+            _text(row, 'treatment_plan'),
+            _timestamp(visit_date, 'visit_date') if visit_date else datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def shape_appointment(row):
+    appointment_date = parse_date(_required(row, 'appointment_date'))
+    appointment_time = parse_time(_required(row, 'appointment_time'))
+    status = _text(row, 'status').capitalize() or 'Scheduled'
+    if status not in APPOINTMENT_STATUSES:
+        raise ValueError(f"Invalid status {status!r}")
+    return (_legacy_id(row, 'legacy_patient_id'), _legacy_id(row, 'legacy_doctor_id'),
+            appointment_date.isoformat(), appointment_time.strftime('%H:%M'), status,
+            _text(row, 'reason'))
+
+
+IMPORTS = {
+    'patients': (
+        """INSERT INTO patients
+           (first_name, last_name, date_of_birth, gender,
+           contact_number, email, address, blood_group)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+        shape_patient
+    ),
+    'doctors': (
+        """INSERT INTO doctors
+           (first_name, last_name, specialization, contact_number,
+           email, department, joining_date, consultation_fee)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+        shape_doctor
+    ),
+    'medical_records': (
+        """INSERT INTO medical_records
+           (patient_id, doctor_id, diagnosis, prescription, treatment_plan, visit_date)
+           VALUES (%s, %s, %s, %s, %s, %s)""",
+        shape_medical_record
+    ),
+    'appointments': (
+        """INSERT INTO appointments
+           (patient_id, doctor_id, appointment_date, appointment_time, status, reason)
+           VALUES (%s, %s, %s, %s, %s, %s)""",
+        shape_appointment
+    )
+}
+
+
+def decode_row(row):
+    # NDJSON lines arrive as text and are decoded with the rest of a row's
+    # checks, so a bad line is rejected like any other bad row.
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(row, dict):
+        raise ValueError(f"Expected a JSON object, not {type(row).__name__}")
+    return row
+
+
+def read_rows(stream, fmt):
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                yield line_number, line.strip()
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def detect_format(path):
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def shard_file(path, count, header):
+    # Splits the file after its header into about count byte ranges that
+    # start and end on line boundaries, each with the line number it starts
+    # at. Quoted CSV fields must not contain newlines.
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        body = len(f.readline()) if header else 0
+        starts = [body]
+        for i in range(1, count):
+            f.seek(max(body + (size - body) * i // count - 1, body))
+            f.readline()
+            if starts[-1] < f.tell() < size:
+                starts.append(f.tell())
+
+        f.seek(0)
+        shards, line_number, position = [], 1, 0
+        for start, end in zip(starts, starts[1:] + [size]):
+            while position < start:
+                chunk = f.read(min(1 << 20, start - position))
+                line_number += chunk.count(b'\n')
+                position += len(chunk)
+            if start < end:
+                shards.append((start, end, line_number))
+    return shards
+
+
+def read_range(path, fmt, start, end, line_number, fields=None):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            text = line.decode('utf-8')
+            if text.strip():
+                if fmt == 'ndjson':
+                    yield line_number, text.strip()
+                else:
+                    yield line_number, dict(zip(fields, next(csv.reader([text]))))
+            line_number += 1
+
+
+class BulkImporter:
+    def __init__(self, engine, kind, batch_size=1000, reject_file=None, progress=None):
+        self.engine = engine
+        self.query, self.shape = IMPORTS[kind]
+        self.id_map = ID_MAPS.get(kind)
+        self.references = REFERENCES.get(kind, ())
+        self.resolved = {table: {} for table, _ in self.references}
+        self.batch_size = batch_size
+        self.reject_file = reject_file
+        self.progress = progress
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.started = None
+
+    def reject(self, line_number, row, error):
+        self.rejected += 1
+        if self.reject_file:
+            self.reject_file.write(json.dumps({'line': line_number, 'error': str(error), 'row': row}, default=str) + "\n")
+
+    def resolve(self, cursor, batch):
+        # Swaps the legacy patient and doctor IDs at the front of each row for
+        # their new IDs; rows naming one that was never imported are rejected.
+        for position, (table, _) in enumerate(self.references):
+            known = self.resolved[table]
+            if len(known) > RESOLVED_CACHE:
+                known.clear()
+            wanted = sorted({params[position] for _, _, params, _ in batch} - known.keys())
+            for i in range(0, len(wanted), 500):
+                chunk = wanted[i:i + 500]
+                cursor.execute(f"SELECT legacy_id, new_id FROM {table} WHERE legacy_id IN ({', '.join(['%s'] * len(chunk))})",
+                               chunk)
+                known.update((row['legacy_id'], row['new_id']) for row in cursor.fetchall())
+
+        resolved = []
+        for line_number, row, params, legacy in batch:
+            ids = []
+            for position, (table, label) in enumerate(self.references):
+                new_id = self.resolved[table].get(params[position])
+                if new_id is None:
+                    self.reject(line_number, row, f"Unknown legacy {label} ID {params[position]!r}")
+                    break
+                ids.append(new_id)
+            else:
+                resolved.append((line_number, row, tuple(ids) + params[len(ids):], legacy))
+        return resolved
+
+    def insert_one(self, cursor, params, legacy):
+        cursor.execute(self.query, params)
+        if legacy is not None:
+            cursor.execute(f"INSERT INTO {self.id_map} (legacy_id, new_id) VALUES (%s, %s)",
+                           (legacy, cursor.lastrowid))
+
+    def insert(self, cursor, batch):
+        if not any(legacy is not None for _, _, _, legacy in batch):
+            cursor.executemany(self.query, [params for _, _, params, _ in batch])
+            return
+        # Each new ID is needed for the map, so these go one statement at a time.
+        mapped = []
+        for _, _, params, legacy in batch:
+            cursor.execute(self.query, params)
+            if legacy is not None:
+                mapped.append((legacy, cursor.lastrowid))
+        cursor.executemany(f"INSERT INTO {self.id_map} (legacy_id, new_id) VALUES (%s, %s)", mapped)
+
+    def flush(self, connection, cursor, batch):
+        if not batch:
+            return
+        if self.references:
+            batch = self.resolve(cursor, batch)
+        try:
+            self.insert(cursor, batch)
+            connection.commit()
+            self.inserted += len(batch)
+        except Error:
+            # Something in the batch violates a constraint; retry row by row so
+            # only the offending rows are rejected. A savepoint per row keeps a
+            # row and its legacy ID together.
+            connection.rollback()
+            cursor.execute("BEGIN")
+            for line_number, row, params, legacy in batch:
+                cursor.execute("SAVEPOINT import_row")
+                try:
+                    self.insert_one(cursor, params, legacy)
+                    self.inserted += 1
+                except Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                    self.reject(line_number, row, e)
+                cursor.execute("RELEASE SAVEPOINT import_row")
+            connection.commit()
+        if self.progress:
+            self.progress(self.report())
+
+    def run(self, rows, connection=None):
+        self.started = time.perf_counter()
+        owns_connection = connection is None
+        if owns_connection:
+            connection = self.engine.connect()
+        cursor = self.engine.cursor(connection)
+        try:
+            if owns_connection:
+                migrate(self.engine, connection, cursor)
+            batch = []
+            for line_number, row in rows:
+                self.read += 1
+                try:
+                    row = decode_row(row)
+                    legacy = _legacy_id(row, 'legacy_id') if self.id_map and row.get('legacy_id') not in (None, '') else None
+                    batch.append((line_number, row, self.shape(row), legacy))
+                except ValueError as e:
+                    self.reject(line_number, row, e)
+                    continue
+                if len(batch) >= self.batch_size:
+                    self.flush(connection, cursor, batch)
+                    batch = []
+            self.flush(connection, cursor, batch)
+        finally:
+            cursor.close()
+            if owns_connection:
+                connection.close()
+        return self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'read': self.read,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.inserted / elapsed, 1) if elapsed else 0.0
+        }
+
+
+_messages = None
+
+
+def _start_worker(messages):
+    global _messages
+    _messages = messages
+
+
+class _RejectQueue:
+    # A worker's reject file: each line goes to the coordinator to write.
+    def write(self, text):
+        _messages.put(('reject', text))
+
+
+def _import_shard(engine, kind, path, fmt, fields, shard, batch_size, keep_rejects):
+    start, end, line_number = shard
+    if engine.name == 'sqlite':
+        engine.timeout = max(engine.timeout, SQLITE_LOCK_TIMEOUT)
+    connection = engine.connect()
+    try:
+        importer = BulkImporter(engine, kind, batch_size, _RejectQueue() if keep_rejects else None,
+                                lambda report: _messages.put(('progress', start, report)))
+        return importer.run(read_range(path, fmt, start, end, line_number, fields), connection)
+    finally:
+        connection.close()
+
+
+class ParallelImporter:
+    # Shards a file by byte range over a pool of processes. Each worker
+    # validates its rows and inserts them in batches over its own connection;
+    # this process collects their progress and rejects.
+    def __init__(self, engine, kind, workers=None, batch_size=1000, reject_file=None, progress=None):
+        if engine.name == 'sqlite' and engine.path == ':memory:':
+            raise ValueError("Parallel import needs a database file or server, not an in-memory database")
+        self.engine = engine
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.reject_file = reject_file
+        self.progress = progress
+        self.shards = {}
+        self.rejects_written = 0
+        self.started = None
+
+    def run(self, path, fmt):
+        self.started = time.perf_counter()
+        connection = self.engine.connect()
+        cursor = self.engine.cursor(connection)
+        try:
+            migrate(self.engine, connection, cursor)
+        finally:
+            cursor.close()
+            connection.close()
+
+        fields = None
+        if fmt == 'csv':
+            with open(path, newline='', encoding='utf-8') as f:
+                fields = next(csv.reader(f), [])
+        shards = shard_file(path, self.workers * SHARDS_PER_WORKER, header=fmt == 'csv')
+
+        messages = multiprocessing.Queue()
+        with ProcessPoolExecutor(self.workers, initializer=_start_worker, initargs=(messages,)) as pool:
+            pending = {pool.submit(_import_shard, self.engine, self.kind, path, fmt, fields, shard,
+                                   self.batch_size, self.reject_file is not None): shard[0]
+                       for shard in shards}
+            while pending:
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                self.receive(messages)
+                for future in done:
+                    self.shards[pending.pop(future)] = future.result()
+        # Rejects can still be in flight after their worker has returned.
+        while self.reject_file and self.rejects_written < self.report()['rejected']:
+            self.receive(messages, block=True)
+        messages.close()
+        return self.report()
+
+    def receive(self, messages, block=False):
+        while True:
+            try:
+                kind, *message = messages.get(timeout=1.0) if block else messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'reject':
+                self.reject_file.write(message[0])
+                self.rejects_written += 1
+            else:
+                start, report = message
+                self.shards[start] = report
+            block = False
+        if self.progress:
+            self.progress(self.report())
+
+    def report(self):
+        totals = {name: sum(report[name] for report in self.shards.values())
+                  for name in ('read', 'inserted', 'rejected')}
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        totals.update(
+            seconds=round(elapsed, 3),
+            rows_per_second=round(totals['inserted'] / elapsed, 1) if elapsed else 0.0,
+            workers=self.workers
+        )
+        return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk import patients, doctors, medical records or appointments from CSV or NDJSON.")
+    parser.add_argument('kind', choices=sorted(IMPORTS))
+    parser.add_argument('path', help="input file, or - for stdin")
+    parser.add_argument('--format', choices=['csv', 'ndjson'])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--rejects', help="write rejected rows to this NDJSON file")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes importing shards of the file in parallel; 0 uses every core")
+    args = parser.parse_args(argv)
+    if args.workers != 1 and args.path == '-':
+        parser.error("--workers needs a file to shard, not stdin")
+
+    fmt = args.format or detect_format(args.path)
+    reject_file = open(args.rejects, 'w', encoding='utf-8') if args.rejects else None
+
+    def progress(report):
+        print(f"\r{report['inserted']} imported, {report['rejected']} rejected, "
+              f"{report['rows_per_second']:.0f} rows/s", end="", file=sys.stderr)
+
+    try:
+        if args.workers != 1:
+            importer = ParallelImporter(engine_from_env(), args.kind, args.workers, args.batch_size,
+                                        reject_file, progress)
+            report = importer.run(args.path, fmt)
+        else:
+            stream = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+            try:
+                importer = BulkImporter(engine_from_env(), args.kind, args.batch_size, reject_file, progress)
+                report = importer.run(read_rows(stream, fmt))
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+    finally:
+        if reject_file:
+            reject_file.close()
+    print(file=sys.stderr)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import atexit
+import bisect
+import datetime
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, as in a Prometheus histogram; one more bucket counts the rest.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99)
+SLOW_QUERY_MS = 200.0
+DUMP_INTERVAL = 60.0
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%s|\?")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(statement):
+    # The statement with every literal and placeholder as ?, so the same query
+    # with different values, or IN lists of any length, is counted together.
+    text = _STRINGS.sub('?', statement)
+    text = _NUMBERS.sub('?', text)
+    text = _PLACEHOLDERS.sub('?', text)
+    text = _LISTS.sub('(?+)', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+
+    def observe(self, seconds, rows=0, error=False):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows or 0
+        self.errors += bool(error)
+
+    def quantile(self, q):
+        # Interpolated within the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self, rows=True):
+        summary = {'count': self.count, 'errors': self.errors,
+                   'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                   'max_ms': round(self.max * 1000, 3)}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}_ms"] = round(self.quantile(q) * 1000, 3)
+        if rows:
+            summary['rows'] = self.rows
+        return summary
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class Metrics:
+    # Latency histograms per query fingerprint and per action, kept in memory
+    # and written to a file as JSON or Prometheus text on request.
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_query_log=None):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self.lock = threading.Lock()
+        # Keeps slow-query lines whole; never held together with lock.
+        self.log_lock = threading.Lock()
+        self.series = {'query': {}, 'action': {}}
+        self.slow_queries = 0
+        self.started = time.time()
+        self._dumper = None
+
+    def observe(self, kind, name, seconds, rows=0, error=False):
+        with self.lock:
+            histogram = self.series[kind].get(name)
+            if histogram is None:
+                histogram = self.series[kind][name] = Histogram()
+            histogram.observe(seconds, rows, error)
+
+    def query(self, statement, seconds, rows=0, error=False):
+        name = fingerprint(statement)
+        self.observe('query', name, seconds, rows, error)
+        if self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms:
+            with self.lock:
+                self.slow_queries += 1
+            path = self.slow_query_log
+            if path:
+                # Only the fingerprint: parameter values are patient data.
+                line = json.dumps({'at': datetime.datetime.now().isoformat(timespec='milliseconds'),
+                                   'ms': round(seconds * 1000, 3), 'rows': rows,
+                                   'error': error, 'query': name}) + "\n"
+                # Written outside lock, so a slow disk holds up only other
+                # slow queries, not every query being counted.
+                with self.log_lock, open(path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+
+    @contextmanager
+    def timed(self, kind, name):
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(kind, name, time.perf_counter() - started, error=error)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started, 1),
+                'slow_query_ms': self.slow_query_ms,
+                'slow_queries': self.slow_queries,
+                'actions': {name: histogram.summary(rows=False) for name, histogram in sorted(self.series['action'].items())},
+                'queries': {name: histogram.summary() for name, histogram in sorted(self.series['query'].items())}
+            }
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            for kind, label in (('action', 'action'), ('query', 'query')):
+                metric = f"hms_{kind}_duration_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for name, histogram in sorted(self.series[kind].items()):
+                    labels = f'{label}="{_label(name)}"'
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + ('+Inf',), histogram.buckets):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.total}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+                lines.append(f"# TYPE hms_{kind}_errors_total counter")
+                lines.extend(f'hms_{kind}_errors_total{{{label}="{_label(name)}"}} {histogram.errors}'
+                             for name, histogram in sorted(self.series[kind].items()))
+            lines.append("# TYPE hms_query_rows_total counter")
+            lines.extend(f'hms_query_rows_total{{query="{_label(name)}"}} {histogram.rows}'
+                         for name, histogram in sorted(self.series['query'].items()))
+            lines.append("# TYPE hms_slow_queries_total counter")
+            lines.append(f"hms_slow_queries_total {self.slow_queries}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        # .prom and .txt files get Prometheus text, anything else JSON.
+        text = (self.prometheus() if os.path.splitext(path)[1] in ('.prom', '.txt')
+                else json.dumps(self.snapshot(), indent=2))
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    def dump_every(self, path, interval=DUMP_INTERVAL):
+        # Rewrites the file every interval and once more at exit.
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+
+        if self._dumper is None:
+            self._dumper = threading.Thread(target=loop, name="metrics-dump", daemon=True)
+            self._dumper.start()
+            atexit.register(self.dump, path)
+
+    def reset(self):
+        with self.lock:
+            self.series = {'query': {}, 'action': {}}
+            self.slow_queries = 0
+            self.started = time.time()
+
+
+class InstrumentedCursor:
+    # Wraps a DB-API cursor. A query is timed from execute until the next
+    # execute or close, so the time spent fetching its rows counts too; rows
+    # is the number fetched, or the rows affected for a write.
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._statement = None
+        self._seconds = 0.0
+        self._fetched = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _finish(self, error=False):
+        if self._statement is not None:
+            rows = self._fetched if self._fetched is not None else max(self._cursor.rowcount or 0, 0)
+            self._metrics.query(self._statement, self._seconds, rows, error)
+            self._statement = None
+
+    def _run(self, method, statement, *args):
+        self._finish()
+        started = time.perf_counter()
+        self._statement, self._fetched = statement, None
+        try:
+            return method(statement, *args)
+        except BaseException:
+            self._seconds = time.perf_counter() - started
+            self._finish(error=True)
+            raise
+        finally:
+            self._seconds = time.perf_counter() - started
+
+    def execute(self, statement, params=()):
+        return self._run(self._cursor.execute, statement, params)
+
+    def executemany(self, statement, seq_of_params):
+        return self._run(self._cursor.executemany, statement, seq_of_params)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        self._fetched = (self._fetched or 0) + (row is not None)
+        return row
+
+    def fetchmany(self, size):
+        rows = self._fetch(self._cursor.fetchmany, size)
+        self._fetched = (self._fetched or 0) + len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        self._fetched = (self._fetched or 0) + len(rows)
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+
+REGISTRY = Metrics()
+
+
+def instrument(cursor):
+    return InstrumentedCursor(cursor, REGISTRY)
+
+
+def configure_from_env(environ=None):
+    # HMS_SLOW_QUERY_MS (default 200; 'off' disables), HMS_SLOW_QUERY_LOG,
+    # HMS_METRICS_FILE and HMS_METRICS_INTERVAL (seconds, default 60).
+    environ = os.environ if environ is None else environ
+    threshold = environ.get('HMS_SLOW_QUERY_MS', str(SLOW_QUERY_MS))
+    REGISTRY.slow_query_ms = None if threshold.lower() == 'off' else float(threshold)
+    REGISTRY.slow_query_log = environ.get('HMS_SLOW_QUERY_LOG') or None
+    if environ.get('HMS_METRICS_FILE'):
+        REGISTRY.dump_every(environ['HMS_METRICS_FILE'], float(environ.get('HMS_METRICS_INTERVAL', DUMP_INTERVAL)))
+    return REGISTRY
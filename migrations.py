@@ -0,0 +1,157 @@
+from storage import Error, engine_from_env
+import history
+import replicas
+import revenue
+
+SCHEMA_VERSION_TABLE = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)"""
+
+
+def create_base_tables(engine, cursor):
+    for table in engine.schema():
+        cursor.execute(table)
+
+
+def add_billing_summaries(engine, cursor):
+    engine.add_column(cursor, "billing", "doctor_id", "INT NULL")
+    revenue.create_summary_tables(engine, cursor)
+    revenue.rebuild(engine, cursor, archived=False)
+
+
+def add_record_search(engine, cursor):
+    # SQLite searches with the in-process index in search.py instead.
+    if engine.name == 'mysql':
+        engine.create_fulltext_index(cursor, "ft_medical_records_text", "medical_records",
+                                     ("diagnosis", "prescription", "treatment_plan"))
+
+
+def add_history_partitions(engine, cursor):
+    # Partitioning billing on MySQL drops its foreign keys and rebuilds the
+    # table under a lock, so it is left to the operator: archive.py
+    # partition-billing. SQLite gets per-year tables from archive.py instead.
+    history.create_catalog(engine, cursor)
+    revenue.create_archive_table(engine, cursor)
+
+
+def add_import_id_maps(engine, cursor):
+    # Legacy ID -> new ID, filled by importer.py as patients and doctors come
+    # in and read when their medical records and appointments follow.
+    for table in ("patient_id_map", "doctor_id_map"):
+        cursor.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+            legacy_id VARCHAR(64) PRIMARY KEY,
+            new_id INT NOT NULL
+        )""")
+
+
+def add_row_versions(engine, cursor):
+    # Bumped by every update, so an edit made against an older read can be refused.
+    for table in ("patients", "appointments", "billing"):
+        engine.add_column(cursor, table, "version", "INT NOT NULL DEFAULT 0")
+    # archive.py copies rows into existing per-year billing tables with SELECT *.
+    cursor.execute("SELECT year FROM history_partitions WHERE table_name = 'billing' AND location = 'table'")
+    for row in cursor.fetchall():
+        engine.add_column(cursor, history.year_table("billing", row['year']), "version", "INT NOT NULL DEFAULT 0")
+
+
+def add_index_changes(engine, cursor):
+    # Rows of indexed tables that were edited or moved out; search.py and
+    # finder.py replay these past their own watermark.
+    cursor.execute(f"""CREATE TABLE IF NOT EXISTS index_changes (
+        change_id {engine.serial_key},
+        table_name VARCHAR(64) NOT NULL,
+        row_id INT NOT NULL
+    )""")
+
+
+def add_indexes(*indexes):
+    def step(engine, cursor):
+        for name, table, columns in indexes:
+            engine.create_index(cursor, name, table, columns, online=True)
+    return step
+
+
+# Append only. Every step must be safe to re-run, because a crash between the
+# DDL and the schema_version insert leaves the step unrecorded.
+MIGRATIONS = [
+    (1, "Base tables", create_base_tables),
+    (2, "Appointment scheduling indexes", add_indexes(
+        ("idx_appointments_doctor_slot", "appointments", ("doctor_id", "appointment_date", "appointment_time")),
+        ("idx_appointments_date_status", "appointments", ("appointment_date", "status")),
+        ("idx_appointments_patient_date", "appointments", ("patient_id", "appointment_date", "appointment_time"))
+    )),
+    (3, "Billing and medical history indexes", add_indexes(
+        ("idx_billing_patient_date", "billing", ("patient_id", "bill_date")),
+        ("idx_medical_records_patient_visit", "medical_records", ("patient_id", "visit_date"))
+    )),
+    (4, "Bulk status transition index", add_indexes(
+        ("idx_billing_status_date", "billing", ("payment_status", "bill_date")),
+    )),
+    (5, "Billing revenue and receivables summaries", add_billing_summaries),
+    (6, "Medical record full-text search", add_record_search),
+    (7, "Incremental export watermark indexes", add_indexes(
+        ("idx_patients_registration", "patients", ("registration_date",)),
+        ("idx_medical_records_visit", "medical_records", ("visit_date",)),
+        ("idx_billing_date", "billing", ("bill_date",))
+    )),
+    (8, "Year partitions and archive catalog for medical records and billing", add_history_partitions),
+    (9, "Replication heartbeat", replicas.create_heartbeat_table),
+    (10, "Legacy ID maps for bulk import", add_import_id_maps),
+    (11, "Row versions for optimistic concurrency", add_row_versions),
+    (12, "Change log for the search and patient finder indexes", add_index_changes)
+]
+
+
+def latest_version(migrations=MIGRATIONS):
+    return max(version for version, _, _ in migrations)
+
+
+def current_version(cursor):
+    try:
+        cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+    except Error:
+        return None
+    row = cursor.fetchone()
+    return (row['version'] or 0) if row else 0
+
+
+def migrate(engine, connection, cursor, migrations=MIGRATIONS):
+    version = current_version(cursor)
+    if version is not None and version >= latest_version(migrations):
+        return []
+
+    if version is None:
+        connection.rollback()
+        cursor.execute(SCHEMA_VERSION_TABLE)
+        connection.commit()
+        version = 0
+
+    applied = []
+    for step_version, description, step in sorted(migrations, key=lambda m: m[0]):
+        if step_version <= version:
+            continue
+        step(engine, cursor)
+        cursor.execute(
+            "SELECT 1 FROM schema_version WHERE version = %s", (step_version,)
+        )
+        if not cursor.fetchone():
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (step_version, description)
+            )
+        connection.commit()
+        applied.append(step_version)
+    return applied
+
+
+if __name__ == "__main__":
+    engine = engine_from_env()
+    connection = engine.connect()
+    cursor = engine.cursor(connection)
+    applied = migrate(engine, connection, cursor)
+    for version in applied:
+        print(f"Applied migration {version}")
+    print(f"Schema is at version {current_version(cursor)}")
+    connection.close()
@@ -0,0 +1,68 @@
+class KeysetPager:
+    def __init__(self, system, select, keys, conditions=(), params=(), page_size=20):
+        self.system = system
+        self.select = select
+        self.keys = keys
+        self.conditions = list(conditions)
+        self.params = list(params)
+        self.page_size = page_size
+        self.rows = []
+        self.page_number = 0
+        self.has_next = False
+        self.has_previous = False
+
+    def _seek(self, anchor, op):
+        # Expanded form of (k1, k2, ...) > (v1, v2, ...) so every engine can
+        # turn it into an index range scan.
+        clauses, params = [], []
+        for i, (column, field) in enumerate(self.keys):
+            parts = [f"{prior} = %s" for prior, _ in self.keys[:i]] + [f"{column} {op} %s"]
+            clauses.append("(" + " AND ".join(parts) + ")")
+            params.extend(anchor[name] for _, name in self.keys[:i + 1])
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def _fetch(self, anchor, forward):
+        conditions = list(self.conditions)
+        params = list(self.params)
+        if anchor is not None:
+            clause, seek_params = self._seek(anchor, '>' if forward else '<')
+            conditions.append(clause)
+            params.extend(seek_params)
+
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "ASC" if forward else "DESC"
+        order = ", ".join(f"{column} {direction}" for column, _ in self.keys)
+        query = f"{self.select}{where} ORDER BY {order} LIMIT {self.page_size + 1}"
+
+        rows = self.system.fetch_all(query, params)
+
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not forward:
+            rows.reverse()
+        return rows, more
+
+    def first(self):
+        self.rows, self.has_next = self._fetch(None, True)
+        self.has_previous = False
+        self.page_number = 1
+        return self.rows
+
+    def next(self):
+        if self.has_next:
+            self.rows, self.has_next = self._fetch(self.rows[-1], True)
+            self.has_previous = True
+            self.page_number += 1
+        return self.rows
+
+    def previous(self):
+        if self.has_previous:
+            self.rows, self.has_previous = self._fetch(self.rows[0], False)
+            self.has_next = True
+            self.page_number -= 1
+        return self.rows
+
+
+def prefix_pattern(prefix):
+    escaped = prefix.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+    return escaped + '%'
@@ -0,0 +1,145 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import Error, StorageError
+
+
+class PoolError(StorageError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, engine, size=5, timeout=30.0, health_check_after=60.0):
+        self.engine = engine
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self.metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'connections_opened': 0,
+            'health_checks': 0,
+            'reconnects': 0,
+            'discarded': 0,
+            'peak_in_use': 0
+        }
+
+    def _open(self):
+        connection = self.engine.connect()
+        with self._lock:
+            self.metrics['connections_opened'] += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self.metrics['discarded'] += 1
+            self._lock.notify()
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._lock:
+            if self._closed:
+                raise PoolError("Connection pool is closed")
+            waited = False
+            while not self._idle and self._created >= self.size:
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics['timeouts'] += 1
+                    raise PoolError(f"Timed out after {self.timeout}s waiting for a database connection")
+                self._lock.wait(remaining)
+            if waited:
+                self.metrics['waits'] += 1
+                self.metrics['wait_time'] += time.monotonic() - started
+            if self._idle:
+                connection, last_used = self._idle.pop()
+            else:
+                connection, last_used = None, None
+                self._created += 1
+            self._in_use += 1
+            self.metrics['checkouts'] += 1
+            self.metrics['peak_in_use'] = max(self.metrics['peak_in_use'], self._in_use)
+
+        try:
+            if connection is None:
+                connection = self._open()
+            elif time.monotonic() - last_used >= self.health_check_after:
+                with self._lock:
+                    self.metrics['health_checks'] += 1
+                if not self.engine.ping(connection):
+                    try:
+                        connection.close()
+                    except Error:
+                        pass
+                    connection = self._open()
+                    with self._lock:
+                        self.metrics['reconnects'] += 1
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+        return connection
+
+    def release(self, connection, failed=False):
+        with self._lock:
+            self._in_use -= 1
+        if failed and not self.engine.ping(connection):
+            self._discard(connection)
+            return
+        try:
+            # Never hand the next borrower somebody else's open transaction.
+            connection.rollback()
+        except Error:
+            self._discard(connection)
+            return
+        with self._lock:
+            if self._closed:
+                self._created -= 1
+                connection.close()
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, failed=True)
+            raise
+        else:
+            self.release(connection)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            stats.update(size=self.size, open=self._created, in_use=self._in_use, idle=len(self._idle))
+            return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for connection, _ in idle:
+            try:
+                connection.close()
+            except Error:
+                pass
@@ -0,0 +1,69 @@
+import re
+
+ANSI_PATTERN = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+LEADING_ANSI = re.compile(r'^(?:\x1b\[[0-9;]*[A-Za-z])+')
+RESET = '\x1b[0m'
+MAX_COLUMN_WIDTH = 40
+
+
+def visible(text):
+    return ANSI_PATTERN.sub('', text) if '\x1b' in text else text
+
+
+def _text(cell):
+    return '' if cell is None else str(cell)
+
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+class StreamingTable:
+    # Draws the same box as tabulate's fancy_grid, but sizes the columns once,
+    # from a sample of rows, and then renders every row on its own as it
+    # arrives. Cells wider than their column are cut short.
+    def __init__(self, headers, sample=(), widths=None, max_width=MAX_COLUMN_WIDTH):
+        self.headers = [_text(header) for header in headers]
+        sample = [[visible(_text(cell)) for cell in row] for row in sample]
+        if widths is None:
+            widths = [min(max([len(header)] + [len(row[i]) for row in sample]), max(max_width, len(header)))
+                      for i, header in enumerate(self.headers)]
+        self.widths = list(widths)
+        self.numeric = [any(row[i] for row in sample) and all(_is_number(row[i]) for row in sample if row[i])
+                        for i in range(len(self.headers))]
+        self.count = 0
+
+    def _rule(self, left, fill, joint, right):
+        return left + joint.join(fill * (width + 2) for width in self.widths) + right
+
+    def _cell(self, text, i, align_right):
+        width = self.widths[i]
+        plain = visible(text)
+        if len(plain) > width:
+            color = LEADING_ANSI.match(text)
+            plain = plain[:width - 1] + '…'
+            text = f"{color.group()}{plain}{RESET}" if color else plain
+        padding = ' ' * (width - len(plain))
+        return padding + text if align_right else text + padding
+
+    def _line(self, cells, numeric):
+        return '│ ' + ' │ '.join(self._cell(_text(cell), i, align)
+                                 for i, (cell, align) in enumerate(zip(cells, numeric))) + ' │'
+
+    def header(self):
+        return '\n'.join([self._rule('╒', '═', '╤', '╕'),
+                          self._line(self.headers, self.numeric),
+                          self._rule('╞', '═', '╪', '╡')])
+
+    def row(self, cells):
+        self.count += 1
+        line = self._line(cells, self.numeric)
+        return line if self.count == 1 else self._rule('├', '─', '┼', '┤') + '\n' + line
+
+    def footer(self):
+        self.count = 0
+        return self._rule('╘', '═', '╧', '╛')
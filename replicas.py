@@ -0,0 +1,188 @@
+import argparse
+import contextvars
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import Error, engine_from_env, replicas_from_env
+from pool import ConnectionPool
+
+HEARTBEAT_INTERVAL = 1.0
+MAX_LAG = 5.0
+# The session calls are made for: an HTTP client or a menu terminal. Reads
+# are kept off replicas that have not yet applied the session's last write.
+# None is shared by every caller that names no session.
+SESSION = contextvars.ContextVar('hms_session', default=None)
+
+
+@contextmanager
+def session(token):
+    reset = SESSION.set(token)
+    try:
+        yield
+    finally:
+        SESSION.reset(reset)
+
+
+def create_heartbeat_table(engine, cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS replication_heartbeat (
+        id INT PRIMARY KEY,
+        beat DOUBLE NOT NULL
+    )""")
+    cursor.execute("SELECT 1 FROM replication_heartbeat WHERE id = 1")
+    if not cursor.fetchone():
+        cursor.execute("INSERT INTO replication_heartbeat (id, beat) VALUES (1, 0)")
+
+
+class Replica:
+    def __init__(self, engine, pool_size):
+        self.engine = engine
+        self.pool = ConnectionPool(engine, size=pool_size)
+        self.healthy = False
+        # Primary clock time of the newest heartbeat this replica has applied.
+        self.applied = 0.0
+        self.lag = None
+        self.reads = 0
+        self.error = None
+
+    def stats(self):
+        return {'healthy': self.healthy, 'lag_seconds': None if self.lag is None else round(self.lag, 3),
+                'reads': self.reads, 'error': self.error, 'pool': self.pool.stats()}
+
+
+class ReplicaRouter:
+    # Sends reads round-robin to replicas that are reachable, no more than
+    # max_lag behind, and have applied this session's latest write; anything
+    # else reads from the primary. Lag is measured like pt-heartbeat: the
+    # primary stamps a heartbeat row every interval and each replica is
+    # asked which stamp it has reached.
+    def __init__(self, primary, engines=(), pool_size=5, max_lag=MAX_LAG, interval=HEARTBEAT_INTERVAL):
+        self.primary = primary
+        self.replicas = [Replica(engine, pool_size) for engine in engines]
+        self.max_lag = max_lag
+        self.interval = interval
+        self.turn = itertools.count()
+        # session -> time of its latest committed write
+        self.written = {}
+        self._written_lock = threading.Lock()
+        self.primary_reads = 0
+        self.fallbacks = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.replicas and self._thread is None:
+            self.check()
+            self._thread = threading.Thread(target=self._run, name="replica-heartbeat", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        # A write older than max_lag is on every replica fresh enough to use.
+        cutoff = time.time() - self.max_lag
+        with self._written_lock:
+            self.written = {token: at for token, at in self.written.items() if at > cutoff}
+        try:
+            with self.primary.connection() as connection:
+                cursor = self.primary.engine.cursor(connection)
+                cursor.execute("UPDATE replication_heartbeat SET beat = %s WHERE id = 1", (time.time(),))
+                connection.commit()
+                cursor.close()
+        except Error:
+            pass
+        for replica in self.replicas:
+            try:
+                with replica.pool.connection() as connection:
+                    cursor = replica.engine.cursor(connection)
+                    cursor.execute("SELECT beat FROM replication_heartbeat WHERE id = 1")
+                    row = cursor.fetchone()
+                    cursor.close()
+                replica.applied = row['beat'] if row else 0.0
+                replica.lag = time.time() - replica.applied
+                replica.healthy, replica.error = True, None
+            except Error as e:
+                replica.healthy, replica.error = False, str(e)
+
+    def wrote(self):
+        # Called once a write has committed, so a heartbeat the replica shows
+        # as applied was stamped after it.
+        if self.replicas:
+            with self._written_lock:
+                self.written[SESSION.get()] = time.time()
+
+    def choose(self):
+        # The replica to read from, or None for the primary.
+        written = self.written.get(SESSION.get(), 0.0)
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self.turn) % len(self.replicas)]
+            if replica.healthy and replica.lag <= self.max_lag and replica.applied >= written:
+                replica.reads += 1
+                return replica
+        self.primary_reads += 1
+        return None
+
+    def failed(self, replica, error):
+        # A replica that errors is skipped until the next heartbeat check finds it well.
+        replica.healthy, replica.error = False, str(error)
+        self.fallbacks += 1
+
+    def stats(self):
+        return {'max_lag_seconds': self.max_lag, 'primary_reads': self.primary_reads,
+                'fallbacks': self.fallbacks, 'replicas': [replica.stats() for replica in self.replicas]}
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        for replica in self.replicas:
+            replica.pool.close()
+
+
+def copy_sqlite(source, target, every):
+    # Stand-in replication for trying read routing locally with two SQLite
+    # files: the whole primary is copied over the replica every few seconds.
+    while True:
+        primary = sqlite3.connect(source)
+        replica = sqlite3.connect(target)
+        try:
+            primary.backup(replica)
+        finally:
+            replica.close()
+            primary.close()
+        print(json.dumps({'copied': source, 'to': target, 'at': time.strftime('%H:%M:%S')}), flush=True)
+        if not every:
+            break
+        time.sleep(every)
+
+
+def main(argv=None):
+    from services import HospitalService
+
+    parser = argparse.ArgumentParser(description="Read replica routing: status and a local SQLite stand-in replica.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="print each replica's health and lag as JSON")
+    copy = commands.add_parser('copy', help="copy a SQLite primary over a replica file, repeatedly")
+    copy.add_argument('source')
+    copy.add_argument('target')
+    copy.add_argument('--every', type=float, default=5.0, help="seconds between copies; 0 copies once")
+    args = parser.parse_args(argv)
+
+    if args.command == 'copy':
+        copy_sqlite(args.source, args.target, args.every)
+        return
+    service = HospitalService(engine_from_env(), pool_size=1, replicas=replicas_from_env())
+    try:
+        service.setup_database()
+        print(json.dumps(service.replicas.stats()))
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
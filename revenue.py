@@ -0,0 +1,158 @@
+import argparse
+import json
+
+from storage import engine_from_env
+
+UNASSIGNED = 'Unassigned'
+OUTSTANDING = ('Pending', 'Overdue')
+# Facts of bills moved out of the billing table by archive.py, so a rebuild still counts them.
+ARCHIVED_FACTS = 'billing_archive_facts'
+
+# dimension -> (summary table, key column, key type, key expression over billing b / doctors d)
+SUMMARIES = {
+    'month': ('revenue_by_month', 'month', 'CHAR(7)', "SUBSTR(b.bill_date, 1, 7)"),
+    'department': ('revenue_by_department', 'department', 'VARCHAR(100)', f"COALESCE(d.department, '{UNASSIGNED}')"),
+    'doctor': ('revenue_by_doctor', 'doctor_id', 'INT', "COALESCE(b.doctor_id, 0)")
+}
+
+
+def create_summary_tables(engine, cursor):
+    for table, column, column_type, _ in SUMMARIES.values():
+        cursor.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+            {column} {column_type} NOT NULL,
+            payment_status VARCHAR(10) NOT NULL,
+            bill_count INT NOT NULL DEFAULT 0,
+            total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY ({column}, payment_status)
+        )""")
+
+
+def create_archive_table(engine, cursor):
+    keys = ", ".join(f"{column} {column_type} NOT NULL" for _, column, column_type, _ in SUMMARIES.values())
+    cursor.execute(f"""CREATE TABLE IF NOT EXISTS {ARCHIVED_FACTS} (
+        {keys},
+        payment_status VARCHAR(10) NOT NULL,
+        bill_count INT NOT NULL DEFAULT 0,
+        total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY ({', '.join(column for _, column, _, _ in SUMMARIES.values())}, payment_status)
+    )""")
+
+
+def rebuild(engine, cursor, archived=True):
+    for table, column, _, expression in SUMMARIES.values():
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO {table} ({column}, payment_status, bill_count, total_amount)
+            SELECT {expression}, b.payment_status, COUNT(*), SUM(b.total_amount)
+            FROM billing b LEFT JOIN doctors d ON b.doctor_id = d.doctor_id
+            GROUP BY {expression}, b.payment_status
+        """)
+    if archived:
+        cursor.execute(f"SELECT * FROM {ARCHIVED_FACTS}")
+        apply(engine, cursor, cursor.fetchall())
+
+
+def bill_facts(engine, cursor, where, params):
+    keys = ", ".join(f"{expression} AS {column}" for _, column, _, expression in SUMMARIES.values())
+    groups = ", ".join(expression for _, _, _, expression in SUMMARIES.values())
+    # Locking the rows keeps a concurrent status change from moving the same
+    # bills between buckets twice.
+    cursor.execute(f"""
+        SELECT {keys}, b.payment_status, COUNT(*) AS bill_count, SUM(b.total_amount) AS total_amount
+        FROM billing b LEFT JOIN doctors d ON b.doctor_id = d.doctor_id
+        WHERE {where}
+        GROUP BY {groups}, b.payment_status{engine.row_lock}
+    """, params)
+    return cursor.fetchall()
+
+
+def apply(engine, cursor, facts, sign=1, payment_status=None):
+    for fact in facts:
+        for table, column, _, _ in SUMMARIES.values():
+            engine.accumulate(
+                cursor, table,
+                {column: fact[column], 'payment_status': payment_status or fact['payment_status']},
+                {'bill_count': sign * fact['bill_count'], 'total_amount': sign * fact['total_amount']}
+            )
+
+
+def add_bills(engine, cursor, where, params):
+    apply(engine, cursor, bill_facts(engine, cursor, where, params))
+
+
+def archive_bills(engine, cursor, where, params):
+    # Called before the rows leave the billing table.
+    keys = [column for _, column, _, _ in SUMMARIES.values()] + ['payment_status']
+    for fact in bill_facts(engine, cursor, where, params):
+        engine.accumulate(cursor, ARCHIVED_FACTS, {key: fact[key] for key in keys},
+                          {'bill_count': fact['bill_count'], 'total_amount': fact['total_amount']})
+
+
+def move_bills(engine, cursor, where, params, payment_status):
+    # Called before the UPDATE, while the rows still carry their old status.
+    facts = [fact for fact in bill_facts(engine, cursor, where, params)
+             if fact['payment_status'] != payment_status]
+    apply(engine, cursor, facts, -1)
+    apply(engine, cursor, facts, 1, payment_status)
+    return sum(fact['bill_count'] for fact in facts)
+
+
+def report(system, by):
+    table, column, _, _ = SUMMARIES[by]
+    amounts = ", ".join(
+        f"SUM(CASE WHEN r.payment_status = '{status}' THEN r.total_amount ELSE 0 END) AS {status.lower()}"
+        for status in ('Paid',) + OUTSTANDING
+    )
+    if by == 'doctor':
+        label = f"CASE WHEN d.doctor_id IS NULL THEN '{UNASSIGNED}' ELSE CONCAT(d.first_name, ' ', d.last_name) END"
+        joins, group = "LEFT JOIN doctors d ON d.doctor_id = r.doctor_id", "r.doctor_id, d.first_name, d.last_name"
+    else:
+        label, joins, group = f"r.{column}", "", f"r.{column}"
+    return system.fetch_all(f"""
+        SELECT r.{column} AS {column}, {label} AS label, SUM(r.bill_count) AS bills,
+               SUM(r.total_amount) AS billed, {amounts}
+        FROM {table} r {joins}
+        GROUP BY {group}
+        HAVING SUM(r.bill_count) > 0
+        ORDER BY r.{column}
+    """)
+
+
+def outstanding(system):
+    rows = system.fetch_all(
+        f"""SELECT payment_status, SUM(bill_count) AS bills, SUM(total_amount) AS amount
+            FROM revenue_by_month WHERE payment_status IN ({', '.join(['%s'] * len(OUTSTANDING))})
+            GROUP BY payment_status""",
+        OUTSTANDING
+    )
+    totals = {status: {'bills': 0, 'amount': 0} for status in OUTSTANDING}
+    for row in rows:
+        totals[row['payment_status']] = {'bills': row['bills'], 'amount': row['amount']}
+    return totals
+
+
+def main(argv=None):
+    from services import HospitalService
+
+    parser = argparse.ArgumentParser(description="Billing revenue and receivables summaries.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help="recompute every summary table from the billing table and archived bills")
+    show = commands.add_parser('report', help="print a revenue report as JSON")
+    show.add_argument('--by', choices=sorted(SUMMARIES), default='month')
+    args = parser.parse_args(argv)
+
+    service = HospitalService(engine_from_env(), pool_size=1)
+    try:
+        service.setup_database()
+        if args.command == 'rebuild':
+            service.rebuild_revenue_summaries()
+            print(json.dumps({'rebuilt': [table for table, _, _, _ in SUMMARIES.values()]}))
+        else:
+            print(json.dumps({'by': args.by, 'rows': service.revenue_report(args.by),
+                              'outstanding': service.outstanding_totals()}, default=str))
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
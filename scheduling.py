@@ -0,0 +1,321 @@
+import bisect
+import datetime
+import itertools
+import threading
+import time
+
+from storage import StorageError
+
+
+class SlotConflict(StorageError):
+    pass
+
+
+def to_minutes(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+    hours, minutes = str(value).split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def _taken(doctor_id, day, taken):
+    return SlotConflict(f"Doctor {doctor_id} already has an appointment at {taken} on {to_date(day)}")
+
+
+GROUP_COLUMNS = ('specialization', 'department')
+
+
+class _Day:
+    __slots__ = ('loaded_at', 'starts', 'busy')
+
+    def __init__(self, loaded_at, starts, busy):
+        self.loaded_at = loaded_at
+        # Sorted booked start minutes.
+        self.starts = starts
+        # Bit i is set when working-hours slot i overlaps a booking.
+        self.busy = busy
+
+
+class ScheduleIndex:
+    def __init__(self, system, slot_minutes=30, day_start='09:00', day_end='17:00',
+                 max_age=60.0, load_days=7, max_entries=100000):
+        self.system = system
+        self.slot_minutes = slot_minutes
+        self.day_start = to_minutes(day_start)
+        self.day_end = to_minutes(day_end)
+        self.slots = (self.day_end - self.day_start) // slot_minutes
+        self.max_age = max_age
+        self.load_days = load_days
+        self.max_entries = max_entries
+        self.lock = threading.RLock()
+        # (doctor_id, date) -> _Day, oldest loaded first
+        self._days = {}
+        # (column, value) -> (loaded_at, doctors ordered by ID)
+        self._groups = {}
+        self._swept = time.monotonic()
+
+    def _occupancy(self, starts):
+        busy = 0
+        for start in starts:
+            # A booking overlaps the slot it starts in, and the next one too
+            # unless it starts on a slot boundary.
+            offset = start - self.day_start
+            first = max(offset // self.slot_minutes, 0)
+            last = min(-(-offset // self.slot_minutes), self.slots - 1)
+            if first <= last:
+                busy |= ((1 << (last - first + 1)) - 1) << first
+        return busy
+
+    def _stale(self, doctor_id, day):
+        entry = self._days.get((doctor_id, day))
+        return entry is None or time.monotonic() - entry.loaded_at > self.max_age
+
+    def _evict(self, room):
+        # Stale entries would be reloaded before use anyway, so they are
+        # dropped once every max_age, past days included. Beyond max_entries
+        # the oldest loaded go first, making room for the load about to happen.
+        now = time.monotonic()
+        if now - self._swept > self.max_age:
+            self._swept = now
+            for key in [key for key, entry in self._days.items() if now - entry.loaded_at > self.max_age]:
+                del self._days[key]
+            for key in [key for key, entry in self._groups.items() if now - entry[0] > self.max_age]:
+                del self._groups[key]
+        excess = len(self._days) + room - self.max_entries
+        if excess > 0:
+            for key in list(itertools.islice(self._days, excess)):
+                del self._days[key]
+
+    def _load(self, doctor_ids, first_day):
+        self._evict(len(doctor_ids) * self.load_days)
+        last_day = first_day + datetime.timedelta(days=self.load_days - 1)
+        rows = self.system.fetch_all(
+            f"""SELECT doctor_id, appointment_date, appointment_time FROM appointments
+               WHERE doctor_id IN ({', '.join(['%s'] * len(doctor_ids))})
+               AND appointment_date BETWEEN %s AND %s
+               AND status <> 'Cancelled'""",
+            (*doctor_ids, first_day.isoformat(), last_day.isoformat())
+        )
+        loaded_at = time.monotonic()
+        days = {(doctor_id, first_day + datetime.timedelta(days=i)): []
+                for doctor_id in doctor_ids for i in range(self.load_days)}
+        for row in rows:
+            days[(row['doctor_id'], to_date(row['appointment_date']))].append(to_minutes(row['appointment_time']))
+        for key, starts in days.items():
+            starts.sort()
+            # Re-inserted, so the dict stays in load order.
+            self._days.pop(key, None)
+            self._days[key] = _Day(loaded_at, starts, self._occupancy(starts))
+
+    def _day(self, doctor_id, day):
+        if self._stale(doctor_id, day):
+            self._load([doctor_id], day)
+        return self._days[(doctor_id, day)]
+
+    def _booked(self, doctor_id, day):
+        return self._day(doctor_id, day).starts
+
+    def occupancy(self, doctor_ids, day):
+        # Busy bitmaps for several doctors on one day, loading the missing
+        # ones with a single query.
+        day = to_date(day)
+        with self.lock:
+            stale = [doctor_id for doctor_id in doctor_ids if self._stale(doctor_id, day)]
+            for i in range(0, len(stale), 500):
+                self._load(stale[i:i + 500], day)
+            return [self._days[(doctor_id, day)].busy for doctor_id in doctor_ids]
+
+    def conflict(self, doctor_id, day, minute):
+        with self.lock:
+            starts = self._booked(int(doctor_id), to_date(day))
+            minute = to_minutes(minute)
+            # Every booking lasts one slot, so only the neighbours either side
+            # of the insertion point can overlap.
+            i = bisect.bisect_left(starts, minute)
+            if i < len(starts) and starts[i] < minute + self.slot_minutes:
+                return format_minutes(starts[i])
+            if i > 0 and starts[i - 1] + self.slot_minutes > minute:
+                return format_minutes(starts[i - 1])
+            return None
+
+    def add(self, doctor_id, day, minute):
+        with self.lock:
+            entry = self._day(int(doctor_id), to_date(day))
+            minute = to_minutes(minute)
+            i = bisect.bisect_left(entry.starts, minute)
+            # Already there when the day was just reloaded with it.
+            if i == len(entry.starts) or entry.starts[i] != minute:
+                entry.starts.insert(i, minute)
+                entry.busy = self._occupancy(entry.starts)
+
+    def remove(self, doctor_id, day, minute):
+        with self.lock:
+            entry = self._day(int(doctor_id), to_date(day))
+            minute = to_minutes(minute)
+            i = bisect.bisect_left(entry.starts, minute)
+            if i < len(entry.starts) and entry.starts[i] == minute:
+                del entry.starts[i]
+                entry.busy = self._occupancy(entry.starts)
+
+    def claim(self, cursor, doctor_id, day, minute, exclude=None):
+        # The conflict check again, against the database inside the writing
+        # transaction: the index is per process and may be up to max_age old.
+        # The rows read stay locked until commit (FOR UPDATE takes next-key
+        # locks on MySQL; SQLite writes begin with BEGIN IMMEDIATE).
+        minute = to_minutes(minute)
+        query = """SELECT appointment_time FROM appointments
+                   WHERE doctor_id = %s AND appointment_date = %s AND status <> 'Cancelled'
+                   AND appointment_time >= %s AND appointment_time < %s"""
+        params = [int(doctor_id), to_date(day).isoformat(),
+                  format_minutes(max(minute - self.slot_minutes + 1, 0)), format_minutes(minute + self.slot_minutes)]
+        if exclude is not None:
+            query += " AND appointment_id <> %s"
+            params.append(exclude)
+        cursor.execute(query + self.system.engine.row_lock, params)
+        row = cursor.fetchone()
+        if row:
+            raise _taken(doctor_id, day, format_minutes(to_minutes(row['appointment_time'])))
+
+    def reserve(self, doctor_id, day, minute, write, release=None):
+        # The slot is taken in the index under the lock, so other sessions in
+        # this process see it, but write() runs and commits without the lock;
+        # if it fails the slot is given back. release, a (day, minute) the same
+        # doctor is moving from, is freed first so a small shift within it is
+        # allowed, and restored on failure.
+        with self.lock:
+            if release is not None:
+                self.remove(doctor_id, *release)
+            taken = self.conflict(doctor_id, day, minute)
+            if taken:
+                if release is not None:
+                    self.add(doctor_id, *release)
+                raise _taken(doctor_id, day, taken)
+            self.add(doctor_id, day, minute)
+        try:
+            return write()
+        except SlotConflict:
+            # Booked elsewhere since this index was loaded.
+            self.invalidate(doctor_id)
+            raise
+        except BaseException:
+            with self.lock:
+                self.remove(doctor_id, day, minute)
+                if release is not None:
+                    self.add(doctor_id, *release)
+            raise
+
+    def invalidate(self, doctor_id=None):
+        with self.lock:
+            if doctor_id is None:
+                self._days.clear()
+                self._groups.clear()
+            else:
+                for key in [key for key in self._days if key[0] == int(doctor_id)]:
+                    del self._days[key]
+
+    def invalidate_groups(self):
+        with self.lock:
+            self._groups.clear()
+
+    def doctors_in(self, column, value):
+        if column not in GROUP_COLUMNS:
+            raise ValueError(f"Doctors are grouped by {' or '.join(GROUP_COLUMNS)}, not {column!r}")
+        with self.lock:
+            entry = self._groups.get((column, value))
+            if entry is None or time.monotonic() - entry[0] > self.max_age:
+                doctors = self.system.fetch_all(
+                    f"""SELECT doctor_id, first_name, last_name, specialization, department
+                       FROM doctors WHERE {column} = %s ORDER BY doctor_id""",
+                    (value,)
+                )
+                entry = self._groups[(column, value)] = (time.monotonic(), doctors)
+            return entry[1]
+
+    def window(self, start=None, end=None):
+        # Bits of the slots that start at or after start and finish by end.
+        first = 0
+        if start is not None:
+            first = max(-(-(to_minutes(start) - self.day_start) // self.slot_minutes), 0)
+        last = self.slots
+        if end is not None:
+            last = min((to_minutes(end) - self.day_start) // self.slot_minutes, self.slots)
+        return ((1 << (last - first)) - 1) << first if last > first else 0
+
+    def _slot_times(self, bits):
+        while bits:
+            lowest = bits & -bits
+            yield lowest, format_minutes(self.day_start + (lowest.bit_length() - 1) * self.slot_minutes)
+            bits ^= lowest
+
+    def _days_from(self, after, max_days):
+        after = after or datetime.datetime.now()
+        day = after.date()
+        yield day, self.window(after.hour * 60 + after.minute)
+        for _ in range(max_days - 1):
+            day += datetime.timedelta(days=1)
+            yield day, self.window()
+
+    def free_slots(self, doctor_id, after=None, max_days=30):
+        doctor_id = int(doctor_id)
+        for day, window in self._days_from(after, max_days):
+            busy, = self.occupancy([doctor_id], day)
+            for _, slot in self._slot_times(window & ~busy):
+                yield day, slot
+
+    def next_free_slots(self, doctor_id, after=None, count=5, max_days=30):
+        slots = []
+        for slot in self.free_slots(doctor_id, after, max_days):
+            slots.append(slot)
+            if len(slots) >= count:
+                break
+        return slots
+
+    def free_by_doctor(self, doctors, day, window):
+        free = [window & ~busy for busy in self.occupancy([doctor['doctor_id'] for doctor in doctors], day)]
+        # Slots at least one of the doctors has free.
+        anyone = 0
+        for bits in free:
+            anyone |= bits
+        return free, anyone
+
+    def availability(self, column, value, day, start=None, end=None):
+        # Each slot of the day in the window that some doctor of the group has
+        # free, with those doctors.
+        doctors = self.doctors_in(column, value)
+        free, anyone = self.free_by_doctor(doctors, to_date(day), self.window(start, end))
+        return [(slot, [doctor for doctor, bits in zip(doctors, free) if bits & bit])
+                for bit, slot in self._slot_times(anyone)]
+
+    def next_free_in(self, column, value, after=None, count=5, max_days=30):
+        doctors = self.doctors_in(column, value)
+        slots = []
+        if not doctors:
+            return slots
+        for day, window in self._days_from(after, max_days):
+            free, anyone = self.free_by_doctor(doctors, day, window)
+            for bit, slot in self._slot_times(anyone):
+                for doctor, bits in zip(doctors, free):
+                    if bits & bit:
+                        slots.append((day, slot, doctor))
+                        if len(slots) >= count:
+                            return slots
+        return slots
+
+    def next_free_for_specialization(self, specialization, after=None, count=5, max_days=30):
+        return self.next_free_in('specialization', specialization, after, count, max_days)
@@ -0,0 +1,330 @@
+import datetime
+import heapq
+import math
+import json
+import os
+import re
+import threading
+
+from history import moved_years, with_year_tables, year_table
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it of on or the to was were with'.split()
+)
+TEXT_COLUMNS = ('diagnosis', 'prescription', 'treatment_plan')
+# Tables whose edits and deletions go through index_changes.
+INDEXED_TABLES = ('medical_records', 'patients')
+RESULT_COLUMNS = """mr.record_id, mr.patient_id, mr.visit_date, mr.diagnosis, mr.prescription, mr.treatment_plan,
+    CONCAT(p.first_name, ' ', p.last_name) AS patient_name,
+    CONCAT(d.first_name, ' ', d.last_name) AS doctor_name"""
+RECORD_COLUMNS = "record_id, patient_id, doctor_id, visit_date, " + ", ".join(TEXT_COLUMNS)
+RESULT_FROM = """FROM {records} mr
+    JOIN patients p ON mr.patient_id = p.patient_id
+    JOIN doctors d ON mr.doctor_id = d.doctor_id"""
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall((text or '').lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+def load_snapshot(path, factory):
+    # Snapshots are plain JSON, never unpickled: a file next to the database
+    # is not trusted to run code.
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return factory.from_snapshot(json.load(f))
+        except Exception:
+            # A damaged or outdated snapshot is rebuilt from the table on first use.
+            pass
+    return factory()
+
+
+def save_snapshot(path, value):
+    temporary = f"{path}.tmp"
+    # Readable by the owner only: the index holds patient data.
+    with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+        json.dump(value.snapshot(), f, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def log_changes(cursor, table, key, where, params=(), source=None):
+    # Records that the rows of table matching where are being edited or moved
+    # out, in the caller's transaction; every process's index re-reads them.
+    # source is where those rows are read from, when not table itself.
+    cursor.execute(
+        f"INSERT INTO index_changes (table_name, row_id) SELECT %s, {key} FROM {source or table} WHERE {where}",
+        (table,) + tuple(params)
+    )
+
+
+def read_changes(system, table, after, limit=5000):
+    # (last change_id, IDs of the rows changed after the given change_id).
+    rows = system.fetch_all(
+        f"""SELECT change_id, row_id FROM index_changes
+            WHERE table_name = %s AND change_id > %s ORDER BY change_id LIMIT {int(limit)}""",
+        (table, after)
+    )
+    return (rows[-1]['change_id'] if rows else after), {row['row_id'] for row in rows}, len(rows) == limit
+
+
+def last_change(system):
+    return system.fetch_one("SELECT MAX(change_id) AS last FROM index_changes")['last'] or 0
+
+
+def _day(value):
+    return datetime.date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class RecordIndex:
+    # BM25 parameters.
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = {}
+        # record_id -> (patient_id, visit day ordinal, token count, distinct tokens)
+        self.documents = {}
+        self.total_length = 0
+        self.watermark = 0
+        # Last index_changes entry applied.
+        self.changes = 0
+
+    def add(self, record_id, patient_id, visit_date, texts):
+        self.remove(record_id)
+        tokens = [token for text in texts for token in tokenize(text)]
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            self.postings.setdefault(token, {})[record_id] = count
+        self.documents[record_id] = (patient_id, _day(visit_date), len(tokens), tuple(counts))
+        self.total_length += len(tokens)
+        self.watermark = max(self.watermark, record_id)
+
+    def remove(self, record_id):
+        document = self.documents.pop(record_id, None)
+        if document is None:
+            return
+        for token in document[3]:
+            postings = self.postings[token]
+            del postings[record_id]
+            if not postings:
+                del self.postings[token]
+        self.total_length -= document[2]
+
+    def snapshot(self):
+        return {'watermark': self.watermark, 'changes': self.changes,
+                'documents': [[record_id, patient_id, day, length] for record_id, (patient_id, day, length, _)
+                              in self.documents.items()],
+                'postings': {token: [[record_id, count] for record_id, count in postings.items()]
+                             for token, postings in self.postings.items()}}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        index = cls()
+        index.watermark, index.changes = data['watermark'], data['changes']
+        index.postings = {token: dict((record_id, count) for record_id, count in postings)
+                          for token, postings in data['postings'].items()}
+        tokens = {}
+        for token, postings in index.postings.items():
+            for record_id in postings:
+                tokens.setdefault(record_id, []).append(token)
+        for record_id, patient_id, day, length in data['documents']:
+            index.documents[record_id] = (patient_id, day, length, tuple(tokens.get(record_id, ())))
+            index.total_length += length
+        return index
+
+    def search(self, terms, since=None, patient_id=None, limit=20):
+        lists = [self.postings.get(term) for term in dict.fromkeys(terms)]
+        if not lists or not all(lists):
+            return []
+        lists.sort(key=len)
+        since = since.toordinal() if since else None
+        average = self.total_length / len(self.documents)
+        total = len(self.documents)
+        weights = [math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5)) for postings in lists]
+
+        def scored():
+            # Every term must match; walk the rarest posting list and probe the rest.
+            for record_id in lists[0]:
+                if not all(record_id in postings for postings in lists[1:]):
+                    continue
+                owner, day, length, _ = self.documents[record_id]
+                if (since and day < since) or (patient_id and owner != patient_id):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / average)
+                score = sum(weight * postings[record_id] * (self.k1 + 1) / (postings[record_id] + norm)
+                            for weight, postings in zip(weights, lists))
+                yield score, record_id
+
+        return heapq.nlargest(limit, scored())
+
+
+class RecordSearch:
+    def __init__(self, system, path=None, save_every=5000):
+        self.system = system
+        self.path = path
+        self.save_every = save_every
+        self.fulltext = system.engine.name == 'mysql'
+        self.index = None
+        self.unsaved = 0
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.index is None:
+            self.index = load_snapshot(self.path, RecordIndex)
+        return self.index
+
+    def _records(self):
+        # Records in years moved to year tables are still searched.
+        return with_year_tables('medical_records', moved_years(self.system, 'medical_records'), RECORD_COLUMNS)
+
+    def _add(self, index, rows):
+        for row in rows:
+            index.add(row['record_id'], row['patient_id'], row['visit_date'],
+                      [row[column] for column in TEXT_COLUMNS])
+        self.unsaved += len(rows)
+
+    def refresh(self):
+        # The database is the source of truth: catch up on every record past the
+        # index watermark, and re-read every record edited or archived since the
+        # last change applied, whichever process wrote it.
+        with self.lock:
+            index = self._load()
+            scratch = not index.documents and not index.changes
+            if scratch:
+                # Built from scratch: the records read below are already current.
+                index.changes = last_change(self.system)
+            # New records always land in medical_records, with a key above
+            # every record moved to a year table.
+            while True:
+                rows = self.system.fetch_all(
+                    f"""SELECT {RECORD_COLUMNS}
+                        FROM medical_records WHERE record_id > %s ORDER BY record_id LIMIT 5000""",
+                    (index.watermark,)
+                )
+                self._add(index, rows)
+                if len(rows) < 5000:
+                    break
+            if scratch:
+                for year in moved_years(self.system, 'medical_records'):
+                    self._add(index, self.system.fetch_all(
+                        f"SELECT {RECORD_COLUMNS} FROM {year_table('medical_records', year)}"
+                    ))
+            more = True
+            while more:
+                index.changes, changed, more = read_changes(self.system, 'medical_records', index.changes)
+                changed = sorted(record_id for record_id in changed if record_id <= index.watermark)
+                for i in range(0, len(changed), 500):
+                    chunk = changed[i:i + 500]
+                    for record_id in chunk:
+                        index.remove(record_id)
+                    self._add(index, self.system.fetch_all(
+                        f"""SELECT {RECORD_COLUMNS}
+                            FROM {self._records()} mr WHERE record_id IN ({', '.join(['%s'] * len(chunk))})""",
+                        chunk
+                    ))
+                    self.unsaved += len(chunk)
+            if self.unsaved >= self.save_every:
+                self._save()
+
+    def record_added(self):
+        if not self.fulltext and self.index is not None:
+            self.refresh()
+
+    def _save(self):
+        if self.path and self.index is not None and self.unsaved:
+            save_snapshot(self.path, self.index)
+            self.unsaved = 0
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def search(self, query, since=None, patient_id=None, offset=0, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if self.fulltext:
+            return self._search_fulltext(terms, since, patient_id, offset, limit)
+
+        self.refresh()
+        records = self._records()
+        while True:
+            with self.lock:
+                hits = self.index.search(terms, since, patient_id, offset + limit)
+            if not hits:
+                return []
+            # Records gone from the table without a logged change are dropped
+            # before the page is cut, and the search run again to fill it.
+            ids = [record_id for _, record_id in hits]
+            present = {row['record_id'] for row in self.system.fetch_all(
+                f"SELECT record_id FROM {records} mr WHERE record_id IN ({', '.join(['%s'] * len(ids))})", ids
+            )}
+            if len(present) == len(ids):
+                break
+            with self.lock:
+                for record_id in set(ids) - present:
+                    self.index.remove(record_id)
+                self.unsaved += len(ids) - len(present)
+        hits = hits[offset:]
+        if not hits:
+            return []
+        rows = self.system.fetch_all(
+            f"SELECT {RESULT_COLUMNS} {RESULT_FROM.format(records=records)} WHERE mr.record_id IN ({', '.join(['%s'] * len(hits))})",
+            [record_id for _, record_id in hits]
+        )
+        by_id = {row['record_id']: row for row in rows}
+        return [dict(by_id[record_id], score=round(score, 4)) for score, record_id in hits if record_id in by_id]
+
+    def _search_fulltext(self, terms, since, patient_id, offset, limit):
+        match = f"MATCH (mr.{', mr.'.join(TEXT_COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)"
+        expression = ' '.join(f"+{term}" for term in terms)
+        conditions, params = [match], [expression, expression]
+        if since:
+            conditions.append("mr.visit_date >= %s")
+            params.append(since.isoformat())
+        if patient_id:
+            conditions.append("mr.patient_id = %s")
+            params.append(patient_id)
+        return self.system.fetch_all(
+            f"""SELECT {RESULT_COLUMNS}, {match} AS score {RESULT_FROM.format(records='medical_records')}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY score DESC, mr.record_id DESC LIMIT {int(limit)} OFFSET {int(offset)}""",
+            params
+        )
+
+
+class SearchPager:
+    def __init__(self, search, query, since=None, patient_id=None, page_size=20):
+        self.search = search
+        self.query = query
+        self.since = since
+        self.patient_id = patient_id
+        self.page_size = page_size
+        self.rows = []
+        self.page_number = 0
+        self.has_next = False
+        self.has_previous = False
+
+    def go_to(self, page_number):
+        # Ranked results have no stable key to seek on, so pages are offsets.
+        rows = self.search.search(self.query, self.since, self.patient_id,
+                                  (page_number - 1) * self.page_size, self.page_size + 1)
+        self.rows = rows[:self.page_size]
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = page_number > 1
+        self.page_number = page_number
+        return self.rows
+
+    def first(self):
+        return self.go_to(1)
+
+    def next(self):
+        return self.go_to(self.page_number + 1) if self.has_next else self.rows
+
+    def previous(self):
+        return self.go_to(self.page_number - 1) if self.has_previous else self.rows
@@ -0,0 +1,453 @@
+import argparse
+import asyncio
+import datetime
+import decimal
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from storage import engine_from_env, replicas_from_env
+from pool import PoolError
+from scheduling import SlotConflict
+from services import ConflictError, Error, HospitalService, NotFoundError, ValidationError
+import metrics
+
+MAX_BODY = 1024 * 1024
+MAX_PAGE_SIZE = 500
+
+TEXT = (str,)
+# Numbers may also arrive as strings; the service parses and checks them.
+NUMBER = (int, float, str)
+
+# Body fields per route: required ones, then optional ones, with their types.
+PATIENT_FIELDS = ({'first_name': TEXT, 'last_name': TEXT, 'date_of_birth': TEXT, 'gender': TEXT,
+                   'contact_number': TEXT, 'email': TEXT},
+                  {'address': TEXT, 'blood_group': TEXT})
+PATIENT_CHANGES = ({}, {'contact_number': TEXT, 'email': TEXT, 'address': TEXT, 'blood_group': TEXT,
+                        'version': NUMBER})
+DOCTOR_FIELDS = ({'first_name': TEXT, 'last_name': TEXT, 'specialization': TEXT, 'contact_number': TEXT,
+                  'email': TEXT, 'department': TEXT, 'joining_date': TEXT, 'consultation_fee': NUMBER},
+                 {})
+APPOINTMENT_FIELDS = ({'patient_id': NUMBER, 'doctor_id': NUMBER, 'appointment_date': TEXT,
+                       'appointment_time': TEXT},
+                      {'reason': TEXT})
+APPOINTMENT_CHANGES = ({}, {'appointment_date': TEXT, 'appointment_time': TEXT, 'status': TEXT, 'version': NUMBER})
+MEDICAL_RECORD_FIELDS = ({'patient_id': NUMBER, 'doctor_id': NUMBER, 'diagnosis': TEXT, 'prescription': TEXT,
+                          'treatment_plan': TEXT},
+                         {})
+BILL_FIELDS = ({'patient_id': NUMBER, 'total_amount': NUMBER}, {'payment_status': TEXT, 'doctor_id': NUMBER})
+BILL_CHANGES = ({'payment_status': TEXT}, {'version': NUMBER})
+
+log = logging.getLogger('hms.server')
+
+REASONS = {
+    200: 'OK', 201: 'Created', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+    500: 'Internal Server Error', 503: 'Service Unavailable'
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        minutes = int(value.total_seconds()) // 60
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _anchor(after, keys):
+    # The cursor a previous page returned: an object with a plain value for
+    # every key column.
+    try:
+        anchor = json.loads(after)
+    except ValueError:
+        anchor = None
+    if not isinstance(anchor, dict) or not all(
+            isinstance(anchor.get(key), (str, int, float)) and not isinstance(anchor[key], bool) for key in keys):
+        raise ValidationError("after must be the 'next' cursor returned with the previous page")
+    return anchor
+
+
+def _page(pager, after):
+    # Each request is stateless, so the client hands back the last key it saw.
+    keys = [field for _, field in pager.keys]
+    if after:
+        pager.rows = [_anchor(after, keys)]
+        pager.has_next = True
+        rows = pager.next()
+    else:
+        rows = pager.first()
+    cursor = json.dumps({key: rows[-1][key] for key in keys}, default=_default) if rows and pager.has_next else None
+    return {'rows': rows, 'next': cursor}
+
+
+def _history(pager, after):
+    # History pages by period. The cursor is the year to carry on from, so
+    # years moved to year tables or archive files are reached like any other.
+    if after:
+        try:
+            year = int(after)
+        except ValueError:
+            raise ValidationError("after must be the 'next' cursor returned with the previous page")
+        rows = pager.start_at(year)
+    else:
+        rows = pager.first()
+    return {'rows': rows, 'period': pager.label, 'next': str(pager.next_year) if pager.has_next else None}
+
+
+def _fields(body, spec):
+    # The body's fields, checked against what the route takes; null optional
+    # fields are dropped. Their values are validated by the service.
+    required, optional = spec
+    unknown = sorted(set(body) - set(required) - set(optional))
+    if unknown:
+        raise HTTPError(400, f"Unknown field(s): {', '.join(unknown)}")
+    missing = [name for name in required if body.get(name) is None]
+    if missing:
+        raise HTTPError(400, f"Missing field(s): {', '.join(missing)}")
+    fields = {}
+    for name, value in body.items():
+        if value is None:
+            continue
+        types = required.get(name) or optional[name]
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise HTTPError(400, f"{name} must be {'a string' if types is TEXT else 'a number'}")
+        fields[name] = value
+    return fields
+
+
+def _count(query, name, default):
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise HTTPError(400, f"{name} must be a whole number")
+    return min(max(value, 1), MAX_PAGE_SIZE)
+
+
+def _after(query):
+    value = query.get('after')
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+class Routes:
+    def __init__(self, service):
+        self.service = service
+        self.table = [
+            ('GET', r'/health', self.health),
+            ('GET', r'/metrics', self.metrics),
+            ('GET', r'/patients', self.list_patients),
+            ('POST', r'/patients', self.create_patient),
+            ('GET', r'/patients/search', self.find_patients),
+            ('GET', r'/patients/(\d+)', self.get_patient),
+            ('PATCH', r'/patients/(\d+)', self.update_patient),
+            ('GET', r'/patients/(\d+)/medical-records', self.medical_records),
+            ('GET', r'/patients/(\d+)/bills', self.billing_history),
+            ('GET', r'/doctors', self.list_doctors),
+            ('POST', r'/doctors', self.create_doctor),
+            ('GET', r'/doctors/(\d+)', self.get_doctor),
+            ('GET', r'/doctors/(\d+)/free-slots', self.free_slots),
+            ('GET', r'/free-slots', self.free_slots_for_specialization),
+            ('GET', r'/availability', self.availability),
+            ('GET', r'/appointments', self.list_appointments),
+            ('POST', r'/appointments', self.book_appointment),
+            ('GET', r'/appointments/(\d+)', self.get_appointment),
+            ('PATCH', r'/appointments/(\d+)', self.update_appointment),
+            ('POST', r'/medical-records', self.add_medical_record),
+            ('GET', r'/medical-records/search', self.search_records),
+            ('POST', r'/bills', self.generate_bill),
+            ('GET', r'/bills/(\d+)', self.get_bill),
+            ('PATCH', r'/bills/(\d+)', self.update_bill),
+            ('GET', r'/reports/revenue', self.revenue_report),
+            ('GET', r'/reports/outstanding', self.outstanding)
+        ]
+        self.table = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in self.table]
+
+    def resolve(self, method, path):
+        allowed = False
+        for route_method, pattern, handler in self.table:
+            match = pattern.match(path)
+            if match:
+                if route_method == method:
+                    return handler, match.groups()
+                allowed = True
+        if allowed:
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        raise HTTPError(404, f"No route for {path}")
+
+    def health(self, query, body):
+        return 200, {'status': 'ok', 'pool': self.service.pool.stats(), 'cache': self.service.cache_stats(),
+                     'writes': self.service.write_stats(), 'replicas': self.service.replicas.stats()}
+
+    def metrics(self, query, body):
+        return 200, metrics.REGISTRY.snapshot()
+
+    def list_patients(self, query, body):
+        pager = self.service.patient_pager(query.get('name'), query.get('registered_from'),
+                                           _count(query, 'page_size', 20))
+        return 200, _page(pager, query.get('after'))
+
+    def create_patient(self, query, body):
+        return 201, {'patient_id': self.service.register_patient(**_fields(body, PATIENT_FIELDS))}
+
+    def find_patients(self, query, body):
+        return 200, {'rows': self.service.find_patients(query.get('q'), _count(query, 'limit', 20))}
+
+    def get_patient(self, query, body, patient_id):
+        patient = self.service.get_patient_details(patient_id)
+        if not patient:
+            raise NotFoundError(f"Patient ID {patient_id} does not exist.")
+        return 200, patient
+
+    def update_patient(self, query, body, patient_id):
+        self.service.update_patient(patient_id, **_fields(body, PATIENT_CHANGES))
+        return 200, self.service.get_patient_details(patient_id)
+
+    def medical_records(self, query, body, patient_id):
+        self.service.require_patient(patient_id)
+        return 200, _history(self.service.medical_record_pager(patient_id), query.get('after'))
+
+    def billing_history(self, query, body, patient_id):
+        self.service.require_patient(patient_id)
+        return 200, _history(self.service.billing_pager(patient_id), query.get('after'))
+
+    def list_doctors(self, query, body):
+        pager = self.service.doctor_pager(query.get('name'), query.get('joined_from'),
+                                          _count(query, 'page_size', 20))
+        return 200, _page(pager, query.get('after'))
+
+    def create_doctor(self, query, body):
+        return 201, {'doctor_id': self.service.register_doctor(**_fields(body, DOCTOR_FIELDS))}
+
+    def get_doctor(self, query, body, doctor_id):
+        return 200, self.service.require_doctor(doctor_id)
+
+    def free_slots(self, query, body, doctor_id):
+        self.service.require_doctor(doctor_id)
+        slots = self.service.free_slots(doctor_id, _after(query), _count(query, 'count', 5))
+        return 200, {'slots': [{'date': day, 'time': slot} for day, slot in slots]}
+
+    def free_slots_for_specialization(self, query, body):
+        if query.get('department'):
+            slots = self.service.free_slots_for_department(
+                query['department'], _after(query), _count(query, 'count', 5)
+            )
+        elif query.get('specialization'):
+            slots = self.service.free_slots_for_specialization(
+                query['specialization'], _after(query), _count(query, 'count', 5)
+            )
+        else:
+            raise ValidationError("specialization or department is required")
+        return 200, {'slots': [{'date': day, 'time': slot, 'doctor': doctor} for day, slot, doctor in slots]}
+
+    def availability(self, query, body):
+        if not query.get('date'):
+            raise ValidationError("date is required")
+        slots = self.service.availability(query['date'], query.get('specialization'), query.get('department'),
+                                          query.get('from'), query.get('to'))
+        return 200, {'date': query['date'], 'slots': [{'time': slot, 'doctors': doctors} for slot, doctors in slots]}
+
+    def list_appointments(self, query, body):
+        pager = self.service.appointment_pager(
+            query.get('date_from'), query.get('date_to'), query.get('doctor_id'),
+            query.get('patient_id'), query.get('status'), _count(query, 'page_size', 20)
+        )
+        return 200, _page(pager, query.get('after'))
+
+    def book_appointment(self, query, body):
+        fields = _fields(body, APPOINTMENT_FIELDS)
+        self.service.require_patient(fields['patient_id'])
+        self.service.require_doctor(fields['doctor_id'])
+        return 201, {'appointment_id': self.service.book_appointment(**fields)}
+
+    def get_appointment(self, query, body, appointment_id):
+        return 200, self.service.require_appointment(appointment_id)
+
+    def update_appointment(self, query, body, appointment_id):
+        self.service.update_appointment(appointment_id, **_fields(body, APPOINTMENT_CHANGES))
+        return 200, self.service.require_appointment(appointment_id)
+
+    def add_medical_record(self, query, body):
+        fields = _fields(body, MEDICAL_RECORD_FIELDS)
+        self.service.require_patient(fields['patient_id'])
+        self.service.require_doctor(fields['doctor_id'])
+        return 201, {'record_id': self.service.add_medical_record(**fields)}
+
+    def search_records(self, query, body):
+        pager = self.service.search_records(query.get('q'), query.get('since'), query.get('patient_id'),
+                                            _count(query, 'page_size', 20))
+        page = max(int(query.get('page', 1)), 1)
+        rows = pager.go_to(page)
+        return 200, {'rows': rows, 'page': page, 'has_next': pager.has_next}
+
+    def generate_bill(self, query, body):
+        fields = _fields(body, BILL_FIELDS)
+        self.service.require_patient(fields['patient_id'])
+        return 201, {'bill_id': self.service.generate_bill(**fields)}
+
+    def get_bill(self, query, body, bill_id):
+        bill = self.service.get_bill(bill_id)
+        if not bill:
+            raise NotFoundError("Bill not found.")
+        return 200, bill
+
+    def update_bill(self, query, body, bill_id):
+        fields = _fields(body, BILL_CHANGES)
+        self.service.update_bill_status(bill_id, fields['payment_status'], fields.get('version'))
+        return 200, self.service.get_bill(bill_id)
+
+    def revenue_report(self, query, body):
+        return 200, {'rows': self.service.revenue_report(query.get('by', 'month'))}
+
+    def outstanding(self, query, body):
+        return 200, self.service.outstanding_totals()
+
+
+class HospitalServer:
+    def __init__(self, service, host='127.0.0.1', port=8080, workers=8):
+        self.service = service
+        self.routes = Routes(service)
+        self.host = host
+        self.port = port
+        # Keep the executor no larger than the pool, otherwise extra workers
+        # just queue inside ConnectionPool.acquire().
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hms')
+
+    def dispatch(self, method, target, body, session=None):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        handler, args = self.routes.resolve(method, url.path.rstrip('/') or '/')
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            raise HTTPError(400, "Request body is not valid JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        with metrics.REGISTRY.timed('action', f"{method} {handler.__name__}"), self.service.session(session):
+            return handler(query, payload, *args)
+
+    async def respond(self, method, target, body, session=None):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self.dispatch, method, target, body, session)
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+        except (ValidationError, ValueError) as e:
+            return 400, {'error': str(e)}
+        except NotFoundError as e:
+            return 404, {'error': str(e)}
+        except ConflictError as e:
+            return 409, {'error': str(e), 'current': e.current}
+        except SlotConflict as e:
+            return 409, {'error': str(e)}
+        except PoolError as e:
+            return 503, {'error': str(e)}
+        except Error as e:
+            log.error("%s %s failed: %s", method, target, e)
+            return 500, {'error': str(e)}
+        except Exception:
+            # A bug rather than bad input: logged in full, not shown to the client.
+            log.exception("%s %s failed", method, target)
+            return 500, {'error': "Internal server error"}
+
+    async def handle(self, reader, writer):
+        # Reads see the session's own writes: the X-HMS-Session header names
+        # it, or else the connection is the session.
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.write(writer, 400, {'error': "Malformed request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.write(writer, 400, {'error': "Invalid Content-Length"}, False)
+                    break
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                if length > MAX_BODY:
+                    await self.write(writer, 413, {'error': "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                session = headers.get('x-hms-session') or f"connection:{peer}"
+                status, payload = await self.respond(method.upper(), target, body, session)
+                await self.write(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def write(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, default=_default).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"Hospital Management API listening on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the hospital management API over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=8,
+                        help="threads running blocking database calls; also the pool size")
+    parser.add_argument('--group-commit-ms', type=float, default=0,
+                        help="collect writes for up to this long and commit them together (0: off)")
+    parser.add_argument('--group-commit-size', type=int, default=100,
+                        help="commit a group as soon as it holds this many writes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    metrics.configure_from_env()
+    service = HospitalService(engine_from_env(), pool_size=args.workers,
+                              group_commit_ms=args.group_commit_ms, group_commit_size=args.group_commit_size,
+                              replicas=replicas_from_env())
+    service.setup_database()
+    try:
+        asyncio.run(HospitalServer(service, args.host, args.port, args.workers).serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,687 @@
+import datetime
+import math
+from contextlib import contextmanager
+
+import storage
+from storage import MySQLEngine
+from pool import ConnectionPool
+from pagination import KeysetPager, prefix_pattern
+from migrations import migrate
+from validation import GENDERS, is_valid_email, is_valid_phone, parse_date
+from scheduling import ScheduleIndex
+from cache import SummaryCache
+from transitions import TRANSITIONS, BulkTransition
+import revenue
+from search import RecordSearch, SearchPager, log_changes, tokenize
+from finder import MIN_PHONE_DIGITS, PatientFinder, parse_query
+from history import HistoryPager, moved_years, with_year_tables
+from writes import WriteQueue
+from replicas import MAX_LAG, ReplicaRouter, session
+
+APPOINTMENT_STATUSES = ('Scheduled', 'Completed', 'Cancelled')
+PAYMENT_STATUSES = ('Pending', 'Paid', 'Overdue')
+PATIENT_UPDATABLE = ('contact_number', 'email', 'address', 'blood_group')
+BILL_COLUMNS = "bill_id, patient_id, doctor_id, total_amount, payment_status, bill_date, version"
+APPOINTMENT_DETAILS = """
+    SELECT a.appointment_id, a.appointment_date, a.appointment_time, a.status, a.reason,
+           p.patient_id, CONCAT(p.first_name, ' ', p.last_name) as patient_name,
+           d.doctor_id, CONCAT(d.first_name, ' ', d.last_name) as doctor_name,
+           d.specialization
+    FROM appointments a
+    JOIN patients p ON a.patient_id = p.patient_id
+    JOIN doctors d ON a.doctor_id = d.doctor_id
+"""
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ValidationError(ServiceError):
+    pass
+
+
+class NotFoundError(ServiceError):
+    pass
+
+
+class ConflictError(ServiceError):
+    # The row changed after it was read; current is the row as it is now.
+    def __init__(self, message, current=None):
+        super().__init__(message)
+        self.current = current
+
+
+def _changed(kind, current):
+    return ConflictError(f"This {kind} was changed by someone else after you opened it.", current)
+
+
+Error = storage.Error + (ServiceError,)
+
+
+def _date(value, field):
+    try:
+        return parse_date(str(value)).isoformat()
+    except ValueError:
+        raise ValidationError(f"Invalid {field}. Use YYYY-MM-DD")
+
+
+def _time(value, field):
+    try:
+        return datetime.datetime.strptime(str(value), '%H:%M').strftime('%H:%M')
+    except ValueError:
+        raise ValidationError(f"Invalid {field}. Use HH:MM (24-hour format)")
+
+
+def _id(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Invalid {field}")
+
+
+def _amount(value, field):
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Invalid {field}")
+    if not math.isfinite(amount) or amount < 0:
+        raise ValidationError(f"Invalid {field}. Enter a number of 0 or more")
+    return amount
+
+
+def _choice(value, options, field):
+    if value not in options:
+        raise ValidationError(f"Invalid {field}. Choose one of: {', '.join(options)}")
+    return value
+
+
+def _contact(contact_number, email):
+    if not is_valid_phone(contact_number or ''):
+        raise ValidationError("Invalid phone number.")
+    if not is_valid_email(email or ''):
+        raise ValidationError("Invalid email address.")
+
+
+class ReplicaReads:
+    # Reporting paths take this in place of the service: their queries go to
+    # a replica when one is fresh enough, everything else to the service.
+    def __init__(self, service):
+        self.service = service
+
+    def fetch_one(self, query, params=()):
+        return self.service.fetch_one(query, params, replica=True)
+
+    def fetch_all(self, query, params=()):
+        return self.service.fetch_all(query, params, replica=True)
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+
+class HospitalService:
+    def __init__(self, engine=None, pool_size=5, cache_size=1024, cache_ttl=300.0, search_index=None,
+                 finder_index=None, group_commit_ms=0, group_commit_size=100, replicas=(),
+                 max_replica_lag=MAX_LAG):
+        self.engine = engine or MySQLEngine(
+            host='localhost',
+            user='root',
+            password='Your Password',
+            database='Your database name'
+        )
+        self.pool = ConnectionPool(self.engine, size=pool_size)
+        self.replicas = ReplicaRouter(self.pool, replicas, pool_size, max_replica_lag)
+        # The same service, but fetching from a replica when one is fresh enough.
+        self.reads = ReplicaReads(self)
+        self.schedule = ScheduleIndex(self)
+        self.patients = SummaryCache(cache_size, cache_ttl)
+        self.doctors = SummaryCache(cache_size, cache_ttl)
+        if search_index is None and getattr(self.engine, 'path', ':memory:') != ':memory:':
+            search_index = f"{self.engine.path}.search"
+        self.search = RecordSearch(self, search_index)
+        if finder_index is None and getattr(self.engine, 'path', ':memory:') != ':memory:':
+            finder_index = f"{self.engine.path}.patients"
+        self.finder = PatientFinder(self, finder_index)
+        # Off by default: every write then commits on its own.
+        self.writes = WriteQueue(self.engine, group_commit_ms / 1000, group_commit_size) if group_commit_ms > 0 else None
+
+    def setup_database(self):
+        with self.unit_of_work() as (connection, cursor):
+            migrate(self.engine, connection, cursor)
+        self.replicas.start()
+
+    def close(self):
+        self.replicas.close()
+        if self.writes is not None:
+            self.writes.close()
+        self.search.save()
+        self.finder.save()
+        self.pool.close()
+
+    def cache_stats(self):
+        return {'patients': self.patients.stats(), 'doctors': self.doctors.stats()}
+
+    def write_stats(self):
+        return self.writes.stats() if self.writes is not None else None
+
+    @contextmanager
+    def unit_of_work(self):
+        with self.pool.connection() as connection:
+            cursor = self.engine.cursor(connection)
+            try:
+                yield connection, cursor
+            finally:
+                cursor.close()
+
+    def fetch_one(self, query, params=(), replica=False):
+        return self._fetch(query, params, replica, lambda cursor: cursor.fetchone())
+
+    def fetch_all(self, query, params=(), replica=False):
+        return self._fetch(query, params, replica, lambda cursor: cursor.fetchall())
+
+    def _fetch(self, query, params, replica, fetch):
+        chosen = self.replicas.choose() if replica else None
+        if chosen is not None:
+            try:
+                with chosen.pool.connection() as connection:
+                    cursor = chosen.engine.cursor(connection)
+                    try:
+                        cursor.execute(query, params)
+                        return fetch(cursor)
+                    finally:
+                        cursor.close()
+            except storage.Error as e:
+                # Read it again from the primary.
+                self.replicas.failed(chosen, e)
+        with self.unit_of_work() as (connection, cursor):
+            cursor.execute(query, params)
+            return fetch(cursor)
+
+    def session(self, token):
+        # Calls made inside `with service.session(token):` read their own
+        # writes: replicas that have not applied them are skipped.
+        return session(token)
+
+    def write(self, work):
+        # Runs work(cursor) and commits it, through the group-commit queue when
+        # one is configured; returns whatever work returned.
+        try:
+            if self.writes is not None:
+                return self.writes.submit(work)
+            with self.unit_of_work() as (connection, cursor):
+                cursor.execute(self.engine.begin_write)
+                result = work(cursor)
+                connection.commit()
+                return result
+        finally:
+            # After the commit, or a failure that may still have committed.
+            self.replicas.wrote()
+
+    def execute_write(self, query, params=()):
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.lastrowid
+        return self.write(work)
+
+    def execute_update(self, query, params=()):
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.rowcount
+        return self.write(work)
+
+    # Patients
+
+    def register_patient(self, first_name, last_name, date_of_birth, gender,
+                         contact_number, email, address='', blood_group=''):
+        if not first_name or not last_name:
+            raise ValidationError("First and last name are required.")
+        date_of_birth = _date(date_of_birth, "date of birth")
+        gender = _choice(str(gender).capitalize(), GENDERS, "gender")
+        _contact(contact_number, email)
+        patient_id = self.execute_write(
+            """
+            INSERT INTO patients
+            (first_name, last_name, date_of_birth, gender,
+            contact_number, email, address, blood_group)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (first_name, last_name, date_of_birth, gender,
+             contact_number, email, address, blood_group)
+        )
+        self.patients.put(patient_id, {'patient_id': patient_id, 'first_name': first_name, 'last_name': last_name})
+        self.finder.patient_added()
+        return patient_id
+
+    def get_patient(self, patient_id):
+        patient_id = _id(patient_id, "patient ID")
+        return self.patients.get_or_load(patient_id, lambda: self.fetch_one(
+            "SELECT patient_id, first_name, last_name FROM patients WHERE patient_id = %s",
+            (patient_id,)
+        ))
+
+    def get_patient_details(self, patient_id):
+        return self.fetch_one("SELECT * FROM patients WHERE patient_id = %s", (_id(patient_id, "patient ID"),))
+
+    def require_patient(self, patient_id):
+        patient = self.get_patient(patient_id)
+        if not patient:
+            raise NotFoundError(f"Patient ID {patient_id} does not exist.")
+        return patient
+
+    def update_patient(self, patient_id, version=None, **changes):
+        # With version, the update only applies if nobody has changed the
+        # patient since that version was read.
+        patient_id = _id(patient_id, "patient ID")
+        unknown = set(changes) - set(PATIENT_UPDATABLE)
+        if unknown or not changes:
+            raise ValidationError(f"Updatable fields are: {', '.join(PATIENT_UPDATABLE)}")
+        if 'contact_number' in changes and not is_valid_phone(changes['contact_number'] or ''):
+            raise ValidationError("Invalid phone number.")
+        if 'email' in changes and not is_valid_email(changes['email'] or ''):
+            raise ValidationError("Invalid email address.")
+
+        columns = [column for column in PATIENT_UPDATABLE if column in changes]
+        assignments = ", ".join(f"{column} = %s" for column in columns)
+        params = tuple(changes[column] for column in columns) + (patient_id,)
+        condition = ""
+        if version is not None:
+            condition = " AND version = %s"
+            params += (_id(version, "version"),)
+        def work(cursor):
+            cursor.execute(
+                f"UPDATE patients SET {assignments}, version = version + 1 WHERE patient_id = %s{condition}",
+                params
+            )
+            if cursor.rowcount:
+                # Every process's patient finder re-reads the patient.
+                log_changes(cursor, 'patients', 'patient_id', 'patient_id = %s', (patient_id,))
+            return cursor.rowcount
+
+        updated = self.write(work)
+        self.patients.invalidate(patient_id)
+        if not updated:
+            self.require_patient(patient_id)
+            if version is not None:
+                raise _changed("patient", self.get_patient_details(patient_id))
+        self.finder.patient_updated()
+
+    def find_patients(self, query, limit=20):
+        criteria = parse_query(query)
+        if not any(criteria.values()):
+            raise ValidationError("Enter part of a name, a phone number, an email or a date of birth (YYYY-MM-DD).")
+        if any(len(phone) < MIN_PHONE_DIGITS for phone in criteria['phones']):
+            raise ValidationError(f"Enter at least the last {MIN_PHONE_DIGITS} digits of a phone number.")
+        return self.finder.find(criteria, limit)
+
+    def patient_pager(self, name_prefix=None, registered_from=None, page_size=20):
+        conditions, params = self._name_filter(name_prefix)
+        if registered_from:
+            conditions.append("registration_date >= %s")
+            params.append(_date(registered_from, "registration date"))
+        return KeysetPager(
+            self.reads,
+            """SELECT patient_id, first_name, last_name, date_of_birth, gender,
+                      contact_number, email, blood_group
+               FROM patients""",
+            [("patient_id", "patient_id")],
+            conditions, params, page_size
+        )
+
+    def _name_filter(self, prefix):
+        conditions, params = [], []
+        if prefix:
+            conditions.append("(first_name LIKE %s ESCAPE '!' OR last_name LIKE %s ESCAPE '!')")
+            params.extend([prefix_pattern(prefix)] * 2)
+        return conditions, params
+
+    # Doctors
+
+    def register_doctor(self, first_name, last_name, specialization, contact_number,
+                        email, department, joining_date, consultation_fee):
+        if not first_name or not last_name:
+            raise ValidationError("First and last name are required.")
+        _contact(contact_number, email)
+        joining_date = _date(joining_date, "joining date")
+        consultation_fee = _amount(consultation_fee, "fee amount")
+        doctor_id = self.execute_write(
+            """
+            INSERT INTO doctors
+            (first_name, last_name, specialization, contact_number,
+            email, department, joining_date, consultation_fee)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (first_name, last_name, specialization,
+             contact_number, email, department, joining_date, consultation_fee)
+        )
+        self.doctors.put(doctor_id, {'doctor_id': doctor_id, 'first_name': first_name,
+                                     'last_name': last_name, 'specialization': specialization})
+        self.schedule.invalidate_groups()
+        return doctor_id
+
+    def get_doctor(self, doctor_id):
+        doctor_id = _id(doctor_id, "doctor ID")
+        return self.doctors.get_or_load(doctor_id, lambda: self.fetch_one(
+            "SELECT doctor_id, first_name, last_name, specialization FROM doctors WHERE doctor_id = %s",
+            (doctor_id,)
+        ))
+
+    def require_doctor(self, doctor_id):
+        doctor = self.get_doctor(doctor_id)
+        if not doctor:
+            raise NotFoundError(f"Doctor ID {doctor_id} does not exist.")
+        return doctor
+
+    def doctor_pager(self, name_prefix=None, joined_from=None, page_size=20):
+        conditions, params = self._name_filter(name_prefix)
+        if joined_from:
+            conditions.append("joining_date >= %s")
+            params.append(_date(joined_from, "joining date"))
+        return KeysetPager(
+            self.reads,
+            """SELECT doctor_id, first_name, last_name, specialization, department,
+                      contact_number, email, consultation_fee
+               FROM doctors""",
+            [("doctor_id", "doctor_id")],
+            conditions, params, page_size
+        )
+
+    # Appointments
+
+    def book_appointment(self, patient_id, doctor_id, appointment_date, appointment_time, reason=''):
+        patient_id = _id(patient_id, "patient ID")
+        doctor_id = _id(doctor_id, "doctor ID")
+        appointment_date = _date(appointment_date, "appointment date")
+        appointment_time = _time(appointment_time, "appointment time")
+        if appointment_date < datetime.date.today().isoformat():
+            raise ValidationError("Appointment date cannot be in the past.")
+
+        def work(cursor):
+            self.schedule.claim(cursor, doctor_id, appointment_date, appointment_time)
+            cursor.execute(
+                """
+                INSERT INTO appointments
+                (patient_id, doctor_id, appointment_date, appointment_time, reason)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                (patient_id, doctor_id, appointment_date, appointment_time, reason)
+            )
+            return cursor.lastrowid
+
+        return self.schedule.reserve(doctor_id, appointment_date, appointment_time, lambda: self.write(work))
+
+    def get_appointment(self, appointment_id):
+        return self.fetch_one("""
+            SELECT a.*,
+                   CONCAT(p.first_name, ' ', p.last_name) as patient_name,
+                   CONCAT(d.first_name, ' ', d.last_name) as doctor_name
+            FROM appointments a
+            JOIN patients p ON a.patient_id = p.patient_id
+            JOIN doctors d ON a.doctor_id = d.doctor_id
+            WHERE a.appointment_id = %s
+        """, (_id(appointment_id, "appointment ID"),))
+
+    def require_appointment(self, appointment_id):
+        appointment = self.get_appointment(appointment_id)
+        if not appointment:
+            raise NotFoundError("Appointment not found.")
+        return appointment
+
+    def _appointment_for_update(self, appointment_id, version):
+        appointment = self.require_appointment(appointment_id)
+        if version is not None and appointment['version'] != _id(version, "version"):
+            raise _changed("appointment", appointment)
+        return appointment
+
+    def _update_appointment(self, appointment, assignments, params, slot=None):
+        # Only applies to the version the slot bookkeeping was based on. With
+        # slot, a (date, time) the appointment is taking, the slot is checked
+        # against the database in the same transaction.
+        def work(cursor):
+            if slot is not None:
+                self.schedule.claim(cursor, appointment['doctor_id'], *slot,
+                                    exclude=appointment['appointment_id'])
+            cursor.execute(
+                f"UPDATE appointments SET {assignments}, version = version + 1 WHERE appointment_id = %s AND version = %s",
+                tuple(params) + (appointment['appointment_id'], appointment['version'])
+            )
+            return cursor.rowcount
+
+        updated = self.write(work)
+        if not updated:
+            raise _changed("appointment", self.require_appointment(appointment['appointment_id']))
+        return updated
+
+    def update_appointment(self, appointment_id, appointment_date=None, appointment_time=None, status=None,
+                           version=None):
+        # Reschedules, changes the status, or both, in one UPDATE. Moving needs
+        # both a date and a time.
+        moving = appointment_date is not None or appointment_time is not None
+        assignments, params = [], []
+        if moving:
+            new_date = _date(appointment_date, "date")
+            new_time = _time(appointment_time, "time")
+            assignments.append("appointment_date = %s, appointment_time = %s")
+            params.extend((new_date, new_time))
+        if status is not None:
+            status = _choice(status, APPOINTMENT_STATUSES, "status")
+            assignments.append("status = %s")
+            params.append(status)
+        if not assignments:
+            raise ValidationError("Give a new date and time, a status, or both.")
+
+        appointment = self._appointment_for_update(appointment_id, version)
+        doctor_id = appointment['doctor_id']
+        old_date, old_time = appointment['appointment_date'], appointment['appointment_time']
+        held = appointment['status'] != 'Cancelled'
+        holds = (status or appointment['status']) != 'Cancelled'
+        slot = (new_date, new_time) if moving else (old_date, old_time)
+
+        def write(checked=slot):
+            return self._update_appointment(appointment, ", ".join(assignments), params, checked)
+
+        if not holds or (held and not moving):
+            # No slot to take: a cancelled appointment holds none, and an
+            # unmoved one keeps its own.
+            write(None)
+            if held and not holds:
+                self.schedule.remove(doctor_id, old_date, old_time)
+            return
+        self.schedule.reserve(doctor_id, *slot, write, release=(old_date, old_time) if held else None)
+
+    def set_appointment_status(self, appointment_id, status, version=None):
+        self.update_appointment(appointment_id, status=_choice(status, APPOINTMENT_STATUSES, "status"),
+                                version=version)
+
+    def cancel_appointment(self, appointment_id, version=None):
+        self.set_appointment_status(appointment_id, 'Cancelled', version)
+
+    def reschedule_appointment(self, appointment_id, new_date, new_time, version=None):
+        self.update_appointment(appointment_id, _date(new_date, "date"), _time(new_time, "time"), version=version)
+
+    def appointment_pager(self, date_from=None, date_to=None, doctor_id=None,
+                          patient_id=None, status=None, page_size=20):
+        conditions, params = [], []
+        if doctor_id is not None:
+            conditions.append("a.doctor_id = %s")
+            params.append(_id(doctor_id, "doctor ID"))
+        if patient_id is not None:
+            conditions.append("a.patient_id = %s")
+            params.append(_id(patient_id, "patient ID"))
+        if status:
+            conditions.append("a.status = %s")
+            params.append(_choice(status, APPOINTMENT_STATUSES, "status"))
+        if date_from:
+            conditions.append("a.appointment_date >= %s")
+            params.append(_date(date_from, "from date"))
+        if date_to:
+            conditions.append("a.appointment_date <= %s")
+            params.append(_date(date_to, "to date"))
+        return KeysetPager(
+            self.reads,
+            APPOINTMENT_DETAILS,
+            [("a.appointment_date", "appointment_date"),
+             ("a.appointment_time", "appointment_time"),
+             ("a.appointment_id", "appointment_id")],
+            conditions, params, page_size
+        )
+
+    def slot_conflict(self, doctor_id, appointment_date, appointment_time):
+        return self.schedule.conflict(
+            _id(doctor_id, "doctor ID"),
+            _date(appointment_date, "appointment date"),
+            _time(appointment_time, "appointment time")
+        )
+
+    def free_slots(self, doctor_id, after=None, count=5):
+        return self.schedule.next_free_slots(_id(doctor_id, "doctor ID"), after, count)
+
+    def free_slots_for_specialization(self, specialization, after=None, count=5):
+        return self.schedule.next_free_for_specialization(specialization, after, count)
+
+    def free_slots_for_department(self, department, after=None, count=5):
+        return self.schedule.next_free_in('department', department, after, count)
+
+    def availability(self, day, specialization=None, department=None, start=None, end=None):
+        if bool(specialization) == bool(department):
+            raise ValidationError("Give either a specialization or a department.")
+        day = _date(day, "date")
+        start = _time(start, "from time") if start else None
+        end = _time(end, "to time") if end else None
+        now = datetime.datetime.now()
+        if day < now.date().isoformat():
+            raise ValidationError("Date cannot be in the past.")
+        if day == now.date().isoformat():
+            start = max(start or '00:00', now.strftime('%H:%M'))
+        if specialization:
+            return self.schedule.availability('specialization', specialization, day, start, end)
+        return self.schedule.availability('department', department, day, start, end)
+
+    # Medical records
+
+    def add_medical_record(self, patient_id, doctor_id, diagnosis, prescription, treatment_plan):
+        record_id = self.execute_write(
+            """
+            INSERT INTO medical_records
+            (patient_id, doctor_id, diagnosis, prescription, treatment_plan)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            (_id(patient_id, "patient ID"), _id(doctor_id, "doctor ID"),
+             diagnosis, prescription, treatment_plan)
+        )
+        self.search.record_added()
+        return record_id
+
+    def search_records(self, query, since=None, patient_id=None, page_size=20):
+        if not tokenize(query or ''):
+            raise ValidationError("Enter at least one search word.")
+        if since:
+            since = datetime.date.fromisoformat(_date(since, "since date"))
+        if patient_id is not None:
+            patient_id = _id(patient_id, "patient ID")
+        return SearchPager(self.search, query, since, patient_id, page_size)
+
+    def medical_record_pager(self, patient_id):
+        return HistoryPager(self.reads, 'medical_records', _id(patient_id, "patient ID"))
+
+    # Billing
+
+    def generate_bill(self, patient_id, total_amount, payment_status='Pending', doctor_id=None):
+        params = (_id(patient_id, "patient ID"), _amount(total_amount, "amount"),
+                  _choice(payment_status, PAYMENT_STATUSES, "payment status"),
+                  None if doctor_id is None else _id(doctor_id, "doctor ID"))
+
+        def work(cursor):
+            # Checked here rather than left to a foreign key: billing has none
+            # once it is partitioned on MySQL.
+            cursor.execute(f"SELECT 1 AS found FROM patients WHERE patient_id = %s{self.engine.row_lock}", params[:1])
+            if not cursor.fetchone():
+                raise NotFoundError(f"Patient ID {params[0]} does not exist.")
+            cursor.execute(
+                """
+                INSERT INTO billing
+                (patient_id, total_amount, payment_status, doctor_id)
+                VALUES (%s, %s, %s, %s)
+                """,
+                params
+            )
+            bill_id = cursor.lastrowid
+            revenue.add_bills(self.engine, cursor, "b.bill_id = %s", (bill_id,))
+            return bill_id
+        return self.write(work)
+
+    def get_bill(self, bill_id):
+        query = """
+            SELECT b.*, CONCAT(p.first_name, ' ', p.last_name) as patient_name
+            FROM {billing} b
+            JOIN patients p ON b.patient_id = p.patient_id
+            WHERE b.bill_id = %s
+        """
+        params = (_id(bill_id, "bill ID"),)
+        bill = self.fetch_one(query.format(billing='billing'), params)
+        if bill is None:
+            # Only a miss pays for looking through years moved to year tables.
+            years = moved_years(self, 'billing')
+            if years:
+                bill = self.fetch_one(query.format(billing=with_year_tables('billing', years, BILL_COLUMNS)), params)
+        return bill
+
+    def billing_pager(self, patient_id):
+        return HistoryPager(self.reads, 'billing', _id(patient_id, "patient ID"))
+
+    def update_bill_status(self, bill_id, payment_status, version=None):
+        payment_status = _choice(payment_status, PAYMENT_STATUSES, "payment status")
+        bill_id = _id(bill_id, "bill ID")
+        if version is not None:
+            version = _id(version, "version")
+
+        def work(cursor):
+            cursor.execute(f"SELECT version FROM billing WHERE bill_id = %s{self.engine.row_lock}", (bill_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise NotFoundError("Bill not found.")
+            if version is not None and row['version'] != version:
+                raise ConflictError("Bill changed.")
+            if not revenue.move_bills(self.engine, cursor, "b.bill_id = %s", (bill_id,), payment_status):
+                return
+            cursor.execute(
+                "UPDATE billing SET payment_status = %s, version = version + 1 WHERE bill_id = %s",
+                (payment_status, bill_id)
+            )
+
+        try:
+            self.write(work)
+        except ConflictError:
+            raise _changed("bill", self.get_bill(bill_id)) from None
+        except NotFoundError:
+            # A bill in a year moved to a year table is still found, but is
+            # read-only: its year was closed when it moved.
+            if self.get_bill(bill_id):
+                raise ValidationError(f"Bill {bill_id} is from a closed year and can no longer be changed.") from None
+            raise
+
+    def revenue_report(self, by='month'):
+        return revenue.report(self.reads, _choice(by, tuple(revenue.SUMMARIES), "report"))
+
+    def outstanding_totals(self):
+        return revenue.outstanding(self.reads)
+
+    def rebuild_revenue_summaries(self):
+        with self.unit_of_work() as (connection, cursor):
+            revenue.rebuild(self.engine, cursor)
+            connection.commit()
+
+    # End-of-day sweeps
+
+    def bulk_transition(self, name, cutoff=None, dry_run=False, chunk_size=1000, progress=None):
+        name = _choice(name, tuple(TRANSITIONS), "transition")
+        if cutoff:
+            cutoff = datetime.date.fromisoformat(_date(cutoff, "cutoff date"))
+        transition = BulkTransition(self, name, cutoff, chunk_size, progress)
+        try:
+            return transition.run(dry_run)
+        finally:
+            if transition.updated:
+                self.replicas.wrote()
+            if transition.updated and transition.to_status == 'Cancelled':
+                # Cancelled appointments no longer hold their slots.
+                self.schedule.invalidate()
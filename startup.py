@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Startup:
+    # Runs the slow part of starting the menu (importing the service stack and
+    # the MySQL driver, connecting, checking the schema) on a background thread
+    # while the menu is drawn, and records how long each part took. Offsets are
+    # measured from started, durations from when the part began.
+    def __init__(self, started):
+        self.started = started
+        self.durations = {}
+        self.offsets = {}
+        self.waited = None
+        self.error = None
+        self._thread = None
+
+    def mark(self, name):
+        # Only the first time: a menu drawn again later is not start-up.
+        self.offsets.setdefault(name, time.perf_counter() - self.started)
+
+    @contextmanager
+    def phase(self, name):
+        begun = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = time.perf_counter() - begun
+
+    def start(self, work):
+        def run():
+            try:
+                work()
+            except BaseException as e:
+                self.error = e
+            self.mark('ready')
+
+        self._thread = threading.Thread(target=run, name="startup", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        # Started in the background and nobody has waited for it yet.
+        return self._thread is not None and self.waited is None
+
+    def wait(self):
+        begun = time.perf_counter()
+        self._thread.join()
+        self.waited = time.perf_counter() - begun
+        return self.error
+
+    def report(self):
+        report = {f"{name}_ms": round(seconds * 1000, 1) for name, seconds in self.durations.items()}
+        report.update((f"{name}_at_ms", round(seconds * 1000, 1)) for name, seconds in self.offsets.items())
+        if self.waited is not None:
+            report['first_action_wait_ms'] = round(self.waited * 1000, 1)
+        return report
+
+
+def report_from_env(startup, environ=None):
+    # HMS_STARTUP_TIMING=1 prints the breakdown to stderr as one JSON line.
+    environ = os.environ if environ is None else environ
+    if environ.get('HMS_STARTUP_TIMING', '').lower() in ('1', 'true', 'yes', 'on'):
+        print(json.dumps({'startup': startup.report()}), file=sys.stderr)
@@ -0,0 +1,399 @@
+import os
+import sqlite3
+import itertools
+
+try:
+    import mysql.connector
+    from mysql.connector import Error as MySQLError
+except ImportError:
+    mysql = None
+    MySQLError = None
+
+from metrics import instrument
+
+
+
+class StorageError(Exception):
+    pass
+
+
+Error = (StorageError, sqlite3.Error) + ((MySQLError,) if MySQLError else ())
+
+
+MYSQL_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS patients (
+        patient_id INT AUTO_INCREMENT PRIMARY KEY,
+        first_name VARCHAR(50) NOT NULL,
+        last_name VARCHAR(50) NOT NULL,
+        date_of_birth DATE NOT NULL,
+        gender ENUM('Male', 'Female', 'Other') NOT NULL,
+        contact_number VARCHAR(15) NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        address TEXT,
+        blood_group VARCHAR(5),
+        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS doctors (
+        doctor_id INT AUTO_INCREMENT PRIMARY KEY,
+        first_name VARCHAR(50) NOT NULL,
+        last_name VARCHAR(50) NOT NULL,
+        specialization VARCHAR(100) NOT NULL,
+        contact_number VARCHAR(15) NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        department VARCHAR(100) NOT NULL,
+        joining_date DATE NOT NULL,
+        consultation_fee DECIMAL(10,2) NOT NULL
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS appointments (
+        appointment_id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT NOT NULL,
+        doctor_id INT NOT NULL,
+        appointment_date DATE NOT NULL,
+        appointment_time TIME NOT NULL,
+        status ENUM('Scheduled', 'Completed', 'Cancelled') DEFAULT 'Scheduled',
+        reason VARCHAR(255),
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id),
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id)
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS medical_records (
+        record_id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT NOT NULL,
+        doctor_id INT NOT NULL,
+        diagnosis TEXT,
+        prescription TEXT,
+        treatment_plan TEXT,
+        visit_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id),
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id)
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS billing (
+        bill_id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT NOT NULL,
+        total_amount DECIMAL(10,2) NOT NULL,
+        payment_status ENUM('Pending', 'Paid', 'Overdue') DEFAULT 'Pending',
+        bill_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id)
+    )"""
+]
+
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS patients (
+        patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        first_name VARCHAR(50) NOT NULL,
+        last_name VARCHAR(50) NOT NULL,
+        date_of_birth DATE NOT NULL,
+        gender TEXT NOT NULL CHECK (gender IN ('Male', 'Female', 'Other')),
+        contact_number VARCHAR(15) NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        address TEXT,
+        blood_group VARCHAR(5),
+        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS doctors (
+        doctor_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        first_name VARCHAR(50) NOT NULL,
+        last_name VARCHAR(50) NOT NULL,
+        specialization VARCHAR(100) NOT NULL,
+        contact_number VARCHAR(15) NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        department VARCHAR(100) NOT NULL,
+        joining_date DATE NOT NULL,
+        consultation_fee REAL NOT NULL
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS appointments (
+        appointment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER NOT NULL REFERENCES patients(patient_id),
+        doctor_id INTEGER NOT NULL REFERENCES doctors(doctor_id),
+        appointment_date DATE NOT NULL,
+        appointment_time TIME NOT NULL,
+        status TEXT DEFAULT 'Scheduled' CHECK (status IN ('Scheduled', 'Completed', 'Cancelled')),
+        reason VARCHAR(255)
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS medical_records (
+        record_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER NOT NULL REFERENCES patients(patient_id),
+        doctor_id INTEGER NOT NULL REFERENCES doctors(doctor_id),
+        diagnosis TEXT,
+        prescription TEXT,
+        treatment_plan TEXT,
+        visit_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+
+    """CREATE TABLE IF NOT EXISTS billing (
+        bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER NOT NULL REFERENCES patients(patient_id),
+        total_amount REAL NOT NULL,
+        payment_status TEXT DEFAULT 'Pending' CHECK (payment_status IN ('Pending', 'Paid', 'Overdue')),
+        bill_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )"""
+]
+
+class MySQLEngine:
+    name = 'mysql'
+    row_lock = " FOR UPDATE"
+    begin_write = "START TRANSACTION"
+    serial_key = "INT AUTO_INCREMENT PRIMARY KEY"
+
+    def __init__(self, host='localhost', user='root', password='', database=None, port=3306):
+        self.options = dict(host=host, user=user, password=password, database=database, port=port)
+
+    def connect(self):
+        if mysql is None:
+            raise ImportError("mysql-connector-python is required for the MySQL engine")
+        return mysql.connector.connect(**self.options)
+
+    def cursor(self, connection):
+        return instrument(connection.cursor(dictionary=True, buffered=True))
+
+    def stream_cursor(self, connection):
+        # Unbuffered: rows stay on the server until fetched, so a full table
+        # scan never has to fit in client memory.
+        return instrument(connection.cursor(buffered=False))
+
+    def ping(self, connection):
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def schema(self):
+        return MYSQL_SCHEMA
+
+    def create_index(self, cursor, name, table, columns, online=False):
+        cursor.execute(
+            """SELECT 1 FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+               LIMIT 1""",
+            (table, name)
+        )
+        if cursor.fetchone():
+            return False
+        if online:
+            # InnoDB builds the index in place while reads and writes continue.
+            cursor.execute(
+                f"ALTER TABLE {table} ADD INDEX {name} ({', '.join(columns)}), "
+                "ALGORITHM=INPLACE, LOCK=NONE"
+            )
+        else:
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+        return True
+
+    def add_column(self, cursor, table, column, definition):
+        cursor.execute(
+            """SELECT 1 FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+            (table, column)
+        )
+        if cursor.fetchone():
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}, ALGORITHM=INPLACE, LOCK=NONE")
+        return True
+
+    def create_fulltext_index(self, cursor, name, table, columns):
+        cursor.execute(
+            """SELECT 1 FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+               LIMIT 1""",
+            (table, name)
+        )
+        if cursor.fetchone():
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({', '.join(columns)})")
+        return True
+
+    def partitions(self, cursor, table):
+        cursor.execute(
+            """SELECT partition_name FROM information_schema.partitions
+               WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL""",
+            (table,)
+        )
+        return {row['partition_name'] for row in cursor.fetchall()}
+
+    def _year_partitions(self, years):
+        return [f"PARTITION p{year} VALUES LESS THAN (UNIX_TIMESTAMP('{year + 1}-01-01'))" for year in years]
+
+    def partition_by_year(self, cursor, table, key, column, first_year, last_year):
+        if self.partitions(cursor, table):
+            return False
+        # A partitioned InnoDB table can have no foreign keys, and its primary
+        # key must include the partitioning column.
+        cursor.execute(
+            """SELECT constraint_name FROM information_schema.referential_constraints
+               WHERE constraint_schema = DATABASE() AND table_name = %s""",
+            (table,)
+        )
+        for row in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {row['constraint_name']}")
+        cursor.execute(f"ALTER TABLE {table} MODIFY {column} TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                       f"DROP PRIMARY KEY, ADD PRIMARY KEY ({key}, {column})")
+        partitions = ([f"PARTITION pold VALUES LESS THAN (UNIX_TIMESTAMP('{first_year}-01-01'))"]
+                      + self._year_partitions(range(first_year, last_year + 1))
+                      + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        cursor.execute(f"ALTER TABLE {table} PARTITION BY RANGE (UNIX_TIMESTAMP({column})) ({', '.join(partitions)})")
+        return True
+
+    def add_year_partitions(self, cursor, table, last_year):
+        existing = self.partitions(cursor, table)
+        years = [int(name[1:]) for name in existing if name[1:].isdigit()]
+        if not years or max(years) >= last_year:
+            return False
+        # Splitting the empty catch-all partition is a metadata-only change.
+        partitions = self._year_partitions(range(max(years) + 1, last_year + 1))
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO "
+                       f"({', '.join(partitions + ['PARTITION pmax VALUES LESS THAN MAXVALUE'])})")
+        return True
+
+    def truncate_year(self, cursor, table, year):
+        if f"p{year}" not in self.partitions(cursor, table):
+            return False
+        cursor.execute(f"ALTER TABLE {table} TRUNCATE PARTITION p{year}")
+        return True
+
+    def accumulate(self, cursor, table, keys, counters):
+        columns = list(keys) + list(counters)
+        updates = ", ".join(f"{column} = {column} + VALUES({column})" for column in counters)
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}",
+            list(keys.values()) + list(counters.values())
+        )
+
+
+class _SQLiteCursor(sqlite3.Cursor):
+    # The application writes MySQL-style %s placeholders; SQLite wants ?.
+    def execute(self, query, params=()):
+        return super().execute(query.replace('%s', '?'), params)
+
+    def executemany(self, query, seq_of_params):
+        return super().executemany(query.replace('%s', '?'), seq_of_params)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _concat(*parts):
+    return ''.join('' if part is None else str(part) for part in parts)
+
+
+class SQLiteEngine:
+    name = 'sqlite'
+    # SQLite serialises writers on the whole database instead, taken up
+    # front so a check read at the start of a write still holds at commit.
+    row_lock = ""
+    begin_write = "BEGIN IMMEDIATE"
+    serial_key = "INTEGER PRIMARY KEY AUTOINCREMENT"
+    _memory_ids = itertools.count(1)
+
+    def __init__(self, path=':memory:', timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        if path == ':memory:':
+            # A named shared-cache database lets several connections see the
+            # same in-memory data; the anchor keeps it alive between them.
+            self.uri = f"file:hms_memory_{next(self._memory_ids)}?mode=memory&cache=shared"
+            self._anchor = self._open()
+        else:
+            self.uri = None
+            self._anchor = None
+
+    def _open(self):
+        if self.uri:
+            connection = sqlite3.connect(self.uri, uri=True, timeout=self.timeout, check_same_thread=False)
+        else:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        connection.row_factory = _dict_row
+        connection.create_function("CONCAT", -1, _concat, deterministic=True)
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    def connect(self):
+        connection = self._open()
+        if not self.uri:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def cursor(self, connection):
+        return instrument(connection.cursor(factory=_SQLiteCursor))
+
+    def stream_cursor(self, connection):
+        # SQLite steps through the result as rows are fetched; plain tuples
+        # skip building a dict per row.
+        cursor = connection.cursor(factory=_SQLiteCursor)
+        cursor.row_factory = None
+        return instrument(cursor)
+
+    def ping(self, connection):
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except Error:
+            return False
+
+    def schema(self):
+        return SQLITE_SCHEMA
+
+    def create_index(self, cursor, name, table, columns, online=False):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = %s", (name,))
+        if cursor.fetchone():
+            return False
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+        return True
+
+    def add_column(self, cursor, table, column, definition):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if any(row['name'] == column for row in cursor.fetchall()):
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+
+    def accumulate(self, cursor, table, keys, counters):
+        columns = list(keys) + list(counters)
+        updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in counters)
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}",
+            list(keys.values()) + list(counters.values())
+        )
+
+
+def replicas_from_env(environ=None):
+    # HMS_REPLICAS lists read replicas, comma separated: SQLite file paths, or
+    # MySQL host[:port] entries that share the primary's user and database.
+    environ = os.environ if environ is None else environ
+    entries = [entry.strip() for entry in environ.get('HMS_REPLICAS', '').split(',') if entry.strip()]
+    if environ.get('HMS_ENGINE', 'mysql').lower() == 'sqlite':
+        return [SQLiteEngine(path) for path in entries]
+    replicas = []
+    for entry in entries:
+        host, _, port = entry.partition(':')
+        replicas.append(MySQLEngine(
+            host=host,
+            user=environ.get('HMS_MYSQL_USER', 'root'),
+            password=environ.get('HMS_MYSQL_PASSWORD', 'Your Password'),
+            database=environ.get('HMS_MYSQL_DATABASE', 'Your database name'),
+            port=int(port or 3306)
+        ))
+    return replicas
+
+
+def engine_from_env(environ=None):
+    environ = os.environ if environ is None else environ
+    if environ.get('HMS_ENGINE', 'mysql').lower() == 'sqlite':
+        return SQLiteEngine(environ.get('HMS_SQLITE_PATH', ':memory:'))
+    return MySQLEngine(
+        host=environ.get('HMS_MYSQL_HOST', 'localhost'),
+        user=environ.get('HMS_MYSQL_USER', 'root'),
+        password=environ.get('HMS_MYSQL_PASSWORD', 'Your Password'),
+        database=environ.get('HMS_MYSQL_DATABASE', 'Your database name'),
+        port=int(environ.get('HMS_MYSQL_PORT', 3306))
+    )
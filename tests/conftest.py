@@ -0,0 +1,50 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SQLiteEngine
+from services import HospitalService
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "hms.db")
+
+
+@pytest.fixture
+def make_service(db_path):
+    services = []
+
+    def make(**options):
+        service = HospitalService(SQLiteEngine(db_path), pool_size=options.pop('pool_size', 4), **options)
+        service.setup_database()
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.close()
+
+
+@pytest.fixture
+def service(make_service):
+    return make_service()
+
+
+@pytest.fixture
+def tomorrow():
+    return (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+
+
+def add_patient(service, n=1, first_name="Ann", last_name="Lee"):
+    return service.register_patient(first_name, last_name, "1980-01-01", "Female",
+                                    f"555{n:07d}", f"patient{n}@example.com")
+
+
+def add_doctor(service, n=1, specialization="Cardiology", department="Heart"):
+    return service.register_doctor("Dan", f"Doc{n}", specialization, f"444{n:07d}",
+                                   f"doctor{n}@example.com", department, "2020-01-01", 100)
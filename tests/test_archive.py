@@ -0,0 +1,112 @@
+import csv
+import datetime
+import gzip
+
+import pytest
+
+import archive
+from export import TableExport
+from services import ValidationError
+from storage import SQLiteEngine
+from conftest import add_doctor, add_patient
+
+
+def move_back(service, table, key, column, row_id, year):
+    service.execute_write(f"UPDATE {table} SET {column} = %s WHERE {key} = %s", (f"{year}-06-01 10:00:00", row_id))
+
+
+def test_partitioned_years_stay_searchable_and_found(service, db_path, tmp_path):
+    patient_id, doctor_id = add_patient(service), add_doctor(service)
+    old = datetime.date.today().year - 3
+    old_record = service.add_medical_record(patient_id, doctor_id, "wrist fracture", "cast", "review")
+    new_record = service.add_medical_record(patient_id, doctor_id, "wrist sprain", "rest", "none")
+    old_bill = service.generate_bill(patient_id, 80, 'Paid')
+    move_back(service, 'medical_records', 'record_id', 'visit_date', old_record, old)
+    move_back(service, 'billing', 'bill_id', 'bill_date', old_bill, old)
+    assert len(service.search_records("wrist").first()) == 2
+
+    moved = archive.partition(service)
+    assert {(entry['table'], entry['year']) for entry in moved} == {('medical_records', old), ('billing', old)}
+    assert service.fetch_one("SELECT COUNT(*) AS count FROM medical_records")['count'] == 1
+    assert [row['record_id'] for row in service.search_records("fracture").first()] == [old_record]
+    assert {row['record_id'] for row in service.search_records("wrist").first()} == {old_record, new_record}
+    # A fresh index, built from the tables alone, finds it too.
+    service.search.index = None
+    service.search.path = None
+    assert [row['record_id'] for row in service.search_records("cast").first()] == [old_record]
+
+    bill = service.get_bill(old_bill)
+    assert (bill['payment_status'], bill['patient_name']) == ('Paid', "Ann Lee")
+    with pytest.raises(ValidationError, match="closed year"):
+        service.update_bill_status(old_bill, 'Pending')
+
+    path = tmp_path / "records.csv.gz"
+    TableExport(SQLiteEngine(db_path), 'medical_records').run(str(path))
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+        assert sorted(int(row['record_id']) for row in csv.DictReader(f)) == [old_record, new_record]
+
+    # Moved on to an archive file, the year leaves search.
+    archive.run(service, keep_years=2, directory=str(tmp_path))
+    assert service.search_records("fracture").first() == []
+    assert service.get_bill(old_bill) is None
+
+
+def test_billing_is_partitioned_only_on_request(service):
+    assert not archive.partition_billing(service)
+    with pytest.raises(SystemExit):
+        archive.main(['partition-billing'])
+
+
+def test_archive_round_trip_and_checksum(service, tmp_path):
+    patients = [add_patient(service, n) for n in range(1, 4)]
+    old = datetime.date.today().year - 7
+    bills = {}
+    for n, patient_id in enumerate(patients * 3):
+        bill_id = service.generate_bill(patient_id, 10 + n + 0.25, 'Paid')
+        move_back(service, 'billing', 'bill_id', 'bill_date', bill_id, old)
+        bills[bill_id] = service.get_bill(bill_id)
+    # Small blocks, so a patient's rows are read from their own blocks only.
+    path = str(tmp_path / "billing.csv.gz")
+    count, sha256 = archive.write_archive(service, 'billing', 'bill_id', 'bill_date', old, path, block_rows=2)
+    assert count == 9
+    archived = archive.ArchiveFile(path, sha256)
+    for patient_id in patients:
+        rows = archived.rows(patient_id)
+        assert len(rows) == 3
+        for row in rows:
+            original = bills[row['bill_id']]
+            assert row['patient_id'] == patient_id
+            assert ([row[column] for column in ('total_amount', 'payment_status', 'bill_date')]
+                    == [original[column] for column in ('total_amount', 'payment_status', 'bill_date')])
+    assert not archived.may_contain(999)
+
+    with open(path, 'ab') as f:
+        f.write(b"\0")
+    with pytest.raises(archive.ArchiveError, match="checksum"):
+        archive.ArchiveFile(path, sha256).rows(patients[0])
+
+
+def test_history_pages_back_into_archive_files(service, tmp_path):
+    patient_id, doctor_id = add_patient(service), add_doctor(service)
+    this_year = datetime.date.today().year
+    for years_ago in (0, 3, 8):
+        record_id = service.add_medical_record(patient_id, doctor_id, f"visit {years_ago}", "rest", "none")
+        move_back(service, 'medical_records', 'record_id', 'visit_date', record_id, this_year - years_ago)
+    archive.partition(service)
+    reports = archive.run(service, keep_years=5, directory=str(tmp_path))
+    assert [(report['table'], report['year'], report['archived']) for report in reports] == [
+        ('medical_records', this_year - 8, 1)]
+    assert archive.verify(service) == [{'table': 'medical_records', 'year': this_year - 8, 'ok': True}]
+    # Re-running finds nothing left to do.
+    assert archive.run(service, keep_years=5, directory=str(tmp_path)) == []
+
+    pager = service.medical_record_pager(patient_id)
+    pager.first()
+    pages = [(pager.label, [row['diagnosis'] for row in pager.rows])]
+    while pager.has_next:
+        pager.next()
+        pages.append((pager.label, [row['diagnosis'] for row in pager.rows]))
+    assert pages == [(f"{this_year - 1} onwards", ["visit 0"]), (str(this_year - 3), ["visit 3"]),
+                     (f"{this_year - 8} (archived)", ["visit 8"])]
+    assert pager.rows[0]['doctor_name'] == "Dan Doc1"
+    assert pager.previous() and pager.label == str(this_year - 3)
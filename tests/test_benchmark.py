@@ -0,0 +1,50 @@
+from benchmark import Benchmark
+from datagen import generate
+from conftest import add_doctor, add_patient
+
+
+def booking(service):
+    benchmark = Benchmark(service, 100, repeat=1)
+    return dict(benchmark.operations())['book_appointment']
+
+
+def count_appointments(service):
+    return service.fetch_one("SELECT COUNT(*) AS n FROM appointments")['n']
+
+
+def test_booking_sample_books_a_free_slot(service):
+    add_patient(service)
+    add_doctor(service)
+    booking(service)()
+    assert count_appointments(service) == 1
+
+
+def test_booking_sample_skips_when_every_doctor_is_full(service, monkeypatch):
+    add_patient(service)
+    add_doctor(service)
+    monkeypatch.setattr(service, 'free_slots', lambda *args, **kwargs: [])
+    booking(service)()
+    assert count_appointments(service) == 0
+
+
+def state(service):
+    queries = {
+        'patients': "SELECT COUNT(*) AS n, SUM(version) AS v, MAX(address) AS a FROM patients",
+        'appointments': "SELECT status, COUNT(*) AS n, SUM(version) AS v FROM appointments GROUP BY status",
+        'records': "SELECT COUNT(*) AS n FROM medical_records",
+        'billing': "SELECT payment_status, COUNT(*) AS n, SUM(total_amount) AS t FROM billing GROUP BY payment_status",
+        'revenue': """SELECT month, payment_status, bill_count, total_amount FROM revenue_by_month
+                      WHERE bill_count <> 0 ORDER BY month, payment_status"""
+    }
+    return {name: service.fetch_all(query) for name, query in queries.items()}
+
+
+def test_runs_leave_the_dataset_unchanged(service):
+    generate(service.engine, 300, seed=3)
+    before = state(service)
+    first = Benchmark(service, 300, repeat=2).run()
+    assert state(service) == before
+    second = Benchmark(service, 300, repeat=2).run()
+    assert state(service) == before
+    assert set(first) == set(second)
+    assert service.search_records("benchmark").first() == []
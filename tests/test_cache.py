@@ -0,0 +1,55 @@
+import time
+
+from cache import SummaryCache
+from conftest import add_patient
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SummaryCache(max_entries=2)
+    cache.put(1, {'name': "one"})
+    cache.put(2, {'name': "two"})
+    assert cache.get(1) == {'name': "one"}
+    cache.put(3, {'name': "three"})
+    assert cache.get(2) is None
+    assert cache.get(1) and cache.get(3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = SummaryCache(ttl=10)
+    cache.put(1, {'name': "one"})
+    now[0] += 5
+    assert cache.get(1) == {'name': "one"}
+    now[0] += 6
+    assert cache.get(1) is None
+    assert cache.stats()['expired'] == 1
+
+
+def test_callers_get_copies():
+    cache = SummaryCache()
+    cache.put(1, {'name': "one"})
+    cache.get(1)['name'] = "changed"
+    assert cache.get(1) == {'name': "one"}
+
+
+def test_misses_are_not_cached():
+    cache = SummaryCache()
+    loads = []
+    assert cache.get_or_load(1, lambda: loads.append(1)) is None
+    assert cache.get_or_load(1, lambda: {'name': "one"}) == {'name': "one"}
+    assert cache.get_or_load(1, lambda: loads.append(2)) == {'name': "one"}
+    assert loads == [1]
+
+
+def test_service_lookups_hit_the_cache_and_see_updates(service):
+    patient_id = add_patient(service)
+    for _ in range(3):
+        assert service.get_patient(patient_id)['first_name'] == "Ann"
+    assert service.cache_stats()['patients']['hits'] == 3
+    service.execute_write("UPDATE patients SET first_name = 'Jo' WHERE patient_id = %s", (patient_id,))
+    service.update_patient(patient_id, address="1 High Street")
+    assert service.get_patient(patient_id)['first_name'] == "Jo"
+    assert service.get_patient(999) is None
+    assert service.cache_stats()['patients']['size'] == 1
@@ -0,0 +1,59 @@
+import csv
+import gzip
+
+import pytest
+
+from export import TableExport
+from storage import SQLiteEngine, StorageError
+from conftest import add_patient
+
+
+def exported_ids(path):
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+        return [int(row['patient_id']) for row in csv.DictReader(f)]
+
+
+def test_resuming_from_the_watermark(service, db_path, tmp_path):
+    # Rows registered in the same second are told apart by their key.
+    same_second = "2024-05-01 09:00:00"
+    first = [add_patient(service, n) for n in range(1, 6)]
+    service.execute_write("UPDATE patients SET registration_date = %s", (same_second,))
+    export = TableExport(SQLiteEngine(db_path), 'patients', chunk_size=2)
+    export.run(str(tmp_path / "full.csv.gz"))
+    assert exported_ids(tmp_path / "full.csv.gz") == first
+    assert export.watermark == (same_second, first[-1])
+
+    later = [add_patient(service, n) for n in range(6, 9)]
+    service.execute_write("UPDATE patients SET registration_date = %s WHERE patient_id = %s", (same_second, later[0]))
+    service.execute_write("UPDATE patients SET registration_date = %s WHERE patient_id IN (%s, %s)",
+                          ("2024-05-02 10:00:00", later[1], later[2]))
+    resumed = TableExport(SQLiteEngine(db_path), 'patients', chunk_size=2)
+    report = resumed.run(str(tmp_path / "next.csv.gz"), export.watermark)
+    assert exported_ids(tmp_path / "next.csv.gz") == later
+    assert report['exported'] == 3 and report['watermark'] == ["2024-05-02 10:00:00", later[2]]
+
+    # Nothing new: an empty file, and the watermark stays where it was.
+    again = TableExport(SQLiteEngine(db_path), 'patients')
+    again.run(str(tmp_path / "empty.csv.gz"), resumed.watermark)
+    assert exported_ids(tmp_path / "empty.csv.gz") == []
+    assert again.watermark == resumed.watermark
+
+
+def test_full_only_tables_refuse_a_watermark(service, db_path):
+    with pytest.raises(ValueError):
+        TableExport(SQLiteEngine(db_path), 'doctors').statement(("2024-01-01", 0))
+
+
+def test_schema_behind_is_refused_without_ddl(db_path, tmp_path):
+    engine = SQLiteEngine(db_path)
+    path = tmp_path / "patients.csv.gz"
+    with pytest.raises(StorageError, match="migrations.py"):
+        TableExport(engine, 'patients').run(str(path))
+    assert not path.exists() and not (tmp_path / "patients.csv.gz.tmp").exists()
+    connection = engine.connect()
+    try:
+        cursor = engine.cursor(connection)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        assert cursor.fetchall() == []
+    finally:
+        connection.close()
@@ -0,0 +1,59 @@
+import pytest
+
+from finder import PatientIndex, parse_query
+from services import ConflictError
+from conftest import add_patient
+
+
+def names(results):
+    return [(row['first_name'], row['last_name']) for row in results]
+
+
+def test_typo_in_short_name(service):
+    add_patient(service, 1, "Ann", "Lee")
+    add_patient(service, 2, "Bob", "Stone")
+    assert names(service.find_patients("Ane Le")) == [("Ann", "Lee")]
+    assert names(service.find_patients("smtih")) == []
+    assert names(service.find_patients("Stnoe")) == [("Bob", "Stone")]
+
+
+def test_exact_names_rank_first():
+    index = PatientIndex()
+    index.add(1, "Ane", "Lee", "1980-01-01", "5550000001", "a@example.com")
+    index.add(2, "Ann", "Lee", "1980-01-01", "5550000002", "b@example.com")
+    hits = index.find(parse_query("ann"))
+    assert [patient_id for _, patient_id in hits] == [2, 1]
+    assert hits[0][0] > hits[1][0]
+
+
+def test_limit(service):
+    for n in range(1, 8):
+        add_patient(service, n, "Ann", f"Lee{n}")
+    assert len(service.find_patients("ann", limit=5)) == 5
+    assert len(service.find_patients("ann")) == 7
+
+
+def test_updates_reach_other_processes(make_service):
+    first = make_service()
+    second = make_service()
+    patient_id = add_patient(first, 1)
+    assert names(second.find_patients("0001")) == [("Ann", "Lee")]
+    first.update_patient(patient_id, contact_number="5559998888")
+    assert names(second.find_patients("0001")) == []
+    assert names(second.find_patients("8888")) == [("Ann", "Lee")]
+
+
+def test_snapshot_replays_later_changes(make_service, tmp_path):
+    path = str(tmp_path / "patients")
+    first = make_service(finder_index=path)
+    patient_id = add_patient(first, 1)
+    assert names(first.find_patients("patient1@")) == [("Ann", "Lee")]
+    first.finder.save()
+    other = make_service()
+    version = other.get_patient_details(patient_id)['version']
+    other.update_patient(patient_id, email="ann.lee@example.com", version=version)
+    reopened = make_service(finder_index=path)
+    assert names(reopened.find_patients("patient1@")) == []
+    assert names(reopened.find_patients("ann.lee@")) == [("Ann", "Lee")]
+    with pytest.raises(ConflictError):
+        other.update_patient(patient_id, email="old@example.com", version=version)
@@ -0,0 +1,75 @@
+import io
+import json
+
+from importer import BulkImporter, ParallelImporter, read_rows
+from storage import SQLiteEngine
+
+PATIENT = {'first_name': "Ann", 'last_name': "Lee", 'date_of_birth': "1980-01-01", 'gender': "Female",
+           'contact_number': "5550000001", 'email': "ann@example.com"}
+
+
+def patient(n, **changes):
+    row = dict(PATIENT, contact_number=f"555{n:07d}", email=f"p{n}@example.com", legacy_id=f"L{n}")
+    row.update(changes)
+    return json.dumps(row)
+
+
+def import_lines(db_path, lines, kind='patients', batch_size=2):
+    rejects = io.StringIO()
+    importer = BulkImporter(SQLiteEngine(db_path), kind, batch_size, rejects)
+    report = importer.run(read_rows(io.StringIO("\n".join(lines) + "\n"), 'ndjson'))
+    return report, [json.loads(line) for line in rejects.getvalue().splitlines()]
+
+
+def count(db_path, table):
+    connection = SQLiteEngine(db_path).connect()
+    try:
+        return connection.execute(f"SELECT COUNT(*) AS n FROM {table}").fetchone()['n']
+    finally:
+        connection.close()
+
+
+def test_bad_lines_are_rejected_and_the_import_carries_on(db_path):
+    lines = [patient(1), '{"first_name": "Broken', patient(2), '[1, 2]', patient(3, email="not-an-email"),
+             patient(4, first_name=7)]
+    report, rejects = import_lines(db_path, lines)
+    assert report['inserted'] == 3
+    assert report['rejected'] == 3
+    assert [reject['line'] for reject in rejects] == [2, 4, 5]
+    assert "Invalid JSON" in rejects[0]['error']
+    assert "JSON object" in rejects[1]['error']
+    assert count(db_path, 'patients') == 3
+
+
+def test_rerun_after_interruption_only_adds_the_missing_rows(db_path):
+    import_lines(db_path, [patient(n) for n in range(1, 4)])
+    report, rejects = import_lines(db_path, [patient(n) for n in range(1, 7)])
+    # Rows whose legacy ID is already mapped are refused as duplicates.
+    assert report['inserted'] == 3
+    assert len(rejects) == 3
+    assert count(db_path, 'patients') == 6
+    assert count(db_path, 'patient_id_map') == 6
+
+
+def test_appointments_resolve_legacy_ids(db_path):
+    import_lines(db_path, [patient(1)])
+    doctor = {'first_name': "Dan", 'last_name': "Doc", 'specialization': "Cardiology",
+              'contact_number': "4440000001", 'email': "dan@example.com", 'department': "Heart",
+              'joining_date': "2020-01-01", 'consultation_fee': 100, 'legacy_id': 90}
+    import_lines(db_path, [json.dumps(doctor)], 'doctors')
+    appointment = {'legacy_patient_id': "L1", 'legacy_doctor_id': 90, 'appointment_date': "2030-01-02",
+                   'appointment_time': "9:30"}
+    report, rejects = import_lines(db_path, [json.dumps(appointment),
+                                             json.dumps(dict(appointment, legacy_patient_id="L404"))],
+                                   'appointments')
+    assert report['inserted'] == 1
+    assert "Unknown legacy patient ID 'L404'" in rejects[0]['error']
+
+
+def test_parallel_import_matches_a_single_process(tmp_path):
+    path = tmp_path / "patients.ndjson"
+    path.write_text("\n".join([patient(n) for n in range(1, 41)] + ['not json']) + "\n", encoding='utf-8')
+    rejects = io.StringIO()
+    report = ParallelImporter(SQLiteEngine(str(tmp_path / "hms.db")), 'patients', 2, 5, rejects).run(str(path), 'ndjson')
+    assert (report['inserted'], report['rejected']) == (40, 1)
+    assert json.loads(rejects.getvalue())['line'] == 41
@@ -0,0 +1,68 @@
+import json
+import sqlite3
+import threading
+
+from metrics import InstrumentedCursor, Metrics, fingerprint
+
+
+def test_fingerprint_hides_values():
+    assert fingerprint("SELECT * FROM patients WHERE last_name = 'O''Neil' AND patient_id IN (1, 2, 3)") == \
+        "SELECT * FROM patients WHERE last_name = ? AND patient_id IN (?+)"
+    assert fingerprint("SELECT *\n  FROM billing WHERE bill_id = %s") == "SELECT * FROM billing WHERE bill_id = ?"
+
+
+def test_histogram_summary_and_prometheus():
+    metrics = Metrics(slow_query_ms=None)
+    for ms in range(1, 101):
+        metrics.observe('action', 'view_patients', ms / 1000)
+    metrics.observe('action', 'view_patients', 0.5, error=True)
+    summary = metrics.snapshot()['actions']['view_patients']
+    assert (summary['count'], summary['errors'], summary['max_ms']) == (101, 1, 500.0)
+    assert 50 <= summary['p50_ms'] <= 100 and summary['p99_ms'] <= 500
+    text = metrics.prometheus()
+    assert 'hms_action_duration_seconds_bucket{action="view_patients",le="+Inf"} 101' in text
+    assert 'hms_action_errors_total{action="view_patients"} 1' in text
+
+
+def test_slow_queries_are_logged_without_values(tmp_path):
+    log = tmp_path / "slow.log"
+    metrics = Metrics(slow_query_ms=100, slow_query_log=str(log))
+    metrics.query("SELECT * FROM patients WHERE email = 'ann@example.com'", 0.25, rows=1)
+    metrics.query("SELECT 1", 0.01)
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(entry['query'], entry['ms'], entry['rows']) for entry in entries] == [
+        ("SELECT * FROM patients WHERE email = ?", 250.0, 1)]
+    assert metrics.snapshot()['slow_queries'] == 1
+
+
+def test_slow_query_log_is_written_outside_the_metrics_lock(tmp_path, monkeypatch):
+    metrics = Metrics(slow_query_ms=0, slow_query_log=str(tmp_path / "slow.log"))
+    held = []
+    real_open = open
+
+    def watching_open(*args, **kwargs):
+        # Another thread can still record metrics while the line is written.
+        done = threading.Event()
+        threading.Thread(target=lambda: (metrics.observe('query', 'other', 0.001), done.set())).start()
+        held.append(not done.wait(2))
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', watching_open)
+    metrics.query("SELECT 1", 0.5)
+    assert held == [False]
+    assert metrics.snapshot()['queries']['other']['count'] == 1
+
+
+def test_cursor_times_fetches_and_counts_rows():
+    connection = sqlite3.connect(":memory:")
+    metrics = Metrics(slow_query_ms=None)
+    cursor = InstrumentedCursor(connection.cursor(), metrics)
+    cursor.execute("CREATE TABLE t (n INT)")
+    cursor.executemany("INSERT INTO t VALUES (?)", [(n,) for n in range(7)])
+    cursor.execute("SELECT n FROM t WHERE n > ?", (1,))
+    assert len(cursor.fetchmany(2)) == 2 and len(cursor.fetchall()) == 3
+    cursor.close()
+    queries = metrics.snapshot()['queries']
+    assert queries["INSERT INTO t VALUES (?)"]['rows'] == 7
+    assert queries["SELECT n FROM t WHERE n > ?"]['rows'] == 5
+    connection.close()
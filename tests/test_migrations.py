@@ -0,0 +1,8 @@
+from migrations import current_version, latest_version, migrate
+
+
+def test_setup_database_migrates_to_latest(service):
+    with service.unit_of_work() as (connection, cursor):
+        assert current_version(cursor) == latest_version()
+        # Already current: nothing more is applied.
+        assert migrate(service.engine, connection, cursor) == []
@@ -0,0 +1,18 @@
+from conftest import add_doctor, add_patient
+
+
+def test_keyset_pager_walks_forward_and_back(service):
+    ids = [add_patient(service, n) for n in range(7)]
+    pager = service.patient_pager(page_size=3)
+    pages = [[row['patient_id'] for row in pager.first()]]
+    while pager.has_next:
+        pages.append([row['patient_id'] for row in pager.next()])
+    assert pages == [ids[0:3], ids[3:6], ids[6:7]]
+    assert [row['patient_id'] for row in pager.previous()] == ids[3:6]
+
+
+def test_doctor_pager_filters_by_name_prefix(service):
+    add_doctor(service, 1)
+    add_doctor(service, 2)
+    rows = service.doctor_pager(name_prefix="Doc2").first()
+    assert [row['last_name'] for row in rows] == ["Doc2"]
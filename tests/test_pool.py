@@ -0,0 +1,38 @@
+import pytest
+
+from pool import ConnectionPool, PoolError
+from storage import SQLiteEngine
+
+
+def test_pool_reuses_connections(service):
+    for _ in range(5):
+        service.fetch_one("SELECT 1 AS one")
+    stats = service.pool.stats()
+    assert stats['checkouts'] >= 5
+    assert stats['connections_opened'] <= stats['size']
+
+
+def test_pool_times_out_when_exhausted(db_path):
+    pool = ConnectionPool(SQLiteEngine(db_path), size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolError):
+        pool.acquire()
+    pool.release(held)
+    # The released connection is handed out again rather than a new one opened.
+    assert pool.acquire() is held
+    assert pool.stats()['timeouts'] == 1 and pool.stats()['connections_opened'] == 1
+    pool.close()
+
+
+def test_failed_borrower_does_not_leak_its_transaction(db_path):
+    pool = ConnectionPool(SQLiteEngine(db_path), size=1)
+    with pool.connection() as connection:
+        connection.execute("CREATE TABLE probe (x INT)")
+        connection.commit()
+    with pytest.raises(RuntimeError):
+        with pool.connection() as connection:
+            connection.execute("INSERT INTO probe VALUES (1)")
+            raise RuntimeError("boom")
+    with pool.connection() as connection:
+        assert connection.execute("SELECT COUNT(*) AS n FROM probe").fetchall() == [{'n': 0}]
+    pool.close()
@@ -0,0 +1,45 @@
+from render import StreamingTable, visible
+
+GREEN = '\x1b[32m'
+RESET = '\x1b[0m'
+
+
+def test_box_and_alignment():
+    table = StreamingTable(["Name", "Fee"], [["Ann", 150], ["Bo", None]])
+    assert table.widths == [4, 3]
+    lines = [table.header(), table.row(["Ann", 150]), table.row(["Bo", 7]), table.footer()]
+    assert "\n".join(lines) == "\n".join([
+        "╒══════╤═════╕",
+        "│ Name │ Fee │",
+        "╞══════╪═════╡",
+        "│ Ann  │ 150 │",
+        "├──────┼─────┤",
+        "│ Bo   │   7 │",
+        "╘══════╧═════╛",
+    ])
+
+
+def test_rows_after_a_footer_start_a_new_table():
+    table = StreamingTable(["ID"], [[1]])
+    table.row([1])
+    table.footer()
+    assert table.row([2]) == "│  2 │"
+
+
+def test_wide_cells_are_cut_short():
+    table = StreamingTable(["Diagnosis"], [["x" * 60]], max_width=12)
+    assert table.widths == [12]
+    assert table.row(["chest pain and shortness of breath"]) == "│ chest pain … │"
+    # A header wider than the limit keeps its full width.
+    assert StreamingTable(["A long heading"], max_width=5).widths == [14]
+    assert StreamingTable(["ID"], widths=[6]).widths == [6]
+
+
+def test_colour_codes_take_no_width():
+    coloured = f"{GREEN}Paid{RESET}"
+    assert visible(coloured) == "Paid"
+    table = StreamingTable(["Status"], [[coloured]])
+    assert table.widths == [6]
+    assert table.row([coloured]) == f"│ {coloured}   │"
+    narrow = StreamingTable(["S"], widths=[3])
+    assert narrow.row([f"{GREEN}Pending{RESET}"]) == f"│ {GREEN}Pe…{RESET} │"
@@ -0,0 +1,53 @@
+import pytest
+
+from replicas import copy_sqlite, session
+from storage import SQLiteEngine
+from conftest import add_patient
+
+
+@pytest.fixture
+def replicated(make_service, db_path, tmp_path, capsys):
+    replica_path = str(tmp_path / "replica.db")
+    service = make_service(replicas=(SQLiteEngine(replica_path),), max_replica_lag=60)
+    copy_sqlite(db_path, replica_path, 0)
+    service.replicas.check()
+    capsys.readouterr()
+    assert service.replicas.replicas[0].healthy
+    return service
+
+
+def count(service):
+    return service.fetch_one("SELECT COUNT(*) AS count FROM patients", replica=True)['count']
+
+
+def test_sessions_read_their_own_writes(replicated):
+    with session('a'):
+        add_patient(replicated)
+        assert count(replicated) == 1
+    with session('b'):
+        # Not written by this session: the replica, which has not caught up, is fine.
+        assert count(replicated) == 0
+    assert count(replicated) == 0
+    assert replicated.replicas.stats()['primary_reads'] == 1
+
+
+def test_caught_up_replica_serves_the_writer(replicated, db_path, tmp_path):
+    with session('a'):
+        add_patient(replicated)
+    # A heartbeat stamped after the write has to reach the replica.
+    replicated.replicas.check()
+    copy_sqlite(db_path, str(tmp_path / "replica.db"), 0)
+    replicated.replicas.check()
+    with session('a'):
+        assert count(replicated) == 1
+    assert replicated.replicas.stats()['primary_reads'] == 0
+
+
+@pytest.mark.parametrize('group_commit_ms', [0, 5])
+def test_watermark_is_stamped_after_commit(make_service, group_commit_ms):
+    service = make_service(group_commit_ms=group_commit_ms)
+    stamped = []
+    service.replicas.wrote = lambda: stamped.append(
+        service.fetch_one("SELECT COUNT(*) AS count FROM patients")['count'])
+    add_patient(service)
+    assert stamped == [1]
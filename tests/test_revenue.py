@@ -0,0 +1,68 @@
+import datetime
+
+import archive
+import revenue
+from conftest import add_doctor, add_patient
+
+
+def summaries(service):
+    return {table: sorted((str(row[column]), row['payment_status'], row['bill_count'], float(row['total_amount']))
+                          for row in service.fetch_all(f"SELECT * FROM {table}") if row['bill_count'])
+            for table, column, _, _ in revenue.SUMMARIES.values()}
+
+
+def assert_matches_rebuild(service):
+    incremental = summaries(service)
+    service.rebuild_revenue_summaries()
+    assert summaries(service) == incremental
+
+
+def add_bills(service):
+    patient_id = add_patient(service)
+    heart, bones = add_doctor(service, 1), add_doctor(service, 2, "Orthopedics", "Bones")
+    return [service.generate_bill(patient_id, amount, status, doctor_id) for amount, status, doctor_id in
+            ((100, 'Pending', heart), (40.5, 'Paid', heart), (75, 'Pending', bones), (20, 'Overdue', None))]
+
+
+def test_new_bills_and_status_changes(service):
+    bills = add_bills(service)
+    assert_matches_rebuild(service)
+    service.update_bill_status(bills[0], 'Paid')
+    service.update_bill_status(bills[2], 'Overdue')
+    # Setting the status a bill already has moves nothing.
+    service.update_bill_status(bills[3], 'Overdue')
+    assert_matches_rebuild(service)
+    totals = service.outstanding_totals()
+    assert (totals['Pending']['bills'], totals['Overdue']['bills']) == (0, 2)
+    departments = {row['department']: float(row['billed']) for row in service.revenue_report('department')}
+    assert departments == {'Bones': 75, 'Heart': 140.5, revenue.UNASSIGNED: 20}
+
+
+def test_overdue_sweep(service):
+    bills = add_bills(service)
+    month_ago = (datetime.date.today() - datetime.timedelta(days=40)).isoformat()
+    service.execute_write("UPDATE billing SET bill_date = %s WHERE bill_id IN (%s, %s)", (month_ago, bills[0], bills[1]))
+    service.rebuild_revenue_summaries()
+    assert service.bulk_transition('overdue-bills')['updated'] == 1
+    assert_matches_rebuild(service)
+
+
+def test_moved_years_still_count(service, tmp_path):
+    bills = add_bills(service)
+    today = datetime.date.today()
+    old, older = today.year - 3, today.year - 8
+    service.execute_write("UPDATE billing SET bill_date = %s, payment_status = 'Paid' WHERE bill_id IN (%s, %s)",
+                          (f"{old}-03-01", bills[0], bills[1]))
+    service.execute_write("UPDATE billing SET bill_date = %s, payment_status = 'Paid' WHERE bill_id = %s",
+                          (f"{older}-05-01", bills[2]))
+    service.rebuild_revenue_summaries()
+    before = summaries(service)
+    moved = archive.partition(service, today)
+    assert {(entry['table'], entry['year']) for entry in moved} == {('billing', old), ('billing', older)}
+    assert service.fetch_one("SELECT COUNT(*) AS count FROM billing")['count'] == 1
+    assert summaries(service) == before
+    assert_matches_rebuild(service)
+    archive.run(service, directory=str(tmp_path), today=today)
+    assert archive.catalog(service, 'billing')[older]['location'] == 'archive'
+    assert summaries(service) == before
+    assert_matches_rebuild(service)
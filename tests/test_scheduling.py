@@ -0,0 +1,108 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from scheduling import ScheduleIndex, SlotConflict
+from conftest import add_doctor, add_patient
+
+
+@pytest.fixture
+def clinic(service):
+    return service, add_patient(service), add_doctor(service)
+
+
+def test_overlapping_booking_is_refused(clinic, tomorrow):
+    service, patient_id, doctor_id = clinic
+    service.book_appointment(patient_id, doctor_id, tomorrow, "09:00")
+    with pytest.raises(SlotConflict):
+        service.book_appointment(patient_id, doctor_id, tomorrow, "09:15")
+    assert service.book_appointment(patient_id, doctor_id, tomorrow, "09:30")
+
+
+def test_stale_index_in_another_process_cannot_double_book(make_service, tomorrow):
+    front_desk, ward = make_service(), make_service()
+    patient_id, doctor_id = add_patient(front_desk), add_doctor(front_desk)
+    # The ward's index is loaded before the front desk books.
+    assert ward.slot_conflict(doctor_id, tomorrow, "10:00") is None
+    front_desk.book_appointment(patient_id, doctor_id, tomorrow, "10:00")
+    assert ward.slot_conflict(doctor_id, tomorrow, "10:00") is None
+    with pytest.raises(SlotConflict):
+        ward.book_appointment(patient_id, doctor_id, tomorrow, "10:10")
+    # The refused booking dropped the stale day, so the index now knows.
+    assert ward.slot_conflict(doctor_id, tomorrow, "10:00") == "10:00"
+
+
+@pytest.mark.parametrize('group_commit_ms', [0, 20])
+def test_concurrent_bookings_from_two_services_book_the_slot_once(make_service, tomorrow, group_commit_ms):
+    services = [make_service(group_commit_ms=group_commit_ms) for _ in range(2)]
+    patient_id, doctor_id = add_patient(services[0]), add_doctor(services[0])
+    for service in services:
+        service.slot_conflict(doctor_id, tomorrow, "11:00")
+    outcomes = []
+
+    def book(service):
+        try:
+            outcomes.append(service.book_appointment(patient_id, doctor_id, tomorrow, "11:00"))
+        except SlotConflict:
+            outcomes.append(None)
+
+    threads = [threading.Thread(target=book, args=(services[i % 2],)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(outcome is not None for outcome in outcomes) == 1
+    rows = services[0].fetch_all("SELECT appointment_id FROM appointments WHERE doctor_id = %s", (doctor_id,))
+    assert len(rows) == 1
+
+
+def test_reschedule_into_a_slot_booked_elsewhere_is_refused(make_service, tomorrow):
+    first, second = make_service(), make_service()
+    patient_id, doctor_id = add_patient(first), add_doctor(first)
+    moving = first.book_appointment(patient_id, doctor_id, tomorrow, "13:00")
+    first.slot_conflict(doctor_id, tomorrow, "14:00")
+    second.book_appointment(patient_id, doctor_id, tomorrow, "14:00")
+    with pytest.raises(SlotConflict):
+        first.reschedule_appointment(moving, tomorrow, "14:00")
+    assert str(first.require_appointment(moving)['appointment_time']) == "13:00"
+    # A move within its own slot is fine.
+    first.reschedule_appointment(moving, tomorrow, "13:15")
+
+
+def test_restoring_a_cancelled_appointment_checks_its_slot(make_service, tomorrow):
+    first, second = make_service(), make_service()
+    patient_id, doctor_id = add_patient(first), add_doctor(first)
+    appointment_id = first.book_appointment(patient_id, doctor_id, tomorrow, "15:00")
+    first.cancel_appointment(appointment_id)
+    second.book_appointment(patient_id, doctor_id, tomorrow, "15:00")
+    with pytest.raises(SlotConflict):
+        first.set_appointment_status(appointment_id, 'Scheduled')
+
+
+def test_free_slots_skip_booked_ones(clinic, tomorrow):
+    service, patient_id, doctor_id = clinic
+    service.book_appointment(patient_id, doctor_id, tomorrow, "09:00")
+    slots = service.free_slots(doctor_id, datetime.datetime.fromisoformat(f"{tomorrow} 08:00"), count=2)
+    assert [slot for _, slot in slots] == ["09:30", "10:00"]
+
+
+def test_index_drops_stale_days_and_stays_bounded(service, monkeypatch, tomorrow):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    index = ScheduleIndex(service, max_age=60, load_days=7, max_entries=20)
+    doctors = [add_doctor(service, n) for n in range(1, 5)]
+    index.conflict(doctors[0], tomorrow, "10:00")
+    assert len(index._days) == 7
+    # Past max_age, the next load sweeps out every stale day first.
+    now[0] += 61
+    index.conflict(doctors[1], tomorrow, "10:00")
+    assert {doctor_id for doctor_id, _ in index._days} == {doctors[1]}
+    # Within max_age, the oldest loaded make way for new ones.
+    for doctor_id in doctors[2:]:
+        index.conflict(doctor_id, tomorrow, "10:00")
+    assert len(index._days) == 20
+    assert (doctors[1], datetime.date.fromisoformat(tomorrow)) not in index._days
+    assert sum(doctor_id == doctors[3] for doctor_id, _ in index._days) == 7
+    assert index.conflict(doctors[3], tomorrow, "10:00") is None
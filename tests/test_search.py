@@ -0,0 +1,77 @@
+import datetime
+import pickle
+
+import archive
+from search import RecordIndex, load_snapshot, log_changes, save_snapshot
+from conftest import add_doctor, add_patient
+
+
+def add_records(service, count, diagnosis="chest pain"):
+    patient_id = add_patient(service)
+    doctor_id = add_doctor(service)
+    return [service.add_medical_record(patient_id, doctor_id, f"{diagnosis} visit {n}", "rest", "review")
+            for n in range(count)]
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = RecordIndex()
+    index.add(1, 7, "2024-03-01", ["chest pain", "aspirin", None])
+    index.add(2, 8, "2024-03-02", ["knee pain", "", "physio"])
+    index.changes = 4
+    path = str(tmp_path / "index")
+    save_snapshot(path, index)
+    loaded = load_snapshot(path, RecordIndex)
+    assert loaded.changes == 4 and loaded.watermark == 2
+    assert loaded.search(["pain"]) == index.search(["pain"])
+    loaded.remove(1)
+    assert [record_id for _, record_id in loaded.search(["pain"])] == [2]
+    assert "chest" not in loaded.postings
+
+
+def test_unreadable_snapshot_is_rebuilt(tmp_path):
+    path = str(tmp_path / "index")
+    with open(path, 'wb') as f:
+        pickle.dump({'postings': {}}, f)
+    assert load_snapshot(path, RecordIndex).documents == {}
+    with open(path, 'w') as f:
+        f.write('{"watermark": 3}')
+    assert load_snapshot(path, RecordIndex).watermark == 0
+
+
+def test_pages_stay_full_after_deletes(service):
+    record_ids = add_records(service, 12)
+    pager = service.search_records("chest", page_size=5)
+    assert len(pager.first()) == 5
+    # Removed behind the index's back: hits are re-checked before the page is cut.
+    removed = record_ids[:4]
+    service.execute_write(f"DELETE FROM medical_records WHERE record_id IN ({', '.join(['%s'] * 4)})", removed)
+    pages = [pager.first()]
+    while pager.has_next:
+        pages.append(pager.next())
+    assert [len(page) for page in pages] == [5, 3]
+    assert not {row['record_id'] for page in pages for row in page} & set(removed)
+
+
+def test_changes_reach_other_processes(make_service):
+    first = make_service()
+    second = make_service()
+    record_ids = add_records(first, 6)
+    assert len(second.search_records("chest", page_size=10).first()) == 6
+    with first.unit_of_work() as (connection, cursor):
+        log_changes(cursor, 'medical_records', 'record_id', 'record_id = %s', (record_ids[0],))
+        cursor.execute("UPDATE medical_records SET diagnosis = 'fracture' WHERE record_id = %s", (record_ids[0],))
+        connection.commit()
+    assert len(second.search_records("chest", page_size=10).first()) == 5
+    assert [row['record_id'] for row in second.search_records("fracture").first()] == [record_ids[0]]
+
+
+def test_archived_records_leave_the_index(service):
+    record_ids = add_records(service, 4)
+    old = (datetime.date.today() - datetime.timedelta(days=365 * 8)).replace(month=6, day=1)
+    service.execute_write("UPDATE medical_records SET visit_date = %s WHERE record_id IN (%s, %s)",
+                          (old.isoformat(), record_ids[0], record_ids[1]))
+    assert len(service.search_records("chest").first()) == 4
+    assert archive._purge(service, 'medical_records', 'record_id', 'visit_date', old.year) == 2
+    service.search.refresh()
+    assert set(service.search.index.documents) == set(record_ids[2:])
+    assert len(service.search_records("chest").first()) == 2
@@ -0,0 +1,132 @@
+import asyncio
+import datetime
+import json
+import logging
+
+import pytest
+
+import archive
+from server import MAX_PAGE_SIZE, HospitalServer
+from services import ValidationError
+from conftest import add_doctor, add_patient
+
+
+@pytest.fixture
+def server(service):
+    server = HospitalServer(service, workers=2)
+    yield server
+    server.executor.shutdown()
+
+
+def call(server, method, target, body=None):
+    payload = json.dumps(body).encode() if body is not None else b''
+    return asyncio.run(server.respond(method, target, payload))
+
+
+def test_unknown_missing_and_mistyped_fields_are_bad_requests(server):
+    patient = {'first_name': "Ann", 'last_name': "Lee", 'date_of_birth': "1980-01-01", 'gender': "Female",
+               'contact_number': "5550000001", 'email': "ann@example.com"}
+    assert call(server, 'POST', '/patients', dict(patient, shoe_size=9)) == (400, {'error': "Unknown field(s): shoe_size"})
+    assert call(server, 'POST', '/patients', dict(patient, email=None)) == (400, {'error': "Missing field(s): email"})
+    assert call(server, 'POST', '/patients', dict(patient, first_name=["Ann"])) == (400, {'error': "first_name must be a string"})
+    assert call(server, 'POST', '/patients', patient)[0] == 201
+
+
+def test_a_bug_in_a_handler_is_a_logged_500(server, monkeypatch, caplog):
+    def broken(*args, **kwargs):
+        raise TypeError("unexpected keyword argument")
+
+    monkeypatch.setattr(server.service, 'outstanding_totals', broken)
+    with caplog.at_level(logging.ERROR, logger='hms.server'):
+        assert call(server, 'GET', '/reports/outstanding') == (500, {'error': "Internal server error"})
+    assert "unexpected keyword argument" in caplog.text
+
+
+def test_patch_moves_and_changes_status_in_one_update(server, tomorrow):
+    service = server.service
+    appointment_id = service.book_appointment(add_patient(service), add_doctor(service), tomorrow, "09:00")
+    status, body = call(server, 'PATCH', f'/appointments/{appointment_id}',
+                        {'appointment_date': tomorrow, 'appointment_time': "10:00", 'status': "Completed", 'version': 0})
+    assert status == 200
+    assert (body['appointment_time'], body['status'], body['version']) == ("10:00", "Completed", 1)
+
+    status, _ = call(server, 'PATCH', f'/appointments/{appointment_id}',
+                     {'appointment_date': tomorrow, 'appointment_time': "11:00", 'status': "Lost"})
+    assert status == 400
+    assert service.require_appointment(appointment_id)['appointment_time'] == "10:00"
+
+
+def test_page_size_is_capped(server):
+    for n in range(3):
+        add_patient(server.service, n)
+    status, body = call(server, 'GET', '/patients?page_size=0')
+    assert status == 200 and len(body['rows']) == 1 and body['next']
+    pager = server.service.patient_pager(page_size=MAX_PAGE_SIZE)
+    assert call(server, 'GET', '/patients?page_size=100000')[1]['rows'] == pager.first()
+    assert call(server, 'GET', '/patients?page_size=lots')[0] == 400
+
+
+@pytest.mark.parametrize('after', ['5', '{}', '{"patient_id": {}}', 'not json'])
+def test_bad_cursor_is_a_bad_request(server, after):
+    add_patient(server.service)
+    status, body = call(server, 'GET', f'/patients?after={after}')
+    assert status == 400 and 'after' in body['error']
+
+
+def test_cursor_round_trip(server):
+    for n in range(3):
+        add_patient(server.service, n)
+    _, body = call(server, 'GET', '/patients?page_size=2')
+    status, body = call(server, 'GET', f"/patients?page_size=2&after={body['next']}")
+    assert status == 200 and len(body['rows']) == 1 and body['next'] is None
+
+
+@pytest.mark.parametrize('amount', ["NaN", "Infinity", "-5", "-0.5"])
+def test_amounts_must_be_finite_and_not_negative(server, amount):
+    patient_id = add_patient(server.service)
+    body = f'{{"patient_id": {patient_id}, "total_amount": {amount}}}'.encode()
+    status, payload = asyncio.run(server.respond('POST', '/bills', body))
+    assert status == 400, payload
+    with pytest.raises(ValidationError):
+        server.service.generate_bill(patient_id, amount)
+    assert call(server, 'POST', '/bills', {'patient_id': patient_id, 'total_amount': 0})[0] == 201
+
+
+@pytest.mark.parametrize('length', [b'abc', b'-4'])
+def test_bad_content_length_gets_an_answer(server, length):
+    async def exchange():
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b"POST /patients HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+
+    assert asyncio.run(exchange()).startswith(b"HTTP/1.1 400")
+
+
+def test_bill_history_pages_back_into_moved_years(server, tmp_path):
+    service = server.service
+    patient_id = add_patient(service)
+    this_year = datetime.date.today().year
+    for years_ago in (0, 3, 6):
+        bill_id = service.generate_bill(patient_id, 10 + years_ago, 'Paid')
+        service.execute_write("UPDATE billing SET bill_date = %s WHERE bill_id = %s",
+                              (f"{this_year - years_ago}-02-01", bill_id))
+    archive.partition(service)
+    archive.run(service, keep_years=5, directory=str(tmp_path))
+    periods, after = [], None
+    while True:
+        status, body = call(server, 'GET', f'/patients/{patient_id}/bills' + (f'?after={after}' if after else ''))
+        assert status == 200
+        periods.append((body['period'], [row['total_amount'] for row in body['rows']]))
+        after = body['next']
+        if not after:
+            break
+    assert periods == [(f"{this_year - 1} onwards", [10]), (str(this_year - 3), [13]),
+                       (f"{this_year - 6} (archived)", [16])]
+    assert call(server, 'GET', f'/patients/{patient_id}/bills?after=soon')[0] == 400
+    assert call(server, 'GET', '/patients/999/medical-records')[0] == 404
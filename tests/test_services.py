@@ -0,0 +1,50 @@
+import pytest
+
+from services import ConflictError, NotFoundError
+from conftest import add_doctor, add_patient
+
+
+def test_patient_version_conflict(service):
+    patient_id = add_patient(service)
+    version = service.get_patient_details(patient_id)['version']
+    service.update_patient(patient_id, version=version, address="1 High Street")
+    with pytest.raises(ConflictError) as conflict:
+        service.update_patient(patient_id, version=version, address="2 Low Road")
+    assert conflict.value.current['address'] == "1 High Street"
+    assert conflict.value.current['version'] == version + 1
+    # Without a version the last writer wins, and still moves the version on.
+    service.update_patient(patient_id, address="3 Side Lane")
+    assert service.get_patient_details(patient_id)['version'] == version + 2
+
+
+def test_bill_version_conflict(service):
+    bill_id = service.generate_bill(add_patient(service), 120)
+    version = service.get_bill(bill_id)['version']
+    service.update_bill_status(bill_id, 'Paid', version=version)
+    with pytest.raises(ConflictError) as conflict:
+        service.update_bill_status(bill_id, 'Overdue', version=version)
+    assert conflict.value.current['payment_status'] == 'Paid'
+
+
+def test_appointment_version_conflict(service, tomorrow):
+    appointment_id = service.book_appointment(add_patient(service), add_doctor(service), tomorrow, "10:00")
+    version = service.get_appointment(appointment_id)['version']
+    service.reschedule_appointment(appointment_id, tomorrow, "11:00", version=version)
+    with pytest.raises(ConflictError):
+        service.cancel_appointment(appointment_id, version=version)
+    appointment = service.get_appointment(appointment_id)
+    assert (appointment['status'], appointment['version']) == ('Scheduled', version + 1)
+    # The slot it moved from is free again, the new one is held.
+    assert service.slot_conflict(appointment['doctor_id'], tomorrow, "10:00") is None
+    assert service.slot_conflict(appointment['doctor_id'], tomorrow, "11:00") == "11:00"
+
+
+def test_missing_rows(service):
+    with pytest.raises(NotFoundError):
+        service.update_patient(999, address="Nowhere")
+    with pytest.raises(NotFoundError):
+        service.update_appointment(999, status='Completed')
+    # Bills need a patient whether or not a foreign key is there to say so.
+    with pytest.raises(NotFoundError):
+        service.generate_bill(999, 50)
+    assert service.fetch_one("SELECT COUNT(*) AS count FROM billing")['count'] == 0
@@ -0,0 +1,63 @@
+import json
+import threading
+import time
+
+import pytest
+
+from startup import Startup, report_from_env
+
+
+def test_phases_and_marks(monkeypatch):
+    now = [10.0]
+    monkeypatch.setattr(time, 'perf_counter', lambda: now[0])
+    startup = Startup(started=10.0)
+    with startup.phase('connect'):
+        now[0] += 0.25
+    now[0] += 0.5
+    startup.mark('menu')
+    now[0] += 1
+    # A menu drawn again later is not start-up.
+    startup.mark('menu')
+    assert startup.report() == {'connect_ms': 250.0, 'menu_at_ms': 750.0}
+
+
+def test_failed_phase_is_still_timed():
+    startup = Startup(time.perf_counter())
+    with pytest.raises(RuntimeError):
+        with startup.phase('schema'):
+            raise RuntimeError("no database")
+    assert 'schema' in startup.durations
+
+
+def test_background_work_and_wait():
+    startup = Startup(time.perf_counter())
+    assert not startup.pending
+    release = threading.Event()
+    startup.start(lambda: release.wait(5))
+    assert startup.pending
+    release.set()
+    assert startup.wait() is None
+    assert not startup.pending
+    report = startup.report()
+    assert 'ready_at_ms' in report and report['first_action_wait_ms'] >= 0
+
+
+def test_background_error_is_handed_to_the_waiter():
+    startup = Startup(time.perf_counter())
+
+    def fail():
+        raise ConnectionError("refused")
+
+    startup.start(fail)
+    error = startup.wait()
+    assert isinstance(error, ConnectionError)
+    assert 'ready' in startup.offsets
+
+
+def test_report_only_when_asked(capsys):
+    startup = Startup(time.perf_counter())
+    startup.mark('menu')
+    report_from_env(startup, {})
+    assert capsys.readouterr().err == ""
+    report_from_env(startup, {'HMS_STARTUP_TIMING': 'yes'})
+    assert set(json.loads(capsys.readouterr().err)['startup']) == {'menu_at_ms'}
@@ -0,0 +1,10 @@
+from storage import SQLiteEngine
+
+
+def test_memory_engine_shares_one_database_between_connections():
+    engine = SQLiteEngine(':memory:')
+    first, second = engine.connect(), engine.connect()
+    first.execute("CREATE TABLE t (x INT)")
+    first.execute("INSERT INTO t VALUES (1)")
+    first.commit()
+    assert second.execute("SELECT x FROM t").fetchall() == [{'x': 1}]
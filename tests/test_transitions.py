@@ -0,0 +1,68 @@
+import datetime
+
+import pytest
+
+from conftest import add_doctor, add_patient
+
+
+def add_appointments(service, days_ago, count, n=1):
+    patient_id, doctor_id = add_patient(service, n), add_doctor(service, n)
+    day = (datetime.date.today() - datetime.timedelta(days=days_ago)).isoformat()
+    return [service.execute_write(
+        """INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status)
+           VALUES (%s, %s, %s, %s, 'Scheduled')""",
+        (patient_id, doctor_id, day, f"{9 + i:02d}:00")
+    ) for i in range(count)]
+
+
+def statuses(service, table='appointments', column='status'):
+    return [row[column] for row in service.fetch_all(f"SELECT {column} FROM {table} ORDER BY 1")]
+
+
+def test_sweeps_in_chunks_and_skips_today(service):
+    add_appointments(service, 2, 7)
+    add_appointments(service, 0, 2, n=2)
+    progress = []
+    report = service.bulk_transition('complete-appointments', chunk_size=3, progress=progress.append)
+    assert (report['updated'], report['chunks']) == (7, 3)
+    assert [entry['updated'] for entry in progress] == [3, 6, 7]
+    assert statuses(service).count('Completed') == 7 and statuses(service).count('Scheduled') == 2
+    # Swept rows move on a version, so an editor holding the old one is refused.
+    assert {row['version'] for row in service.fetch_all(
+        "SELECT version FROM appointments WHERE status = 'Completed'")} == {1}
+    assert service.bulk_transition('complete-appointments')['updated'] == 0
+
+
+def test_dry_run_only_counts(service):
+    add_appointments(service, 3, 4)
+    report = service.bulk_transition('no-show-appointments', dry_run=True)
+    assert report['matched'] == 4 and report['updated'] == 0
+    assert statuses(service) == ['Scheduled'] * 4
+
+
+def test_cutoff(service):
+    add_appointments(service, 10, 2)
+    add_appointments(service, 3, 1, n=2)
+    cutoff = (datetime.date.today() - datetime.timedelta(days=5)).isoformat()
+    assert service.bulk_transition('no-show-appointments', cutoff)['updated'] == 2
+    assert sorted(statuses(service)) == ['Cancelled', 'Cancelled', 'Scheduled']
+
+
+def test_overdue_bills_move_between_revenue_buckets(service):
+    patient_id = add_patient(service)
+    old = [service.generate_bill(patient_id, amount) for amount in (100, 50)]
+    service.generate_bill(patient_id, 25)
+    service.generate_bill(patient_id, 10, 'Paid')
+    month_ago = (datetime.date.today() - datetime.timedelta(days=40)).isoformat()
+    service.execute_write("UPDATE billing SET bill_date = %s WHERE bill_id IN (%s, %s)", (month_ago, *old))
+    service.rebuild_revenue_summaries()
+    assert service.bulk_transition('overdue-bills', chunk_size=1)['updated'] == 2
+    totals = service.outstanding_totals()
+    assert (totals['Pending']['bills'], float(totals['Pending']['amount'])) == (1, 25)
+    assert (totals['Overdue']['bills'], float(totals['Overdue']['amount'])) == (2, 150)
+    assert sorted(statuses(service, 'billing', 'payment_status')) == ['Overdue', 'Overdue', 'Paid', 'Pending']
+
+
+def test_unknown_transition(service):
+    with pytest.raises(Exception, match="transition"):
+        service.bulk_transition('discharge-everyone')
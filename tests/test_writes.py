@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from scheduling import SlotConflict
+from storage import Error, SQLiteEngine
+from writes import WriteQueue, WriteQueueError
+from conftest import add_doctor
+
+
+@pytest.fixture
+def queue(service, db_path):
+    queue = WriteQueue(SQLiteEngine(db_path), window=0.05, max_writes=10)
+    yield queue
+    queue.close()
+
+
+def insert(row_id):
+    def work(cursor):
+        cursor.execute("INSERT INTO index_changes (table_name, row_id) VALUES ('test', %s)", (row_id,))
+        return cursor.lastrowid
+    return work
+
+
+def rows(service):
+    return [row['row_id'] for row in service.fetch_all("SELECT row_id FROM index_changes ORDER BY row_id")]
+
+
+def fail(cursor):
+    cursor.execute("INSERT INTO no_such_table VALUES (1)")
+
+
+def test_failed_write_is_rolled_back_alone(service, queue):
+    results = {}
+
+    def run(name, work):
+        try:
+            results[name] = queue.submit(work)
+        except Exception as e:
+            results[name] = e
+
+    threads = [threading.Thread(target=run, args=(n, fail if n == 3 else insert(n))) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert isinstance(results.pop(3), Error)
+    assert all(isinstance(result, int) for result in results.values())
+    assert rows(service) == [0, 1, 2, 4, 5]
+    assert queue.stats()['groups'] < 6
+
+
+def test_writer_survives_unexpected_errors(service, queue, monkeypatch):
+    commit = queue._commit
+    calls = []
+
+    def broken(connection, group):
+        calls.append(len(group))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return commit(connection, group)
+
+    monkeypatch.setattr(queue, '_commit', broken)
+    with pytest.raises(WriteQueueError):
+        queue.submit(insert(1))
+    assert queue.submit(insert(2))
+    assert rows(service) == [2]
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_writer_is_reported(queue, monkeypatch):
+    def stop(connection, group):
+        raise SystemExit()
+
+    monkeypatch.setattr(queue, '_commit', stop)
+    with pytest.raises(WriteQueueError):
+        queue.submit(insert(1))
+    with pytest.raises(WriteQueueError, match="stopped"):
+        queue.submit(insert(2))
+
+
+def test_index_lock_is_not_held_while_writing(service, tomorrow):
+    schedule = service.schedule
+    first, second = add_doctor(service, 1), add_doctor(service, 2)
+    writing, release = threading.Event(), threading.Event()
+
+    def slow_write():
+        writing.set()
+        release.wait(5)
+        return 'slow'
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(schedule.reserve(first, tomorrow, "10:00", slow_write)))
+    thread.start()
+    assert writing.wait(5)
+    # The pending slot is already held, and other bookings are not blocked.
+    with pytest.raises(SlotConflict):
+        schedule.reserve(first, tomorrow, "10:15", lambda: 'clash')
+    assert schedule.reserve(second, tomorrow, "10:00", lambda: 'other') == 'other'
+    release.set()
+    thread.join()
+    assert results == ['slow']
+    assert schedule.conflict(first, tomorrow, "10:00") == "10:00"
+
+
+def test_failed_write_gives_the_slot_back(service, tomorrow):
+    schedule = service.schedule
+    doctor_id = add_doctor(service)
+
+    def broken():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        schedule.reserve(doctor_id, tomorrow, "10:00", broken)
+    assert schedule.conflict(doctor_id, tomorrow, "10:00") is None
+    schedule.reserve(doctor_id, tomorrow, "11:00", lambda: None)
+    with pytest.raises(RuntimeError):
+        schedule.reserve(doctor_id, tomorrow, "11:15", broken, release=(tomorrow, "11:00"))
+    assert schedule.conflict(doctor_id, tomorrow, "11:00") == "11:00"
+    assert schedule.conflict(doctor_id, tomorrow, "11:30") is None
@@ -0,0 +1,130 @@
+import argparse
+import datetime
+import json
+import sys
+import time
+
+from storage import engine_from_env
+import revenue
+
+# name -> (table, key column, status column, date column, from status, to status, default age in days)
+TRANSITIONS = {
+    'complete-appointments': ('appointments', 'appointment_id', 'status', 'appointment_date',
+                              'Scheduled', 'Completed', 0),
+    'no-show-appointments': ('appointments', 'appointment_id', 'status', 'appointment_date',
+                             'Scheduled', 'Cancelled', 0),
+    'overdue-bills': ('billing', 'bill_id', 'payment_status', 'bill_date',
+                      'Pending', 'Overdue', 30)
+}
+
+
+def default_cutoff(name, today=None):
+    age = TRANSITIONS[name][6]
+    return (today or datetime.date.today()) - datetime.timedelta(days=age)
+
+
+class BulkTransition:
+    def __init__(self, system, name, cutoff=None, chunk_size=1000, progress=None):
+        (self.table, self.key, self.column, self.date_column,
+         self.from_status, self.to_status, _) = TRANSITIONS[name]
+        self.system = system
+        self.name = name
+        self.cutoff = (cutoff or default_cutoff(name)).isoformat()
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.updated = 0
+        self.chunks = 0
+        self.started = None
+
+    def where(self):
+        # Rows dated strictly before the cutoff day, so today's work is never swept.
+        return (f"{self.column} = %s AND {self.date_column} < %s",
+                [self.from_status, self.cutoff])
+
+    def count(self):
+        condition, params = self.where()
+        row = self.system.fetch_one(
+            f"SELECT COUNT(*) AS pending FROM {self.table} WHERE {condition}", params
+        )
+        return row['pending']
+
+    def run(self, dry_run=False):
+        self.started = time.perf_counter()
+        if dry_run:
+            return dict(self.report(), matched=self.count(), dry_run=True)
+
+        condition, params = self.where()
+        last_key = 0
+        while True:
+            with self.system.unit_of_work() as (connection, cursor):
+                # Find the key range of the next chunk, then update it with a single
+                # statement so each transaction touches at most chunk_size rows.
+                cursor.execute(
+                    f"""SELECT {self.key} FROM {self.table}
+                        WHERE {condition} AND {self.key} > %s
+                        ORDER BY {self.key} LIMIT {self.chunk_size}""",
+                    params + [last_key]
+                )
+                keys = [row[self.key] for row in cursor.fetchall()]
+                if not keys:
+                    break
+                chunk = f"{condition} AND {self.key} BETWEEN %s AND %s"
+                chunk_params = params + [keys[0], keys[-1]]
+                if self.table == 'billing':
+                    revenue.move_bills(self.system.engine, cursor, chunk, chunk_params, self.to_status)
+                cursor.execute(
+                    f"UPDATE {self.table} SET {self.column} = %s, version = version + 1 WHERE {chunk}",
+                    [self.to_status] + chunk_params
+                )
+                connection.commit()
+                self.updated += cursor.rowcount
+            self.chunks += 1
+            last_key = keys[-1]
+            if self.progress:
+                self.progress(self.report())
+        return self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'transition': self.name,
+            'from': self.from_status,
+            'to': self.to_status,
+            'cutoff': self.cutoff,
+            'updated': self.updated,
+            'chunks': self.chunks,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.updated / elapsed, 1) if elapsed else 0.0
+        }
+
+
+def main(argv=None):
+    from services import HospitalService
+
+    parser = argparse.ArgumentParser(description="Apply end-of-day status transitions in bulk.")
+    parser.add_argument('transition', choices=sorted(TRANSITIONS))
+    parser.add_argument('--before', type=datetime.date.fromisoformat,
+                        help="only rows dated before this day (YYYY-MM-DD); "
+                             "default is today, or 30 days ago for bills")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help="only count matching rows")
+    args = parser.parse_args(argv)
+
+    def progress(report):
+        print(f"\r{report['updated']} updated in {report['chunks']} chunks, "
+              f"{report['rows_per_second']:.0f} rows/s", end="", file=sys.stderr)
+
+    service = HospitalService(engine_from_env(), pool_size=1)
+    try:
+        service.setup_database()
+        report = service.bulk_transition(args.transition, args.before, args.dry_run,
+                                         args.chunk_size, progress)
+    finally:
+        service.close()
+    if not args.dry_run:
+        print(file=sys.stderr)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import re
+import datetime
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PATTERN = re.compile(r'^\+?1?\d{10,14}$')
+DATE_PATTERN = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+TIME_PATTERN = re.compile(r'^(\d{1,2}):(\d{1,2})$')
+GENDERS = ('Male', 'Female', 'Other')
+
+
+def is_valid_email(email):
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def is_valid_phone(phone):
+    return PHONE_PATTERN.match(phone) is not None
+
+
+def parse_date(value):
+    # Same result as strptime(value, '%Y-%m-%d') for well-formed input, at a
+    # fraction of the cost when validating millions of rows.
+    match = DATE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+    return datetime.date(*map(int, match.groups()))
+
+
+def parse_time(value):
+    # strptime(value, '%H:%M') without the format parsing.
+    match = TIME_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid time {value!r}, expected HH:MM")
+    return datetime.time(*map(int, match.groups()))
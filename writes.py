@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+
+from storage import Error, StorageError
+
+# How often a waiting caller checks that the writer thread is still alive.
+LIVENESS_SECONDS = 1.0
+
+
+class WriteQueueError(StorageError):
+    pass
+
+
+class _Write:
+    __slots__ = ('work', 'result', 'error', 'done')
+
+    def __init__(self, work):
+        self.work = work
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteQueue:
+    # Collects writes from many sessions for up to `window` seconds or
+    # `max_writes` writes and commits them in one transaction, so a single
+    # log flush covers the whole group. Each write runs in its own savepoint:
+    # one that fails is rolled back alone and only its caller sees the error.
+    # A caller returns only once its group is committed; if that commit
+    # fails, every write in the group fails with it.
+    def __init__(self, engine, window=0.005, max_writes=100):
+        self.engine = engine
+        self.window = window
+        self.max_writes = max_writes
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.metrics = {
+            'writes': 0,
+            'failed': 0,
+            'groups': 0,
+            'failed_groups': 0,
+            'largest_group': 0
+        }
+
+    def submit(self, work):
+        write = _Write(work)
+        with self._lock:
+            if self._closed:
+                raise WriteQueueError("Write queue is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+            elif not self._thread.is_alive():
+                raise WriteQueueError("Group-commit writer has stopped")
+            self._pending.put(write)
+            thread = self._thread
+        while not write.done.wait(LIVENESS_SECONDS):
+            if not thread.is_alive():
+                raise WriteQueueError("Group-commit writer has stopped")
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _collect(self):
+        first = self._pending.get()
+        if first is None:
+            return None
+        group = [first]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_writes:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                write = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if write is None:
+                # Closing: commit what was collected, then stop.
+                self._pending.put(None)
+                break
+            group.append(write)
+        return group
+
+    def _commit(self, connection, group):
+        cursor = self.engine.cursor(connection)
+        try:
+            cursor.execute(self.engine.begin_write)
+            for write in group:
+                cursor.execute("SAVEPOINT queued_write")
+                try:
+                    write.result = write.work(cursor)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT queued_write")
+                    write.error = e
+                cursor.execute("RELEASE SAVEPOINT queued_write")
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def _run(self):
+        connection = None
+        while True:
+            group = self._collect()
+            if group is None:
+                break
+            try:
+                if connection is None:
+                    connection = self.engine.connect()
+                self._commit(connection, group)
+            except BaseException as e:
+                # The whole group fails, but the writer keeps serving the next
+                # unless it is being shut down.
+                stopping = not isinstance(e, Exception)
+                if not isinstance(e, Error):
+                    cause, e = e, WriteQueueError(f"Group commit failed: {e!r}")
+                    e.__cause__ = cause
+                for write in group:
+                    write.result, write.error = None, write.error or e
+                self.metrics['failed_groups'] += 1
+                if connection is not None:
+                    try:
+                        connection.rollback()
+                    except Exception:
+                        connection.close()
+                        connection = None
+                if stopping:
+                    raise
+            finally:
+                self.metrics['groups'] += 1
+                self.metrics['writes'] += len(group)
+                self.metrics['failed'] += sum(write.error is not None for write in group)
+                self.metrics['largest_group'] = max(self.metrics['largest_group'], len(group))
+                for write in group:
+                    write.done.set()
+        if connection is not None:
+            connection.close()
+
+    def stats(self):
+        return dict(self.metrics, window_ms=self.window * 1000, max_writes=self.max_writes)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._pending.put(None)
+        if thread is not None:
+            thread.join()